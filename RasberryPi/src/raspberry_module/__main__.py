@@ -1,4 +1,29 @@
+import sys
+
 from .main import main
 
-if __name__ == "__main__":
+COMMANDS = ("bench", "replay", "sweep", "autocalibrate", "broker")
+
+
+def run() -> int:
+    # `python -m raspberry_module` starts the service; tools run as subcommands.
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        command, argv = sys.argv[1], sys.argv[2:]
+        if command == "bench":
+            from .bench import main as tool
+        elif command == "replay":
+            from .replay import main as tool
+        elif command == "sweep":
+            from .sweep import main as tool
+        elif command == "broker":
+            from .broker import main as tool
+        else:
+            from .autocalibrate import main as tool
+        return tool(argv)
+
     main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Sequence
+
+import logging
+
+from .control import ControlResult, ControllerSnapshot, SpeedController
+from .metrics import STAGE_SECONDS
+from .models import CommandIn
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_WAIT = STAGE_SECONDS.labels(stage="controller_queue")
+_CONTROLLER = STAGE_SECONDS.labels(stage="controller")
+
+_STOP = object()
+
+
+class ControllerBusyError(RuntimeError):
+    pass
+
+
+class ControllerActor:
+    """Runs every SpeedController mutation on one dedicated thread.
+
+    HTTP handlers and MQTT callbacks submit work and receive a Future; state
+    readers use ``snapshot``, which the controller swaps atomically after
+    each update, so they never contend with the control path.
+    """
+
+    def __init__(self, controller: SpeedController, queue_size: int = 1000) -> None:
+        self._controller = controller
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    @property
+    def controller(self) -> SpeedController:
+        return self._controller
+
+    @property
+    def snapshot(self) -> ControllerSnapshot:
+        return self._controller.snapshot
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def queue_capacity(self) -> int:
+        return self._queue.maxsize
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="controller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "Future[Any]":
+        if self._stopped:
+            raise ControllerBusyError("controller is stopped")
+        future: "Future[Any]" = Future()
+        try:
+            self._queue.put_nowait((future, fn, args, kwargs, time.perf_counter()))
+        except queue.Full as exc:
+            raise ControllerBusyError("controller queue is full") from exc
+        return future
+
+    def process_command(self, command: CommandIn) -> "Future[ControlResult]":
+        return self.submit(self._controller.process_command, command)
+
+    def process_cycle_time(
+        self,
+        line_id: str,
+        cycle_time_minutes: float,
+        mode: str = "mqtt",
+        chain_state: Optional[dict] = None,
+        skipped: Sequence[float] = (),
+    ) -> "Future[ControlResult]":
+        return self.submit(
+            self._controller.process_cycle_time,
+            line_id=line_id,
+            cycle_time_minutes=cycle_time_minutes,
+            mode=mode,
+            chain_state=chain_state,
+            skipped=skipped,
+        )
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._fail_pending()
+                return
+            future, fn, args, kwargs, queued_at = item
+            started = time.perf_counter()
+            _QUEUE_WAIT.observe(started - queued_at)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            _CONTROLLER.observe(time.perf_counter() - started)
+
+    def _fail_pending(self) -> None:
+        # Work submitted while stop() was running would otherwise never resolve.
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and item[0].set_running_or_notify_cancel():
+                item[0].set_exception(ControllerBusyError("controller is stopped"))
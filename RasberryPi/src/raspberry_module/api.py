@@ -1,33 +1,155 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from datetime import datetime, timezone
-from fastapi import FastAPI, HTTPException
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
 
+from fastapi import Body, FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import ValidationError
+
+from .actor import ControllerActor, ControllerBusyError
+from .calibration import CalibrationTable
 from .config import AppConfig
-from .control import SpeedController
-from .models import CommandIn, CommandOut
-from .storage import Storage
+from .control import LineSnapshot, SpeedController
+from .export_jobs import ExportJobManager
+from .metrics import CONTENT_TYPE, MESSAGES_PROCESSED, MESSAGES_RECEIVED, MESSAGES_REJECTED, QUEUE_DEPTH, REGISTRY
+from .models import BatchItemOut, BatchOut, CommandIn, CommandOut
+from .mqtt_subscriber import CycleTimeMqttSubscriber
+from .output import OutputLoop
+from .retention import RetentionWorker
+from .storage import EXPORT_TABLES, Storage
+from .stream import StateStream, serve_websocket, sse_response
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def _line_fields(line: LineSnapshot) -> Dict[str, Any]:
+    chain_state = line.last_chain_state
+    return {
+        "speed": line.last_valid_speed,
+        "target_voltage": line.target_voltage,
+        "filtered_cycle_time": line.last_filtered_cycle_time,
+        "is_running": chain_state.is_running if chain_state else None,
+        "encoder_delta": chain_state.encoder_delta if chain_state else None,
+        "updated_at": line.updated_at.isoformat() if line.updated_at else None,
+    }
 
 
 def create_app() -> FastAPI:
     config = AppConfig.load()
-    storage = Storage(config.db_path)
-    controller = SpeedController(config, storage)
+    storage = Storage.from_config(config)
+    state_stream = StateStream()
+
+    def publish_line(line: LineSnapshot) -> None:
+        fields = _line_fields(line)
+        if not output.enabled:
+            fields["voltage"] = line.target_voltage
+        state_stream.publish(line.line_id, fields)
+
+    def publish_voltages(voltages: Mapping[str, float]) -> None:
+        for line_id, voltage in voltages.items():
+            state_stream.publish(line_id, {"voltage": round(voltage, 4)})
+
+    def applied_voltages() -> Mapping[str, float]:
+        return output.voltages if output.is_running else {}
+
+    controller = SpeedController(config, storage, listener=publish_line, applied_voltages=applied_voltages)
+    actor = ControllerActor(controller, queue_size=config.control_queue_size)
+    actor.start()
+    output = OutputLoop(
+        lambda: actor.snapshot,
+        rate_hz=config.output_rate_hz,
+        ramp_rate_v_per_sec=config.ramp_rate_v_per_sec,
+        listener=publish_voltages,
+    )
+    export_jobs = ExportJobManager(
+        storage,
+        config.data_dir / "exports",
+        rotation=config.export_rotation,
+        keep_files=config.export_keep_files,
+    )
+    retention = RetentionWorker.from_config(config)
+
+    def admit() -> bool:
+        # Shed load before queues fill up instead of letting latency grow.
+        load = max(actor.queue_depth / actor.queue_capacity, storage.write_backlog())
+        return load < config.command_high_watermark
+
+    mqtt = CycleTimeMqttSubscriber(config, actor, admit=admit)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        output.start()
+        retention.start()
+        await mqtt.start()
+        yield
+        await mqtt.stop()
+        retention.stop()
+        output.stop()
+        actor.stop()
+        export_jobs.shutdown()
+        storage.close()
 
-    app = FastAPI(title="Raspberry Commande", version="1.0.0")
+    app = FastAPI(title="Raspberry Commande", version="1.0.0", lifespan=lifespan)
     app.state.config = config
     app.state.storage = storage
     app.state.controller = controller
+    app.state.actor = actor
+    app.state.output = output
+    app.state.mqtt = mqtt
+    app.state.state_stream = state_stream
+
+    QUEUE_DEPTH.labels("controller").set_function(lambda: actor.queue_depth)
+    QUEUE_DEPTH.labels("storage_writer").set_function(lambda: storage.stats().get("queue_depth", 0))
+    app.state.export_jobs = export_jobs
+
+    def busy() -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail="controller is overloaded, retry later",
+            headers={"Retry-After": str(config.command_retry_after_sec)},
+        )
+
+    @app.get("/metrics")
+    def metrics() -> Response:
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
     @app.get("/api/v1/health")
     def health() -> dict:
-        return {"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()}
+        mqtt_status = mqtt.status()
+        return {
+            "status": "ok",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "mqtt": asdict(mqtt_status) if mqtt_status else {"state": "disabled"},
+        }
 
     @app.get("/api/v1/state")
-    def state() -> dict:
-        chain_state = controller.last_chain_state
+    def state(line_id: Optional[str] = None) -> dict:
+        snapshot = actor.snapshot
+        if line_id is None:
+            line = snapshot.last_line
+        else:
+            line = snapshot.lines.get(line_id)
+            if line is None:
+                raise HTTPException(status_code=404, detail=f"unknown line: {line_id}")
+
+        chain_state = line.last_chain_state if line else None
+        target_voltage = line.target_voltage if line else None
+        voltage = target_voltage
+        if line is not None and output.is_running:
+            voltage = output.voltages.get(line.line_id, target_voltage)
         return {
-            "last_valid_speed": controller.last_valid_speed,
-            "last_voltage": controller.last_voltage,
-            "last_filtered_cycle_time": controller.last_filtered_cycle_time,
+            "line_id": line.line_id if line else None,
+            "lines": sorted(snapshot.lines),
+            "last_valid_speed": line.last_valid_speed if line else None,
+            "last_voltage": voltage,
+            "target_voltage": target_voltage,
+            "last_filtered_cycle_time": line.last_filtered_cycle_time if line else None,
             "chain_state": {
                 "is_running": chain_state.is_running if chain_state else None,
                 "encoder_delta": chain_state.encoder_delta if chain_state else None,
@@ -35,12 +157,112 @@ def create_app() -> FastAPI:
             },
         }
 
+    @app.get("/api/v1/state/stream")
+    async def state_stream_sse(
+        request: Request,
+        line_id: Optional[List[str]] = Query(default=None),
+        max_rate_hz: float = Query(default=10.0, gt=0, le=1000),
+    ) -> StreamingResponse:
+        return sse_response(state_stream, request, line_id, max_rate_hz)
+
+    @app.websocket("/api/v1/state/stream")
+    async def state_stream_ws(
+        websocket: WebSocket,
+        line_id: Optional[List[str]] = Query(default=None),
+        max_rate_hz: float = Query(default=10.0, gt=0, le=1000),
+    ) -> None:
+        await serve_websocket(state_stream, websocket, line_id, max_rate_hz)
+
+    @app.get("/api/v1/trends")
+    def trends(
+        line_id: str = Query(min_length=1),
+        start: Optional[datetime] = Query(default=None, alias="from"),
+        end: Optional[datetime] = Query(default=None, alias="to"),
+        resolution: str = Query(default="minute", pattern="^(minute|hour)$"),
+    ) -> dict:
+        if start is not None and start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        if end is not None and end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        return {
+            "line_id": line_id,
+            "resolution": resolution,
+            "points": storage.query_trends(line_id, start=start, end=end, resolution=resolution),
+        }
+
+    @app.get("/api/v1/history")
+    def history(
+        table: str = Query(default="command_log", pattern="^(command_log|output_log)$"),
+        line_id: Optional[str] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = Query(default=None, alias="from"),
+        end: Optional[datetime] = Query(default=None, alias="to"),
+        limit: int = Query(default=100, ge=1, le=1000),
+        cursor: Optional[str] = None,
+    ) -> dict:
+        if start is not None and start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        if end is not None and end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        try:
+            items, next_cursor = storage.query_history(
+                table,
+                line_id=line_id,
+                status=status,
+                start=start,
+                end=end,
+                limit=limit,
+                cursor=cursor,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        return {"items": items, "next_cursor": next_cursor}
+
+    @app.get("/api/v1/storage/stats")
+    def storage_stats() -> dict:
+        return storage.stats()
+
+    @app.get("/api/v1/calibration")
+    def get_calibration() -> dict:
+        return controller.calibration.to_dict()
+
+    @app.put("/api/v1/calibration")
+    def put_calibration(payload: Dict[str, Any] = Body(...)) -> dict:
+        try:
+            calibration = CalibrationTable.from_dict(
+                payload,
+                config.speed_min,
+                config.speed_max,
+                config.voltage_min,
+                config.voltage_max,
+                pitch_distance=config.ct_to_speed_factor,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        try:
+            actor.submit(controller.set_calibration, calibration).result()
+        except ControllerBusyError as exc:
+            raise busy() from exc
+        return calibration.to_dict()
+
+    @app.get("/api/v1/output/stats")
+    def output_stats() -> dict:
+        return asdict(output.stats())
+
     @app.post("/api/v1/command", response_model=CommandOut)
-    def command(payload: CommandIn) -> CommandOut:
+    async def command(payload: CommandIn) -> CommandOut:
+        MESSAGES_RECEIVED.labels("http", payload.line_id).inc()
         try:
-            result = controller.process_command(payload)
+            if not admit():
+                raise ControllerBusyError("above the command high watermark")
+            result = await asyncio.wrap_future(actor.process_command(payload))
+        except ControllerBusyError as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "overload").inc()
+            raise busy() from exc
         except Exception as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "error").inc()
             raise HTTPException(status_code=500, detail=str(exc)) from exc
+        MESSAGES_PROCESSED.labels("http", payload.line_id, result.status).inc()
 
         return CommandOut(
             status=result.status,
@@ -48,11 +270,121 @@ def create_app() -> FastAPI:
             voltage=result.voltage,
             reason=result.reason,
             applied_at=result.applied_at,
+            target_voltage=result.target_voltage,
         )
 
-    @app.post("/api/v1/export")
-    def export() -> dict:
-        exports = storage.export_csv(config.data_dir / "exports")
-        return {"exports": exports}
+    @app.post("/api/v1/commands:batch", response_model=BatchOut)
+    async def command_batch(request: Request) -> BatchOut:
+        started = time.perf_counter()
+        body = await request.body()
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        try:
+            if content_type in NDJSON_CONTENT_TYPES:
+                items = [json.loads(line) for line in body.splitlines() if line.strip()]
+            else:
+                items = json.loads(body)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"invalid JSON: {exc}") from exc
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="expected a JSON array or NDJSON of commands")
+        if len(items) > config.command_batch_max_items:
+            raise HTTPException(
+                status_code=413,
+                detail=f"batch of {len(items)} exceeds {config.command_batch_max_items} commands",
+            )
+
+        results: List[Optional[BatchItemOut]] = [None] * len(items)
+        commands: List[CommandIn] = []
+        indexes: List[int] = []
+        invalid = 0
+        for index, item in enumerate(items):
+            try:
+                commands.append(CommandIn.model_validate(item))
+                indexes.append(index)
+            except ValidationError as exc:
+                invalid += 1
+                errors = "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc']) or 'item'}: {error['msg']}"
+                    for error in exc.errors()
+                )
+                results[index] = BatchItemOut(index=index, status="rejected", reason=errors)
+
+        for line_id, count in Counter(command.line_id for command in commands).items():
+            MESSAGES_RECEIVED.labels("batch", line_id).inc(count)
+        if invalid:
+            # Line ids of invalid items are not trusted as labels; they would make the series unbounded.
+            MESSAGES_RECEIVED.labels("batch", "unknown").inc(invalid)
+            MESSAGES_REJECTED.labels("batch", "unknown", "invalid").inc(invalid)
+
+        if commands:
+            try:
+                if not admit():
+                    raise ControllerBusyError("above the command high watermark")
+                processed = await asyncio.wrap_future(actor.submit(controller.process_batch, commands))
+            except ControllerBusyError as exc:
+                for line_id, count in Counter(command.line_id for command in commands).items():
+                    MESSAGES_REJECTED.labels("batch", line_id, "overload").inc(count)
+                raise busy() from exc
+            outcomes = Counter((command.line_id, result.status) for command, result in zip(commands, processed))
+            for (line_id, status), count in outcomes.items():
+                MESSAGES_PROCESSED.labels("batch", line_id, status).inc(count)
+            for index, result in zip(indexes, processed):
+                results[index] = BatchItemOut(
+                    index=index,
+                    status=result.status,
+                    speed_used=result.speed_used,
+                    voltage=result.voltage,
+                    reason=result.reason,
+                    applied_at=result.applied_at,
+                    target_voltage=result.target_voltage,
+                )
+
+        return BatchOut(
+            accepted=len(commands),
+            rejected=len(items) - len(commands),
+            elapsed_ms=(time.perf_counter() - started) * 1000.0,
+            results=[result for result in results if result is not None],
+        )
+
+    @app.post("/api/v1/export", status_code=202)
+    def export(full: bool = False) -> dict:
+        job = export_jobs.submit(full=full)
+        return export_jobs.snapshot(job)
+
+    @app.get("/api/v1/export/stream/{table_name}")
+    def export_stream(table_name: str) -> StreamingResponse:
+        if table_name not in EXPORT_TABLES:
+            raise HTTPException(status_code=404, detail=f"unknown table: {table_name}")
+        storage.flush()
+        return StreamingResponse(
+            storage.iter_csv(table_name),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={table_name}.csv"},
+        )
+
+    @app.get("/api/v1/export/{job_id}")
+    def export_status(job_id: str) -> dict:
+        job = export_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="export job not found")
+        status = export_jobs.snapshot(job)
+        for table_name, result in status["results"].items():
+            result["url"] = f"/api/v1/export/{job_id}/{table_name}" if result["path"] else None
+        return status
+
+    @app.get("/api/v1/export/{job_id}/{table_name}")
+    def export_download(job_id: str, table_name: str) -> FileResponse:
+        job = export_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="export job not found")
+        if job.status != "done":
+            raise HTTPException(status_code=409, detail=f"export job is {job.status}")
+        result = job.results.get(table_name)
+        if result is None or not result.path:
+            raise HTTPException(status_code=404, detail=f"no export for table: {table_name}")
+        path = Path(result.path)
+        if not path.exists():
+            raise HTTPException(status_code=410, detail="export file was rotated away")
+        return FileResponse(path, media_type="application/gzip", filename=path.name)
 
     return app
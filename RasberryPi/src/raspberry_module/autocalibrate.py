@@ -0,0 +1,150 @@
+import argparse
+import json
+import sqlite3
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+import logging
+
+from .calibration import CalibrationTable
+from .config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Each output row carries the encoder delta reported with the CT message that
+# produced it, i.e. how far the chain moved since the previous CT row of the
+# same line (rows from HTTP commands carry none and are left out of the
+# window). Dividing by the seconds between the two rows gives the measured speed;
+# it is paired with the mean applied voltage over that interval (trapezoid of
+# the applied voltages at both ends, exact while the output ramps linearly).
+# The fit itself is one pass of SQL aggregates over the whole history (normal
+# equations).
+FIT_SQL = """
+WITH pairs AS (
+    SELECT line_id,
+           encoder_delta * ? / ((julianday(created_at) - LAG(julianday(created_at)) OVER w) * 86400) AS speed,
+           (voltage + LAG(voltage) OVER w) / 2.0 AS voltage,
+           created_at
+    FROM output_log
+    WHERE encoder_delta IS NOT NULL
+    WINDOW w AS (PARTITION BY line_id ORDER BY id)
+)
+SELECT line_id,
+       COUNT(*),
+       SUM(speed), SUM(voltage),
+       SUM(speed * speed), SUM(speed * voltage), SUM(voltage * voltage),
+       MIN(speed), MAX(speed)
+FROM pairs
+WHERE speed > 0 AND voltage IS NOT NULL AND created_at >= ?
+GROUP BY line_id
+"""
+
+_VOLTAGE_STAGE = ("speed_to_voltage", "belt_factor", "speed_to_frequency", "volts_per_hz", "frequency_to_voltage")
+
+
+@dataclass(frozen=True)
+class LineFit:
+    line_id: str
+    samples: int
+    slope: float
+    intercept: float
+    r2: float
+    speed_min: float
+    speed_max: float
+
+    def voltage(self, speed: float) -> float:
+        return self.intercept + self.slope * speed
+
+
+def fit_voltage_curves(
+    db_path: Path,
+    encoder_scale: float = 1.0,
+    min_samples: int = 20,
+    since: Optional[datetime] = None,
+) -> Dict[str, LineFit]:
+    """Least-squares fit of voltage = intercept + slope * measured speed per line."""
+    since_iso = since.isoformat() if since is not None else ""
+    with closing(sqlite3.connect(db_path)) as conn:
+        rows = conn.execute(FIT_SQL, (encoder_scale, since_iso)).fetchall()
+
+    fits: Dict[str, LineFit] = {}
+    for line_id, n, sx, sy, sxx, sxy, syy, x_min, x_max in rows:
+        if n < max(2, min_samples):
+            logger.info("Skipping line %s: %s samples (need %s)", line_id, n, min_samples)
+            continue
+        sxx_c = sxx - sx * sx / n
+        if sxx_c <= 0:
+            logger.info("Skipping line %s: measured speed does not vary", line_id)
+            continue
+        sxy_c = sxy - sx * sy / n
+        syy_c = syy - sy * sy / n
+        slope = sxy_c / sxx_c
+        intercept = (sy - slope * sx) / n
+        r2 = (sxy_c * sxy_c) / (sxx_c * syy_c) if syy_c > 0 else 1.0
+        if slope <= 0:
+            logger.warning("Skipping line %s: voltage does not increase with speed (slope=%s)", line_id, slope)
+            continue
+        fits[line_id] = LineFit(line_id, n, slope, intercept, r2, x_min, x_max)
+    return fits
+
+
+def build_calibration(
+    fits: Mapping[str, LineFit],
+    speed_min: float,
+    speed_max: float,
+    base: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, Any]:
+    data: Dict[str, Any] = json.loads(json.dumps(base or {}))
+    lines = data.setdefault("lines", {})
+    for line_id, fit in sorted(fits.items()):
+        profile = {key: value for key, value in lines.get(line_id, {}).items() if key not in _VOLTAGE_STAGE}
+        profile["speed_to_voltage"] = [
+            [speed_min, round(fit.voltage(speed_min), 6)],
+            [speed_max, round(fit.voltage(speed_max), 6)],
+        ]
+        lines[line_id] = profile
+    return data
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    config = AppConfig.load()
+    parser = argparse.ArgumentParser(
+        prog="python -m raspberry_module.autocalibrate",
+        description="Fit per-line speed-to-voltage curves from logged encoder deltas.",
+    )
+    parser.add_argument("--db", type=Path, default=config.db_path)
+    parser.add_argument("--out", type=Path, default=config.data_dir / "calibration.json")
+    parser.add_argument("--base", type=Path, default=config.calibration_path, help="calibration file to update")
+    parser.add_argument("--encoder-scale", type=float, default=1.0, help="speed units per encoder count per second")
+    parser.add_argument("--min-samples", type=int, default=20)
+    parser.add_argument("--days", type=float, default=0.0, help="only use the last N days (0 = all history)")
+    args = parser.parse_args(argv)
+
+    since = datetime.now(timezone.utc) - timedelta(days=args.days) if args.days > 0 else None
+    fits = fit_voltage_curves(args.db, args.encoder_scale, args.min_samples, since)
+    if not fits:
+        print("No line has enough encoder data to fit.")
+        return 1
+
+    base = None
+    if args.base is not None and args.base.exists():
+        base = json.loads(args.base.read_text(encoding="utf-8"))
+    data = build_calibration(fits, config.speed_min, config.speed_max, base)
+    # Same validation the controller applies when loading the file.
+    CalibrationTable.from_dict(
+        data, config.speed_min, config.speed_max, config.voltage_min, config.voltage_max
+    )
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    for fit in fits.values():
+        print(json.dumps(asdict(fit)))
+    print(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,220 @@
+import argparse
+import json
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .__about__ import __version__
+from .config import AppConfig
+from .control import SpeedController
+from .filters import FILTER_TYPES
+from .models import CommandIn
+from .storage import NullStorage, Storage
+
+BACKENDS = ("disk", "tmpfs", "null")
+TMPFS_DIR = Path("/dev/shm")
+
+
+@dataclass(frozen=True)
+class BenchResult:
+    name: str
+    backend: str
+    iterations: int
+    ops_per_sec: float
+    p50_us: float
+    p99_us: float
+    max_us: float
+
+
+def measure(name: str, backend: str, fn: Callable[[int], None], iterations: int, warmup: int) -> BenchResult:
+    for i in range(warmup):
+        fn(i)
+
+    timings: List[int] = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for i in range(iterations):
+        before = clock()
+        fn(i)
+        timings.append(clock() - before)
+    total_ns = clock() - started
+
+    timings.sort()
+
+    def percentile(q: float) -> float:
+        return round(timings[min(len(timings) - 1, int(q * len(timings)))] / 1000.0, 2)
+
+    return BenchResult(
+        name=name,
+        backend=backend,
+        iterations=iterations,
+        ops_per_sec=round(iterations / (total_ns / 1e9), 1),
+        p50_us=percentile(0.50),
+        p99_us=percentile(0.99),
+        max_us=round(timings[-1] / 1000.0, 2),
+    )
+
+
+def _storage(backend: str, directory: Optional[Path], write_behind: bool):
+    if backend == "null":
+        return NullStorage()
+    assert directory is not None
+    return Storage(directory / "bench.db", write_behind=write_behind)
+
+
+def _backend_dir(backend: str, base_dir: Path) -> Optional[Path]:
+    if backend == "null":
+        return None
+    if backend == "tmpfs":
+        if not TMPFS_DIR.is_dir():
+            return None
+        return Path(tempfile.mkdtemp(prefix="raspi-bench-", dir=TMPFS_DIR))
+    base_dir.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix="raspi-bench-", dir=base_dir))
+
+
+def run_backend(
+    config: AppConfig,
+    backend: str,
+    iterations: int,
+    warmup: int,
+    write_behind: bool = False,
+) -> List[BenchResult]:
+    directory = _backend_dir(backend, config.data_dir)
+    if backend != "null" and directory is None:
+        print(f"Skipping {backend}: {TMPFS_DIR} is not available", file=sys.stderr)
+        return []
+
+    label = f"{backend}+write_behind" if write_behind and backend != "null" else backend
+    storage = _storage(backend, directory, write_behind)
+    try:
+        controller = SpeedController(config, storage)
+        now = datetime.now(timezone.utc)
+        lines = [f"L{n}" for n in range(4)]
+        commands = [
+            CommandIn(line_id=lines[i % len(lines)], speed=config.speed_min + i % 10, mode="bench", timestamp=now)
+            for i in range(64)
+        ]
+        cycle_times = [0.5 + (i % 17) / 10.0 for i in range(64)]
+
+        def command(i: int) -> None:
+            controller.process_command(commands[i % 64])
+
+        def cycle_time(i: int) -> None:
+            controller.process_cycle_time(lines[i % len(lines)], cycle_times[i % 64])
+
+        def log_command(i: int) -> None:
+            storage.log_command(
+                received_at=now,
+                line_id="L1",
+                speed=40.0,
+                mode="bench",
+                timestamp=now,
+                status="valid",
+                reason="ok",
+                raw_json={"line_id": "L1", "speed": 40.0},
+            )
+
+        def log_output(i: int) -> None:
+            storage.log_output(created_at=now, speed_used=40.0, voltage=5.0, reason="ok", line_id="L1")
+
+        results = [
+            measure("process_command", label, command, iterations, warmup),
+            measure("process_cycle_time", label, cycle_time, iterations, warmup),
+            measure("storage.log_command", label, log_command, iterations, warmup),
+            measure("storage.log_output", label, log_output, iterations, warmup),
+        ]
+        storage.flush()
+        return results
+    finally:
+        storage.close()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_filters(config: AppConfig, iterations: int, warmup: int) -> List[BenchResult]:
+    results = []
+    for kind in FILTER_TYPES:
+        controller = SpeedController(replace(config, ct_filter_type=kind), NullStorage())
+        line = controller._line_state("L1")
+        cycle_times = [0.5 + (i % 17) / 10.0 for i in range(64)]
+        results.append(
+            measure(
+                f"_filter_cycle_time[{kind}]",
+                "none",
+                lambda i: controller._filter_cycle_time(line, cycle_times[i % 64]),
+                iterations,
+                warmup,
+            )
+        )
+    return results
+
+
+def run(
+    config: AppConfig,
+    backends: Sequence[str] = BACKENDS,
+    iterations: int = 2000,
+    warmup: int = 200,
+    write_behind: bool = False,
+) -> Dict[str, object]:
+    results = run_filters(config, iterations, warmup)
+    for backend in backends:
+        results.extend(run_backend(config, backend, iterations, warmup, write_behind))
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "iterations": iterations,
+        "results": [asdict(result) for result in results],
+    }
+
+
+def compare(previous: Dict[str, object], current: Dict[str, object]) -> str:
+    def key(item: Dict[str, object]) -> str:
+        return f"{item['name']} ({item['backend']})"
+
+    before = {key(item): item for item in previous.get("results", [])}  # type: ignore[union-attr]
+    lines = [f"{'benchmark':<44} {'ops/s':>12} {'change':>8} {'p99 us':>10} {'change':>8}"]
+    for item in current["results"]:  # type: ignore[union-attr]
+        old = before.get(key(item))
+        ops_change = p99_change = ""
+        if old:
+            ops_change = f"{(item['ops_per_sec'] / old['ops_per_sec'] - 1) * 100:+.1f}%" if old["ops_per_sec"] else ""
+            p99_change = f"{(item['p99_us'] / old['p99_us'] - 1) * 100:+.1f}%" if old["p99_us"] else ""
+        lines.append(
+            f"{key(item):<44} {item['ops_per_sec']:>12.1f} {ops_change:>8} {item['p99_us']:>10.2f} {p99_change:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    config = AppConfig.load()
+    parser = argparse.ArgumentParser(
+        prog="python -m raspberry_module bench",
+        description="Measure throughput and latency of the control hot path.",
+    )
+    parser.add_argument("--backend", dest="backends", action="append", choices=BACKENDS, help="default: all")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--write-behind", action="store_true", help="use the write-behind writer for SQLite")
+    parser.add_argument("--out", type=Path, help="write JSON results to this file")
+    parser.add_argument("--compare", type=Path, help="previous JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(config, args.backends or BACKENDS, max(1, args.iterations), max(0, args.warmup), args.write_behind)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out is not None:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    if args.compare is not None:
+        print(compare(json.loads(args.compare.read_text(encoding="utf-8")), report))
+    elif args.out is None:
+        print(text)
+    return 0
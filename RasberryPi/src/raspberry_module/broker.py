@@ -0,0 +1,485 @@
+import argparse
+import asyncio
+import itertools
+import struct
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+# CONNACK return codes
+_ACCEPTED = 0
+_BAD_PROTOCOL = 1
+_BAD_CLIENT_ID = 2
+_BAD_CREDENTIALS = 4
+
+_MAX_QOS = 1
+_SUBACK_FAILURE = 0x80
+_CONNECT_TIMEOUT_SEC = 10.0
+
+
+class ProtocolError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class BrokerStats:
+    clients: int
+    subscriptions: int
+    retained: int
+    received: int
+    delivered: int
+    dropped: int
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT 3.1.1 topic matching with ``+`` and ``#`` wildcards."""
+    if topic.startswith("$") and topic_filter[:1] in ("+", "#"):
+        return False
+    levels = topic.split("/")
+    parts = topic_filter.split("/")
+    for index, part in enumerate(parts):
+        if part == "#":
+            return True
+        if index >= len(levels) or (part != "+" and part != levels[index]):
+            return False
+    return len(parts) == len(levels)
+
+
+def valid_filter(topic_filter: str) -> bool:
+    if not topic_filter:
+        return False
+    parts = topic_filter.split("/")
+    for index, part in enumerate(parts):
+        if "#" in part and (part != "#" or index != len(parts) - 1):
+            return False
+        if "+" in part and part != "+":
+            return False
+    return True
+
+
+def _packet(kind: int, flags: int, body: bytes = b"") -> bytes:
+    header = bytearray([kind << 4 | flags])
+    length = len(body)
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(header) + body
+
+
+def _string(data: bytes) -> bytes:
+    return struct.pack("!H", len(data)) + data
+
+
+def _publish_packet(topic: bytes, payload: bytes, qos: int, retain: bool, packet_id: int = 0) -> bytes:
+    body = _string(topic) + (struct.pack("!H", packet_id) if qos else b"") + payload
+    return _packet(PUBLISH, qos << 1 | int(retain), body)
+
+
+class _Body:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+        self._offset = 0
+
+    def uint16(self) -> int:
+        if self._offset + 2 > len(self._data):
+            raise ProtocolError("truncated packet")
+        (value,) = struct.unpack_from("!H", self._data, self._offset)
+        self._offset += 2
+        return value
+
+    def byte(self) -> int:
+        if self._offset >= len(self._data):
+            raise ProtocolError("truncated packet")
+        self._offset += 1
+        return self._data[self._offset - 1]
+
+    def binary(self) -> bytes:
+        length = self.uint16()
+        if self._offset + length > len(self._data):
+            raise ProtocolError("truncated packet")
+        self._offset += length
+        return self._data[self._offset - length : self._offset]
+
+    def string(self) -> str:
+        try:
+            return self.binary().decode("utf-8")
+        except UnicodeDecodeError as exc:
+            raise ProtocolError("invalid UTF-8 string") from exc
+
+    def rest(self) -> bytes:
+        return self._data[self._offset :]
+
+    @property
+    def remaining(self) -> int:
+        return len(self._data) - self._offset
+
+
+class _Session:
+    def __init__(self, client_id: str, writer: asyncio.StreamWriter) -> None:
+        self.client_id = client_id
+        self.writer = writer
+        self.subscriptions: Dict[str, int] = {}
+        self.will: Optional[Tuple[str, bytes, int, bool]] = None
+        self.incoming_qos2: Set[int] = set()
+        self._ids = itertools.cycle(range(1, 65536))
+
+    def next_packet_id(self) -> int:
+        return next(self._ids)
+
+    def granted_qos(self, topic: str) -> int:
+        """Highest QoS of the filters matching ``topic``, or -1 when none match."""
+        granted = -1
+        for topic_filter, qos in self.subscriptions.items():
+            if qos > granted and topic_matches(topic_filter, topic):
+                granted = qos
+        return granted
+
+    def close(self) -> None:
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class Broker:
+    """Small in-process MQTT 3.1.1 broker for local and CI testing.
+
+    Supports QoS 0 and 1 (QoS 2 publishes are accepted and delivered at
+    QoS 1), ``+``/``#`` wildcard subscriptions, retained messages, last-will
+    messages and optional username/password checks. Sessions are not kept
+    after a client disconnects and unacknowledged QoS 1 messages are not
+    redelivered, so it stands in for a real broker in tests and load runs,
+    not in production. QoS 0 messages for a subscriber whose socket buffer
+    is over ``max_buffer_bytes`` are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 1883,
+        credentials: Optional[Mapping[str, str]] = None,
+        max_packet_bytes: int = 1024 * 1024,
+        max_buffer_bytes: int = 8 * 1024 * 1024,
+    ) -> None:
+        self.host = host
+        self._port = port
+        self._credentials = dict(credentials) if credentials else None
+        self._max_packet = max_packet_bytes
+        self._max_buffer = max_buffer_bytes
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._sessions: Dict[str, _Session] = {}
+        self._retained: Dict[str, Tuple[bytes, int]] = {}
+        self._connections: Set["asyncio.Task[None]"] = set()
+        self._received = 0
+        self._delivered = 0
+        self._dropped = 0
+
+    @property
+    def port(self) -> int:
+        """The listening port (the one picked by the OS when started with port 0)."""
+        if self._server is not None and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    def stats(self) -> BrokerStats:
+        return BrokerStats(
+            clients=len(self._sessions),
+            subscriptions=sum(len(session.subscriptions) for session in self._sessions.values()),
+            retained=len(self._retained),
+            received=self._received,
+            delivered=self._delivered,
+            dropped=self._dropped,
+        )
+
+    async def start(self) -> None:
+        if self._server is None:
+            self._server = await asyncio.start_server(self._accept, self.host, self._port)
+            logger.info("MQTT broker listening on %s:%s", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for session in list(self._sessions.values()):
+            session.close()
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        assert self._server is not None
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False) -> None:
+        """Publish from inside the broker process, as if a client had sent it."""
+        self._received += 1
+        self._route(topic, payload, min(qos, _MAX_QOS), retain)
+
+    def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.get_running_loop().create_task(self._serve(reader, writer))
+        self._connections.add(task)
+        task.add_done_callback(self._connections.discard)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session: Optional[_Session] = None
+        graceful = False
+        try:
+            kind, _, body = await asyncio.wait_for(self._read(reader), _CONNECT_TIMEOUT_SEC)
+            if kind != CONNECT:
+                raise ProtocolError("first packet must be CONNECT")
+            session, keepalive = self._connect(body, writer)
+            if session is None:
+                await writer.drain()
+                return
+            timeout = keepalive * 1.5 if keepalive else None
+            while True:
+                kind, flags, body = await asyncio.wait_for(self._read(reader), timeout)
+                if kind == DISCONNECT:
+                    graceful = True
+                    return
+                self._dispatch(session, kind, flags, body)
+                if writer.transport.get_write_buffer_size() > self._max_buffer:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except ProtocolError as exc:
+            logger.warning("Closing MQTT client %s: %s", session.client_id if session else "?", exc)
+        finally:
+            if session is not None and self._sessions.get(session.client_id) is session:
+                del self._sessions[session.client_id]
+                if not graceful and session.will is not None:
+                    topic, payload, qos, retain = session.will
+                    self.publish(topic, payload, qos, retain)
+            writer.close()
+
+    async def _read(self, reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        length = 0
+        for shift in range(0, 28, 7):
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+        else:
+            raise ProtocolError("malformed remaining length")
+        if length > self._max_packet:
+            raise ProtocolError(f"packet of {length} bytes exceeds the limit")
+        body = await reader.readexactly(length) if length else b""
+        return header >> 4, header & 0x0F, body
+
+    def _connect(self, data: bytes, writer: asyncio.StreamWriter) -> Tuple[Optional[_Session], int]:
+        body = _Body(data)
+        protocol, level = body.string(), body.byte()
+        flags, keepalive = body.byte(), body.uint16()
+        if (protocol, level) not in (("MQTT", 4), ("MQIsdp", 3)):
+            writer.write(_packet(CONNACK, 0, bytes([0, _BAD_PROTOCOL])))
+            return None, 0
+        if flags & 0x01:
+            raise ProtocolError("reserved CONNECT flag set")
+
+        client_id = body.string()
+        will = None
+        if flags & 0x04:
+            will_topic, will_payload = body.string(), body.binary()
+            will = (will_topic, will_payload, (flags >> 3) & 0x03, bool(flags & 0x20))
+        username = body.string() if flags & 0x80 else None
+        password = body.binary().decode("utf-8", "replace") if flags & 0x40 else None
+
+        if not client_id:
+            if not flags & 0x02:
+                writer.write(_packet(CONNACK, 0, bytes([0, _BAD_CLIENT_ID])))
+                return None, 0
+            client_id = f"auto-{id(writer):x}"
+        if self._credentials is not None and (username is None or self._credentials.get(username) != password):
+            writer.write(_packet(CONNACK, 0, bytes([0, _BAD_CREDENTIALS])))
+            return None, 0
+
+        previous = self._sessions.get(client_id)
+        if previous is not None:
+            # Same client id: the new connection takes over.
+            previous.will = None
+            previous.close()
+        session = _Session(client_id, writer)
+        session.will = will
+        self._sessions[client_id] = session
+        writer.write(_packet(CONNACK, 0, bytes([0, _ACCEPTED])))
+        return session, keepalive
+
+    def _dispatch(self, session: _Session, kind: int, flags: int, data: bytes) -> None:
+        body = _Body(data)
+        if kind == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            if qos == 3:
+                raise ProtocolError("invalid QoS")
+            topic = body.string()
+            if not topic or "+" in topic or "#" in topic:
+                raise ProtocolError("invalid topic name")
+            packet_id = body.uint16() if qos else 0
+            payload = body.rest()
+            if qos == 1:
+                session.writer.write(_packet(PUBACK, 0, struct.pack("!H", packet_id)))
+            elif qos == 2:
+                session.writer.write(_packet(PUBREC, 0, struct.pack("!H", packet_id)))
+                if packet_id in session.incoming_qos2:
+                    return
+                session.incoming_qos2.add(packet_id)
+            self.publish(topic, payload, qos, bool(flags & 0x01))
+        elif kind == PUBREL:
+            packet_id = body.uint16()
+            session.incoming_qos2.discard(packet_id)
+            session.writer.write(_packet(PUBCOMP, 0, struct.pack("!H", packet_id)))
+        elif kind == SUBSCRIBE:
+            packet_id = body.uint16()
+            granted: List[int] = []
+            new_filters: List[str] = []
+            while body.remaining:
+                topic_filter, requested = body.string(), body.byte() & 0x03
+                if not valid_filter(topic_filter):
+                    granted.append(_SUBACK_FAILURE)
+                    continue
+                qos = min(requested, _MAX_QOS)
+                session.subscriptions[topic_filter] = qos
+                new_filters.append(topic_filter)
+                granted.append(qos)
+            if not granted:
+                raise ProtocolError("SUBSCRIBE without topic filters")
+            session.writer.write(_packet(SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted)))
+            self._send_retained(session, new_filters)
+        elif kind == UNSUBSCRIBE:
+            packet_id = body.uint16()
+            while body.remaining:
+                session.subscriptions.pop(body.string(), None)
+            session.writer.write(_packet(UNSUBACK, 0, struct.pack("!H", packet_id)))
+        elif kind == PINGREQ:
+            session.writer.write(_packet(PINGRESP, 0))
+        elif kind in (PUBACK, PUBCOMP):
+            # Outgoing QoS 1 messages are not redelivered, so there is nothing to release.
+            pass
+        else:
+            raise ProtocolError(f"unexpected packet type {kind}")
+
+    def _route(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        if retain:
+            if payload:
+                self._retained[topic] = (payload, qos)
+            else:
+                self._retained.pop(topic, None)
+        encoded = topic.encode("utf-8")
+        qos0_packet = None
+        for session in list(self._sessions.values()):
+            granted = session.granted_qos(topic)
+            if granted < 0:
+                continue
+            delivery_qos = min(qos, granted)
+            if delivery_qos == 0:
+                if qos0_packet is None:
+                    qos0_packet = _publish_packet(encoded, payload, 0, False)
+                self._send(session, qos0_packet, droppable=True)
+            else:
+                self._send(session, _publish_packet(encoded, payload, 1, False, session.next_packet_id()))
+
+    def _send_retained(self, session: _Session, filters: Sequence[str]) -> None:
+        for topic, (payload, qos) in self._retained.items():
+            if not any(topic_matches(topic_filter, topic) for topic_filter in filters):
+                continue
+            delivery_qos = min(qos, session.granted_qos(topic))
+            packet_id = session.next_packet_id() if delivery_qos else 0
+            self._send(session, _publish_packet(topic.encode("utf-8"), payload, delivery_qos, True, packet_id))
+
+    def _send(self, session: _Session, packet: bytes, droppable: bool = False) -> None:
+        writer = session.writer
+        if writer.is_closing():
+            return
+        if droppable and writer.transport.get_write_buffer_size() > self._max_buffer:
+            self._dropped += 1
+            return
+        writer.write(packet)
+        self._delivered += 1
+
+
+@contextmanager
+def running_broker(host: str = "127.0.0.1", port: int = 0, **kwargs) -> Iterator[Broker]:
+    """Run a broker on a background thread for the duration of the block.
+
+    With the default ``port=0`` the OS picks a free port; read it from
+    ``broker.port``.
+    """
+    broker = Broker(host, port, **kwargs)
+    ready = threading.Event()
+    failure: List[BaseException] = []
+    loop_holder: List[asyncio.AbstractEventLoop] = []
+    stopped: List[asyncio.Event] = []
+
+    async def main() -> None:
+        try:
+            await broker.start()
+        except BaseException as exc:
+            failure.append(exc)
+            ready.set()
+            return
+        loop_holder.append(asyncio.get_running_loop())
+        stopped.append(asyncio.Event())
+        ready.set()
+        await stopped[0].wait()
+        await broker.stop()
+
+    thread = threading.Thread(target=asyncio.run, args=(main(),), name="mqtt-broker", daemon=True)
+    thread.start()
+    ready.wait()
+    if failure:
+        thread.join()
+        raise failure[0]
+    try:
+        yield broker
+    finally:
+        loop_holder[0].call_soon_threadsafe(stopped[0].set)
+        thread.join(10)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m raspberry_module broker",
+        description="Run a local MQTT 3.1.1 broker for development and load tests.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="use 0.0.0.0 to accept other machines")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--username", help="require this username (with --password)")
+    parser.add_argument("--password", default="")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    credentials = {args.username: args.password} if args.username else None
+    broker = Broker(args.host, args.port, credentials=credentials)
+    try:
+        asyncio.run(broker.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    stats = broker.stats()
+    print(f"Received {stats.received} messages, delivered {stats.delivered}, dropped {stats.dropped}")
+    return 0
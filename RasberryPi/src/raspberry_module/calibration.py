@@ -0,0 +1,274 @@
+import json
+from bisect import bisect_right
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Spec defaults: Frequency = Speed / BeltFactor, Voltage = Frequency * 10 / 50.
+DEFAULT_BELT_FACTOR = 1.0
+DEFAULT_VOLTS_PER_HZ = 10.0 / 50.0
+
+_CHAIN_KEYS = ("belt_factor", "speed_to_frequency", "volts_per_hz", "frequency_to_voltage")
+# A line that sets any key of a stage replaces that whole stage of the default.
+_STAGES = (("pitch_distance", "ct_to_speed"), ("speed_to_voltage",) + _CHAIN_KEYS)
+
+
+class Curve:
+    """Monotonic piecewise-linear curve compiled to sorted breakpoint arrays.
+
+    Evaluation is one bisect plus a linear interpolation; inputs outside the
+    table are clamped to the first or last point.
+    """
+
+    __slots__ = ("xs", "ys", "increasing")
+
+    def __init__(self, points: Iterable[Sequence[float]]) -> None:
+        pairs = sorted((float(x), float(y)) for x, y in points)
+        if len(pairs) < 2:
+            raise ValueError("a curve needs at least two points")
+
+        xs = tuple(x for x, _ in pairs)
+        ys = tuple(y for _, y in pairs)
+        if any(b <= a for a, b in zip(xs, xs[1:])):
+            raise ValueError("curve x values must be distinct")
+
+        steps = [b - a for a, b in zip(ys, ys[1:])]
+        if all(step >= 0 for step in steps):
+            increasing = True
+        elif all(step <= 0 for step in steps):
+            increasing = False
+        else:
+            raise ValueError("curve must be monotonic")
+
+        self.xs = xs
+        self.ys = ys
+        self.increasing = increasing
+
+    @classmethod
+    def linear(cls, slope: float, x_min: float, x_max: float) -> "Curve":
+        if x_max <= x_min:
+            x_max = x_min + 1.0
+        return cls([(x_min, slope * x_min), (x_max, slope * x_max)])
+
+    @property
+    def points(self) -> List[Tuple[float, float]]:
+        return list(zip(self.xs, self.ys))
+
+    def __call__(self, x: float) -> float:
+        xs, ys = self.xs, self.ys
+        if x <= xs[0]:
+            return ys[0]
+        if x >= xs[-1]:
+            return ys[-1]
+        i = bisect_right(xs, x)
+        x0, x1 = xs[i - 1], xs[i]
+        y0, y1 = ys[i - 1], ys[i]
+        return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+    def inverse(self, y: float) -> float:
+        xs, ys = self.xs, self.ys
+        if not self.increasing:
+            xs, ys = xs[::-1], ys[::-1]
+        if y <= ys[0]:
+            return xs[0]
+        if y >= ys[-1]:
+            return xs[-1]
+        i = bisect_right(ys, y)
+        y0, y1 = ys[i - 1], ys[i]
+        x0, x1 = xs[i - 1], xs[i]
+        if y1 == y0:
+            return x0
+        return x0 + (x1 - x0) * (y - y0) / (y1 - y0)
+
+    def compose(self, inner: "Curve") -> "Curve":
+        """Return the curve ``x -> self(inner(x))`` over the domain of ``inner``.
+
+        Both curves are piecewise linear and monotonic, so the composition is
+        exact when breakpoints are taken from ``inner`` plus the preimages of
+        this curve's breakpoints.
+        """
+        low, high = min(inner.ys), max(inner.ys)
+        xs = set(inner.xs)
+        xs.update(inner.inverse(x) for x in self.xs if low < x < high)
+        return Curve((x, self(inner(x))) for x in sorted(xs))
+
+
+@dataclass(frozen=True)
+class LineCalibration:
+    speed_to_voltage: Curve
+    pitch_distance: float = 1.0
+    ct_to_speed: Optional[Curve] = None
+    voltage_min: float = 0.0
+    voltage_max: float = 10.0
+
+    def speed(self, cycle_time_minutes: float) -> float:
+        if self.ct_to_speed is not None:
+            return self.ct_to_speed(cycle_time_minutes)
+        return self.pitch_distance / cycle_time_minutes
+
+    def cycle_time(self, speed: float) -> float:
+        if self.ct_to_speed is not None:
+            return self.ct_to_speed.inverse(speed)
+        return self.pitch_distance / speed
+
+    def voltage(self, speed: float) -> float:
+        return max(self.voltage_min, min(self.voltage_max, self.speed_to_voltage(speed)))
+
+    def to_dict(self) -> dict:
+        return {
+            "pitch_distance": self.pitch_distance,
+            "ct_to_speed": self.ct_to_speed.points if self.ct_to_speed else None,
+            "speed_to_voltage": self.speed_to_voltage.points,
+        }
+
+
+class CalibrationTable:
+    """Per-line CT -> speed -> voltage calibration.
+
+    Instances are immutable; controllers swap the whole table to recalibrate,
+    so an update never mixes curves from the old and the new table.
+    """
+
+    def __init__(
+        self,
+        default: LineCalibration,
+        lines: Optional[Mapping[str, LineCalibration]] = None,
+    ) -> None:
+        self._default = default
+        self._lines = MappingProxyType(dict(lines or {}))
+
+    @property
+    def default(self) -> LineCalibration:
+        return self._default
+
+    @property
+    def lines(self) -> Mapping[str, LineCalibration]:
+        return self._lines
+
+    def for_line(self, line_id: str) -> LineCalibration:
+        return self._lines.get(line_id, self._default)
+
+    def to_dict(self) -> dict:
+        return {
+            "default": self._default.to_dict(),
+            "lines": {line_id: line.to_dict() for line_id, line in self._lines.items()},
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Mapping[str, Any],
+        speed_min: float,
+        speed_max: float,
+        voltage_min: float,
+        voltage_max: float,
+        pitch_distance: float = 1.0,
+    ) -> "CalibrationTable":
+        if not isinstance(data, Mapping):
+            raise ValueError("calibration must be a JSON object")
+        lines_data = data.get("lines") or {}
+        if not isinstance(lines_data, Mapping):
+            raise ValueError("calibration 'lines' must be an object")
+        default_data = data.get("default") or {}
+        if not isinstance(default_data, Mapping):
+            raise ValueError("calibration 'default' must be an object")
+
+        limits = (speed_min, speed_max, voltage_min, voltage_max)
+        base = {"pitch_distance": pitch_distance, **default_data}
+        default = _compile_line("default", base, *limits)
+        lines = {
+            str(line_id): _compile_line(str(line_id), _merge(base, profile), *limits)
+            for line_id, profile in lines_data.items()
+        }
+        return cls(default, lines)
+
+    @classmethod
+    def load(
+        cls,
+        path: Optional[Path],
+        speed_min: float,
+        speed_max: float,
+        voltage_min: float,
+        voltage_max: float,
+        pitch_distance: float = 1.0,
+    ) -> "CalibrationTable":
+        data: Mapping[str, Any] = {}
+        if path is not None and str(path).strip():
+            with open(path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+            logger.info("Loaded calibration from %s", path)
+        return cls.from_dict(data, speed_min, speed_max, voltage_min, voltage_max, pitch_distance)
+
+
+def _merge(base: Mapping[str, Any], profile: Mapping[str, Any]) -> dict:
+    if not isinstance(profile, Mapping):
+        raise ValueError("calibration line profiles must be objects")
+    merged = dict(base)
+    for stage in _STAGES:
+        if any(key in profile for key in stage):
+            for key in stage:
+                merged.pop(key, None)
+    merged.update(profile)
+    return merged
+
+
+def _compile_line(
+    line_id: str,
+    profile: Mapping[str, Any],
+    speed_min: float,
+    speed_max: float,
+    voltage_min: float,
+    voltage_max: float,
+) -> LineCalibration:
+    try:
+        pitch_distance = float(profile.get("pitch_distance", 1.0))
+        if pitch_distance <= 0:
+            raise ValueError("pitch_distance must be > 0")
+        ct_to_speed = Curve(profile["ct_to_speed"]) if profile.get("ct_to_speed") else None
+
+        if profile.get("speed_to_voltage"):
+            speed_to_voltage = Curve(profile["speed_to_voltage"])
+        elif any(profile.get(key) is not None for key in _CHAIN_KEYS):
+            speed_to_voltage = _chain_curve(profile, speed_min, speed_max)
+        else:
+            # Linear map of the speed range onto the voltage range.
+            if speed_max > speed_min:
+                speed_to_voltage = Curve([(speed_min, voltage_min), (speed_max, voltage_max)])
+            else:
+                speed_to_voltage = Curve([(speed_min, voltage_min), (speed_min + 1.0, voltage_min)])
+    except (TypeError, KeyError, ValueError) as exc:
+        raise ValueError(f"invalid calibration for line {line_id}: {exc}") from exc
+
+    return LineCalibration(
+        speed_to_voltage=speed_to_voltage,
+        pitch_distance=pitch_distance,
+        ct_to_speed=ct_to_speed,
+        voltage_min=voltage_min,
+        voltage_max=voltage_max,
+    )
+
+
+def _chain_curve(profile: Mapping[str, Any], speed_min: float, speed_max: float) -> Curve:
+    if profile.get("speed_to_frequency"):
+        speed_to_frequency = Curve(profile["speed_to_frequency"])
+    else:
+        belt_factor = float(profile.get("belt_factor", DEFAULT_BELT_FACTOR))
+        if belt_factor <= 0:
+            raise ValueError("belt_factor must be > 0")
+        speed_to_frequency = Curve.linear(1.0 / belt_factor, speed_min, speed_max)
+
+    if profile.get("frequency_to_voltage"):
+        frequency_to_voltage = Curve(profile["frequency_to_voltage"])
+    else:
+        volts_per_hz = float(profile.get("volts_per_hz", DEFAULT_VOLTS_PER_HZ))
+        if volts_per_hz <= 0:
+            raise ValueError("volts_per_hz must be > 0")
+        frequency_to_voltage = Curve.linear(
+            volts_per_hz, min(speed_to_frequency.ys), max(speed_to_frequency.ys)
+        )
+    return frequency_to_voltage.compose(speed_to_frequency)
@@ -0,0 +1,30 @@
+import time
+from datetime import datetime, timezone
+
+
+class Clock:
+    """Wall-clock and monotonic time used by the controller."""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+
+class SimulatedClock(Clock):
+    """Clock that only moves when told to, for replaying recorded traffic."""
+
+    def __init__(self, start: datetime) -> None:
+        self._origin = start
+        self._now = start
+
+    def now(self) -> datetime:
+        return self._now
+
+    def monotonic(self) -> float:
+        return (self._now - self._origin).total_seconds()
+
+    def advance_to(self, moment: datetime) -> None:
+        if moment > self._now:
+            self._now = moment
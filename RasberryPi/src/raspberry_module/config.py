@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 import os
 
 
@@ -31,12 +32,41 @@ class AppConfig:
     ramp_rate_v_per_sec: float
     max_timestamp_age_sec: int
     ct_filter_window_samples: int = 5
+    ct_filter_type: str = "sma"
+    ct_filter_window_sec: float = 60.0
+    ct_filter_ema_alpha: float = 0.0
     mqtt_enabled: bool = True
     mqtt_host: str = "localhost"
     mqtt_port: int = 1883
     mqtt_topic: str = "yazaki/line/+/ct"
     mqtt_speed_response_topic: str = "yazaki/line/{line_id}/speed"
     ct_to_speed_factor: float = 1.0
+    storage_write_behind: bool = True
+    storage_batch_size: int = 200
+    storage_flush_interval_ms: int = 250
+    storage_queue_size: int = 10000
+    export_rotation: str = "daily"
+    export_keep_files: int = 30
+    retention_command_log_days: float = 0.0
+    retention_output_log_days: float = 0.0
+    retention_event_log_days: float = 0.0
+    retention_rollup_minute_days: float = 0.0
+    retention_rollup_hour_days: float = 0.0
+    retention_max_db_mb: float = 0.0
+    retention_interval_sec: int = 3600
+    retention_batch_size: int = 500
+    control_queue_size: int = 1000
+    output_rate_hz: float = 50.0
+    calibration_path: Optional[Path] = None
+    command_batch_max_items: int = 10000
+    command_high_watermark: float = 0.8
+    command_retry_after_sec: int = 1
+    mqtt_ingest_queue_size: int = 1000
+    mqtt_ingest_workers: int = 2
+    mqtt_conflate: bool = False
+    mqtt_conflate_feed_filter: bool = True
+    mqtt_transport: str = "auto"
+    mqtt_dedup: bool = True
 
     @classmethod
     def load(cls) -> "AppConfig":
@@ -55,12 +85,42 @@ class AppConfig:
         ramp_rate_v_per_sec = _get_float("RASPI_RAMP_RATE_V_PER_SEC", 1.0)
         max_timestamp_age_sec = _get_int("RASPI_MAX_TIMESTAMP_AGE_SEC", 30)
         ct_filter_window_samples = max(1, _get_int("RASPI_CT_FILTER_WINDOW_SAMPLES", 5))
+        ct_filter_type = os.getenv("RASPI_CT_FILTER_TYPE", "sma").strip().lower()
+        ct_filter_window_sec = _get_float("RASPI_CT_FILTER_WINDOW_SEC", 60.0)
+        ct_filter_ema_alpha = _get_float("RASPI_CT_FILTER_EMA_ALPHA", 0.0)
         mqtt_enabled = _get_bool("RASPI_MQTT_ENABLED", True)
         mqtt_host = os.getenv("RASPI_MQTT_HOST", "localhost")
         mqtt_port = _get_int("RASPI_MQTT_PORT", 1883)
         mqtt_topic = os.getenv("RASPI_MQTT_TOPIC", "yazaki/line/+/ct")
         mqtt_speed_response_topic = os.getenv("RASPI_MQTT_SPEED_RESPONSE_TOPIC", "yazaki/line/{line_id}/speed")
         ct_to_speed_factor = _get_float("RASPI_CT_TO_SPEED_FACTOR", 1.0)
+        storage_write_behind = _get_bool("RASPI_STORAGE_WRITE_BEHIND", True)
+        storage_batch_size = max(1, _get_int("RASPI_STORAGE_BATCH_SIZE", 200))
+        storage_flush_interval_ms = max(0, _get_int("RASPI_STORAGE_FLUSH_INTERVAL_MS", 250))
+        storage_queue_size = max(1, _get_int("RASPI_STORAGE_QUEUE_SIZE", 10000))
+        export_rotation = os.getenv("RASPI_EXPORT_ROTATION", "daily").strip().lower()
+        export_keep_files = max(0, _get_int("RASPI_EXPORT_KEEP_FILES", 30))
+        retention_command_log_days = _get_float("RASPI_RETENTION_COMMAND_LOG_DAYS", 0.0)
+        retention_output_log_days = _get_float("RASPI_RETENTION_OUTPUT_LOG_DAYS", 0.0)
+        retention_event_log_days = _get_float("RASPI_RETENTION_EVENT_LOG_DAYS", 0.0)
+        retention_rollup_minute_days = _get_float("RASPI_RETENTION_ROLLUP_MINUTE_DAYS", 0.0)
+        retention_rollup_hour_days = _get_float("RASPI_RETENTION_ROLLUP_HOUR_DAYS", 0.0)
+        retention_max_db_mb = _get_float("RASPI_RETENTION_MAX_DB_MB", 0.0)
+        retention_interval_sec = max(1, _get_int("RASPI_RETENTION_INTERVAL_SEC", 3600))
+        retention_batch_size = max(1, _get_int("RASPI_RETENTION_BATCH_SIZE", 500))
+        control_queue_size = max(1, _get_int("RASPI_CONTROL_QUEUE_SIZE", 1000))
+        output_rate_hz = max(0.0, _get_float("RASPI_OUTPUT_RATE_HZ", 50.0))
+        calibration_raw = os.getenv("RASPI_CALIBRATION_PATH", "").strip()
+        calibration_path = Path(calibration_raw) if calibration_raw else None
+        command_batch_max_items = max(1, _get_int("RASPI_COMMAND_BATCH_MAX_ITEMS", 10000))
+        command_high_watermark = min(1.0, max(0.0, _get_float("RASPI_COMMAND_HIGH_WATERMARK", 0.8)))
+        command_retry_after_sec = max(1, _get_int("RASPI_COMMAND_RETRY_AFTER_SEC", 1))
+        mqtt_ingest_queue_size = max(1, _get_int("RASPI_MQTT_INGEST_QUEUE_SIZE", 1000))
+        mqtt_ingest_workers = max(1, _get_int("RASPI_MQTT_INGEST_WORKERS", 2))
+        mqtt_conflate = _get_bool("RASPI_MQTT_CONFLATE", False)
+        mqtt_conflate_feed_filter = _get_bool("RASPI_MQTT_CONFLATE_FEED_FILTER", True)
+        mqtt_transport = os.getenv("RASPI_MQTT_TRANSPORT", "auto").strip().lower() or "auto"
+        mqtt_dedup = _get_bool("RASPI_MQTT_DEDUP", True)
 
         return cls(
             base_dir=base_dir,
@@ -75,12 +135,41 @@ class AppConfig:
             ramp_rate_v_per_sec=ramp_rate_v_per_sec,
             max_timestamp_age_sec=max_timestamp_age_sec,
             ct_filter_window_samples=ct_filter_window_samples,
+            ct_filter_type=ct_filter_type,
+            ct_filter_window_sec=ct_filter_window_sec,
+            ct_filter_ema_alpha=ct_filter_ema_alpha,
             mqtt_enabled=mqtt_enabled,
             mqtt_host=mqtt_host,
             mqtt_port=mqtt_port,
             mqtt_topic=mqtt_topic,
             mqtt_speed_response_topic=mqtt_speed_response_topic,
             ct_to_speed_factor=ct_to_speed_factor,
+            storage_write_behind=storage_write_behind,
+            storage_batch_size=storage_batch_size,
+            storage_flush_interval_ms=storage_flush_interval_ms,
+            storage_queue_size=storage_queue_size,
+            export_rotation=export_rotation,
+            export_keep_files=export_keep_files,
+            retention_command_log_days=retention_command_log_days,
+            retention_output_log_days=retention_output_log_days,
+            retention_event_log_days=retention_event_log_days,
+            retention_rollup_minute_days=retention_rollup_minute_days,
+            retention_rollup_hour_days=retention_rollup_hour_days,
+            retention_max_db_mb=retention_max_db_mb,
+            retention_interval_sec=retention_interval_sec,
+            retention_batch_size=retention_batch_size,
+            control_queue_size=control_queue_size,
+            output_rate_hz=output_rate_hz,
+            calibration_path=calibration_path,
+            command_batch_max_items=command_batch_max_items,
+            command_high_watermark=command_high_watermark,
+            command_retry_after_sec=command_retry_after_sec,
+            mqtt_ingest_queue_size=mqtt_ingest_queue_size,
+            mqtt_ingest_workers=mqtt_ingest_workers,
+            mqtt_conflate=mqtt_conflate,
+            mqtt_conflate_feed_filter=mqtt_conflate_feed_filter,
+            mqtt_transport=mqtt_transport,
+            mqtt_dedup=mqtt_dedup,
         )
 
 
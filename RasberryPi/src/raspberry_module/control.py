@@ -1,11 +1,14 @@
-from dataclasses import dataclass
-from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
 
 import logging
 
+from .calibration import CalibrationTable
+from .clock import Clock
 from .config import AppConfig
+from .filters import CycleTimeFilter, create_filter
 from .models import CommandIn
 from .storage import Storage
 
@@ -19,59 +22,168 @@ class ControlResult:
     voltage: float
     reason: str
     applied_at: datetime
+    target_voltage: float
 
 
-@dataclass
+@dataclass(frozen=True)
 class ChainStateSnapshot:
     is_running: Optional[bool]
     encoder_delta: Optional[float]
     updated_at: datetime
 
 
+@dataclass(frozen=True)
+class LineSnapshot:
+    line_id: str
+    last_valid_speed: Optional[float]
+    target_voltage: Optional[float]
+    last_filtered_cycle_time: Optional[float]
+    last_chain_state: Optional[ChainStateSnapshot]
+    updated_at: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class ControllerSnapshot:
+    version: int = 0
+    last_line_id: Optional[str] = None
+    lines: Mapping[str, LineSnapshot] = field(default_factory=lambda: MappingProxyType({}))
+
+    @property
+    def last_line(self) -> Optional[LineSnapshot]:
+        return self.lines.get(self.last_line_id) if self.last_line_id else None
+
+
+class LineState:
+    __slots__ = (
+        "line_id",
+        "ct_filter",
+        "last_valid_speed",
+        "target_voltage",
+        "last_output_time",
+        "last_filtered_cycle_time",
+        "last_chain_state",
+    )
+
+    def __init__(self, line_id: str, ct_filter: CycleTimeFilter) -> None:
+        self.line_id = line_id
+        self.ct_filter = ct_filter
+        self.last_valid_speed: Optional[float] = None
+        self.target_voltage: Optional[float] = None
+        self.last_output_time: Optional[datetime] = None
+        self.last_filtered_cycle_time: Optional[float] = None
+        self.last_chain_state: Optional[ChainStateSnapshot] = None
+
+
 class SpeedController:
-    def __init__(self, config: AppConfig, storage: Storage) -> None:
+    def __init__(
+        self,
+        config: AppConfig,
+        storage: Storage,
+        clock: Optional[Clock] = None,
+        listener: Optional[Callable[[LineSnapshot], None]] = None,
+        applied_voltages: Optional[Callable[[], Mapping[str, float]]] = None,
+    ) -> None:
         self._config = config
         self._storage = storage
-        self._last_valid_speed: Optional[float] = None
-        self._last_voltage: Optional[float] = None
-        self._last_output_time: Optional[datetime] = None
-        self._ct_history: deque[float] = deque(maxlen=max(1, config.ct_filter_window_samples))
-        self._last_filtered_cycle_time: Optional[float] = None
-        self._last_chain_state: Optional[ChainStateSnapshot] = None
+        self._clock = clock or Clock()
+        self._listener = listener
+        self._applied_voltages = applied_voltages
+        self._lines: Dict[str, LineState] = {}
+        self._last_line: Optional[LineState] = None
+        self._snapshot = ControllerSnapshot()
+        self._calibration = CalibrationTable.load(
+            config.calibration_path,
+            config.speed_min,
+            config.speed_max,
+            config.voltage_min,
+            config.voltage_max,
+            pitch_distance=config.ct_to_speed_factor,
+        )
+
+    @property
+    def calibration(self) -> CalibrationTable:
+        return self._calibration
+
+    def set_calibration(self, calibration: CalibrationTable) -> None:
+        self._calibration = calibration
+
+    @property
+    def snapshot(self) -> ControllerSnapshot:
+        # Replaced wholesale after every update, so readers on other threads
+        # always see a consistent state without taking a lock.
+        return self._snapshot
+
+    @property
+    def line_ids(self) -> List[str]:
+        return sorted(self._lines)
+
+    @property
+    def last_line_id(self) -> Optional[str]:
+        return self._last_line.line_id if self._last_line else None
 
     @property
     def last_valid_speed(self) -> Optional[float]:
-        return self._last_valid_speed
+        return self._last_line.last_valid_speed if self._last_line else None
 
     @property
-    def last_voltage(self) -> Optional[float]:
-        return self._last_voltage
+    def target_voltage(self) -> Optional[float]:
+        return self._last_line.target_voltage if self._last_line else None
 
     @property
     def last_filtered_cycle_time(self) -> Optional[float]:
-        return self._last_filtered_cycle_time
+        return self._last_line.last_filtered_cycle_time if self._last_line else None
 
     @property
     def last_chain_state(self) -> Optional[ChainStateSnapshot]:
-        return self._last_chain_state
-
-    def process_command(self, command: CommandIn) -> ControlResult:
-        received_at = datetime.now(timezone.utc)
+        return self._last_line.last_chain_state if self._last_line else None
+
+    def get_line_state(self, line_id: str) -> Optional[LineState]:
+        return self._lines.get(line_id)
+
+    def _line_state(self, line_id: str) -> LineState:
+        state = self._lines.get(line_id)
+        if state is None:
+            state = LineState(
+                line_id,
+                create_filter(
+                    self._config.ct_filter_type,
+                    window_samples=self._config.ct_filter_window_samples,
+                    window_sec=self._config.ct_filter_window_sec,
+                    ema_alpha=self._config.ct_filter_ema_alpha,
+                ),
+            )
+            self._lines[line_id] = state
+        return state
+
+    def process_command(
+        self,
+        command: CommandIn,
+        encoder_delta: Optional[float] = None,
+        raw_extra: Optional[dict] = None,
+    ) -> ControlResult:
+        received_at = self._clock.now()
         status, reason = self._validate_command(command, received_at)
+        line = self._line_state(command.line_id)
 
         if status == "valid":
-            self._last_valid_speed = command.speed
+            line.last_valid_speed = command.speed
             speed_used = command.speed
         else:
-            speed_used = self._last_valid_speed
+            speed_used = line.last_valid_speed
             if speed_used is None:
                 speed_used = self._config.default_speed
 
-        target_voltage = self._speed_to_voltage(speed_used)
-        applied_voltage = target_voltage
-        self._last_voltage = applied_voltage
-        self._last_output_time = received_at
-
+        # The output loop slews the applied voltage toward this target.
+        target_voltage = self._speed_to_voltage(command.line_id, speed_used)
+        voltage = self._applied_voltage(command.line_id, target_voltage)
+        line.target_voltage = target_voltage
+        line.last_output_time = received_at
+        self._last_line = line
+        self._publish(line)
+
+        raw_json = command.model_dump(mode="json")
+        if raw_extra:
+            raw_json.update(raw_extra)
         self._storage.log_command(
             received_at=received_at,
             line_id=command.line_id,
@@ -80,67 +192,110 @@ class SpeedController:
             timestamp=command.timestamp,
             status=status,
             reason=reason,
-            raw_json=command.model_dump(mode="json"),
+            raw_json=raw_json,
         )
         self._storage.log_output(
             created_at=received_at,
             speed_used=speed_used,
-            voltage=applied_voltage,
+            voltage=voltage,
             reason=reason,
+            line_id=command.line_id,
+            status=status,
+            encoder_delta=encoder_delta,
+            target_voltage=target_voltage,
         )
 
         return ControlResult(
             status=status,
             speed_used=speed_used,
-            voltage=applied_voltage,
+            voltage=voltage,
             reason=reason,
             applied_at=received_at,
+            target_voltage=target_voltage,
         )
 
+    def process_batch(self, commands: List[CommandIn]) -> List[ControlResult]:
+        with self._storage.batch():
+            return [self.process_command(command) for command in commands]
+
     def process_cycle_time(
         self,
         line_id: str,
         cycle_time_minutes: float,
         mode: str = "mqtt",
         chain_state: Optional[dict] = None,
+        skipped: Sequence[float] = (),
     ) -> ControlResult:
+        """Filter a cycle time and apply the resulting speed.
+
+        ``skipped`` holds older cycle times that were conflated away before
+        this one; they only update the filter, in order, and are not applied.
+        """
         if cycle_time_minutes <= 0:
             raise ValueError("cycle_time_minutes must be > 0")
 
+        line = self._line_state(line_id)
+        encoder_delta = None
         if chain_state is not None:
-            self._update_chain_state(chain_state)
+            self._update_chain_state(line, chain_state)
+            encoder_delta = line.last_chain_state.encoder_delta
 
-        filtered_cycle_time = self._filter_cycle_time(cycle_time_minutes)
-        self._last_filtered_cycle_time = filtered_cycle_time
+        for skipped_cycle_time in skipped:
+            if skipped_cycle_time > 0:
+                self._filter_cycle_time(line, skipped_cycle_time)
+        filtered_cycle_time = self._filter_cycle_time(line, cycle_time_minutes)
+        line.last_filtered_cycle_time = filtered_cycle_time
 
-        speed = (self._config.ct_to_speed_factor / filtered_cycle_time)
+        speed = self._calibration.for_line(line_id).speed(filtered_cycle_time)
         speed = max(self._config.speed_min, min(self._config.speed_max, speed))
 
         command = CommandIn(
             line_id=line_id,
             speed=speed,
             mode=mode,
-            timestamp=datetime.now(timezone.utc),
+            timestamp=self._clock.now(),
         )
-        return self.process_command(command)
+        # Keep the raw cycle time so recorded traffic can be replayed through the filter.
+        raw_extra = {"cycle_time_minutes": cycle_time_minutes, "chain_state": chain_state}
+        if skipped:
+            raw_extra["skipped_cycle_times"] = list(skipped)
+        return self.process_command(command, encoder_delta=encoder_delta, raw_extra=raw_extra)
+
+    def _publish(self, line: LineState) -> None:
+        lines = dict(self._snapshot.lines)
+        lines[line.line_id] = published = LineSnapshot(
+            line_id=line.line_id,
+            last_valid_speed=line.last_valid_speed,
+            target_voltage=line.target_voltage,
+            last_filtered_cycle_time=line.last_filtered_cycle_time,
+            last_chain_state=line.last_chain_state,
+            updated_at=line.last_output_time,
+        )
+        self._snapshot = ControllerSnapshot(
+            version=self._snapshot.version + 1,
+            last_line_id=line.line_id,
+            lines=MappingProxyType(lines),
+        )
+        if self._listener is not None:
+            try:
+                self._listener(published)
+            except Exception as exc:
+                logger.warning("Controller listener failed for line %s: %s", line.line_id, exc)
 
-    def _filter_cycle_time(self, cycle_time_minutes: float) -> float:
-        self._ct_history.append(cycle_time_minutes)
-        if not self._ct_history:
-            return cycle_time_minutes
-        return sum(self._ct_history) / len(self._ct_history)
+    def _filter_cycle_time(self, line: LineState, cycle_time_minutes: float) -> float:
+        return line.ct_filter.update(cycle_time_minutes, self._clock.monotonic())
 
-    def _update_chain_state(self, chain_state: dict) -> None:
+    def _update_chain_state(self, line: LineState, chain_state: dict) -> None:
         is_running_raw = chain_state.get("is_running")
         encoder_delta_raw = chain_state.get("encoder_delta")
 
         is_running = bool(is_running_raw) if is_running_raw is not None else None
         encoder_delta = float(encoder_delta_raw) if encoder_delta_raw is not None else None
 
-        self._last_chain_state = ChainStateSnapshot(
+        line.last_chain_state = ChainStateSnapshot(
             is_running=is_running,
             encoder_delta=encoder_delta,
-            updated_at=datetime.now(timezone.utc),
+            updated_at=self._clock.now(),
         )
 
     def _validate_command(self, command: CommandIn, received_at: datetime) -> Tuple[str, str]:
@@ -154,34 +309,11 @@ class SpeedController:
 
         return "valid", "ok"
 
-    def _speed_to_voltage(self, speed: float) -> float:
-        span = self._config.speed_max - self._config.speed_min
-        if span <= 0:
-            return self._config.voltage_min
-
-        ratio = (speed - self._config.speed_min) / span
-        ratio = max(0.0, min(1.0, ratio))
-        return self._config.voltage_min + ratio * (
-            self._config.voltage_max - self._config.voltage_min
-        )
-
-    def _apply_ramp(self, target_voltage: float, now: datetime) -> float:
-        if self._last_voltage is None or self._last_output_time is None:
-            self._last_voltage = target_voltage
-            self._last_output_time = now
-            return target_voltage
-
-        dt = (now - self._last_output_time).total_seconds()
-        if dt <= 0:
-            self._last_voltage = target_voltage
-            self._last_output_time = now
+    def _applied_voltage(self, line_id: str, target_voltage: float) -> float:
+        # Without an output loop, or before it has driven the line, the target is what gets applied.
+        if self._applied_voltages is None:
             return target_voltage
+        return self._applied_voltages().get(line_id, target_voltage)
 
-        max_step = max(0.0, self._config.ramp_rate_v_per_sec) * dt
-        delta = target_voltage - self._last_voltage
-        if abs(delta) > max_step:
-            delta = max_step if delta > 0 else -max_step
-
-        self._last_voltage = self._last_voltage + delta
-        self._last_output_time = now
-        return self._last_voltage
+    def _speed_to_voltage(self, line_id: str, speed: float) -> float:
+        return self._calibration.for_line(line_id).voltage(speed)
@@ -0,0 +1,151 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import logging
+
+from .storage import EXPORT_TABLES, ExportResult, Storage
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+@dataclass
+class ExportJob:
+    id: str
+    full: bool
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    current_table: Optional[str] = None
+    rows_total: int = 0
+    rows_done: int = 0
+    results: Dict[str, ExportResult] = field(default_factory=dict)
+    error: Optional[str] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        progress = 1.0 if self.status == "done" else 0.0
+        if self.status != "done" and self.rows_total > 0:
+            progress = min(1.0, self.rows_done / self.rows_total)
+        return {
+            "id": self.id,
+            "full": self.full,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "current_table": self.current_table,
+            "rows_total": self.rows_total,
+            "rows_done": self.rows_done,
+            "progress": round(progress, 4),
+            "results": {name: asdict(result) for name, result in self.results.items()},
+            "error": self.error,
+        }
+
+
+class ExportJobManager:
+    def __init__(
+        self,
+        storage: Storage,
+        output_dir: Path,
+        rotation: str = "daily",
+        keep_files: int = 0,
+        max_jobs: int = 20,
+    ) -> None:
+        self._storage = storage
+        self._output_dir = output_dir
+        self._rotation = rotation
+        self._keep_files = keep_files
+        self._max_jobs = max(1, max_jobs)
+        self._jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+
+    def submit(self, full: bool = False) -> ExportJob:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.full == full and job.status in ACTIVE_STATUSES:
+                    return job
+
+            job = ExportJob(
+                id=uuid.uuid4().hex,
+                full=full,
+                status="queued",
+                created_at=datetime.now(timezone.utc),
+            )
+            self._jobs[job.id] = job
+            self._evict_finished()
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job: ExportJob) -> dict:
+        with self._lock:
+            return job.to_dict()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: ExportJob) -> None:
+        table_rows: Dict[str, int] = {}
+
+        def progress(table_name: str, rows: int) -> None:
+            table_rows[table_name] = rows
+            with self._lock:
+                job.current_table = table_name
+                job.rows_done = sum(table_rows.values())
+
+        try:
+            rows_total = sum(
+                self._storage.count_rows(
+                    table_name, 0 if job.full else self._storage.get_watermark(table_name)
+                )
+                for table_name in EXPORT_TABLES
+            )
+            with self._lock:
+                job.status = "running"
+                job.started_at = datetime.now(timezone.utc)
+                job.rows_total = rows_total
+
+            results = self._storage.export_incremental(
+                self._output_dir,
+                full=job.full,
+                rotation=self._rotation,
+                keep_files=self._keep_files,
+                on_progress=progress,
+            )
+            with self._lock:
+                job.results = results
+                job.rows_done = sum(result.rows for result in results.values())
+                job.current_table = None
+                job.status = "done"
+        except Exception as exc:
+            logger.exception("Export job %s failed", job.id)
+            with self._lock:
+                job.status = "failed"
+                job.error = str(exc)
+        finally:
+            with self._lock:
+                job.finished_at = datetime.now(timezone.utc)
+            job.done.set()
+
+    def _evict_finished(self) -> None:
+        while len(self._jobs) > self._max_jobs:
+            for job_id, job in self._jobs.items():
+                if job.status not in ACTIVE_STATUSES:
+                    del self._jobs[job_id]
+                    break
+            else:
+                return
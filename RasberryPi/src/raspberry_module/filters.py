@@ -0,0 +1,211 @@
+import heapq
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+FILTER_TYPES = ("sma", "ema", "twma", "median")
+
+
+class CycleTimeFilter(ABC):
+    @abstractmethod
+    def update(self, value: float, now: Optional[float] = None) -> float:
+        """Add a sample and return the filtered cycle time."""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Forget every sample."""
+
+
+class MovingAverageFilter(CycleTimeFilter):
+    """Simple moving average over the last ``window`` samples with a running sum."""
+
+    # Re-sum the window now and then so floating-point drift cannot accumulate.
+    _RESYNC_EVERY = 10000
+
+    def __init__(self, window: int) -> None:
+        self._window = max(1, window)
+        self._samples: Deque[float] = deque()
+        self._sum = 0.0
+        self._updates = 0
+
+    def update(self, value: float, now: Optional[float] = None) -> float:
+        self._samples.append(value)
+        self._sum += value
+        if len(self._samples) > self._window:
+            self._sum -= self._samples.popleft()
+
+        self._updates += 1
+        if self._updates >= self._RESYNC_EVERY:
+            self._sum = sum(self._samples)
+            self._updates = 0
+        return self._sum / len(self._samples)
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._sum = 0.0
+        self._updates = 0
+
+
+class ExponentialFilter(CycleTimeFilter):
+    def __init__(self, alpha: float) -> None:
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("alpha must be in (0, 1]")
+        self._alpha = alpha
+        self._value: Optional[float] = None
+
+    def update(self, value: float, now: Optional[float] = None) -> float:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self._alpha * (value - self._value)
+        return self._value
+
+    def reset(self) -> None:
+        self._value = None
+
+
+class TimeWeightedFilter(CycleTimeFilter):
+    """Moving average over the last ``window_sec`` seconds for irregular arrivals.
+
+    Each sample is weighted by the time elapsed since the previous sample
+    (the span of production it reports on), capped at the window length.
+    """
+
+    _FIRST_SAMPLE_WEIGHT = 1e-6
+
+    def __init__(self, window_sec: float) -> None:
+        if window_sec <= 0:
+            raise ValueError("window_sec must be > 0")
+        self._window_sec = window_sec
+        self._samples: Deque[Tuple[float, float, float]] = deque()
+        self._weighted_sum = 0.0
+        self._weight = 0.0
+        self._last_time: Optional[float] = None
+
+    def update(self, value: float, now: Optional[float] = None) -> float:
+        if now is None:
+            now = time.monotonic()
+
+        if self._last_time is None:
+            weight = self._FIRST_SAMPLE_WEIGHT
+        else:
+            weight = min(self._window_sec, max(0.0, now - self._last_time))
+        self._last_time = now
+
+        self._samples.append((now, value, weight))
+        self._weighted_sum += value * weight
+        self._weight += weight
+
+        horizon = now - self._window_sec
+        while len(self._samples) > 1 and self._samples[0][0] <= horizon:
+            _, old_value, old_weight = self._samples.popleft()
+            self._weighted_sum -= old_value * old_weight
+            self._weight -= old_weight
+
+        if self._weight <= 0:
+            return value
+        return self._weighted_sum / self._weight
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._weighted_sum = 0.0
+        self._weight = 0.0
+        self._last_time = None
+
+
+class MedianFilter(CycleTimeFilter):
+    """Sliding-window median using two heaps with lazy deletion (O(log n) per update)."""
+
+    def __init__(self, window: int) -> None:
+        self._window = max(1, window)
+        self._samples: Deque[float] = deque()
+        self._low: List[float] = []  # max-heap of the lower half, stored negated
+        self._high: List[float] = []  # min-heap of the upper half
+        self._low_size = 0
+        self._high_size = 0
+        self._delayed: Dict[float, int] = defaultdict(int)
+
+    def update(self, value: float, now: Optional[float] = None) -> float:
+        self._samples.append(value)
+        self._insert(value)
+        if len(self._samples) > self._window:
+            self._erase(self._samples.popleft())
+        return self._median()
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._low.clear()
+        self._high.clear()
+        self._low_size = 0
+        self._high_size = 0
+        self._delayed.clear()
+
+    def _median(self) -> float:
+        if self._low_size > self._high_size:
+            return -self._low[0]
+        return (-self._low[0] + self._high[0]) / 2.0
+
+    def _insert(self, value: float) -> None:
+        if not self._low or value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_size += 1
+        self._rebalance()
+
+    def _erase(self, value: float) -> None:
+        self._delayed[value] += 1
+        if value <= -self._low[0]:
+            self._low_size -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, negated=True)
+        else:
+            self._high_size -= 1
+            if self._high and value == self._high[0]:
+                self._prune(self._high, negated=False)
+        self._rebalance()
+
+    def _rebalance(self) -> None:
+        if self._low_size > self._high_size + 1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune(self._low, negated=True)
+        elif self._low_size < self._high_size:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._high_size -= 1
+            self._low_size += 1
+            self._prune(self._high, negated=False)
+
+    def _prune(self, heap: List[float], negated: bool) -> None:
+        while heap:
+            top = -heap[0] if negated else heap[0]
+            pending = self._delayed.get(top, 0)
+            if not pending:
+                return
+            if pending == 1:
+                del self._delayed[top]
+            else:
+                self._delayed[top] = pending - 1
+            heapq.heappop(heap)
+
+
+def create_filter(
+    kind: str,
+    window_samples: int = 5,
+    window_sec: float = 60.0,
+    ema_alpha: float = 0.0,
+) -> CycleTimeFilter:
+    kind = kind.strip().lower()
+    if kind == "sma":
+        return MovingAverageFilter(window_samples)
+    if kind == "ema":
+        alpha = ema_alpha if ema_alpha > 0 else 2.0 / (max(1, window_samples) + 1)
+        return ExponentialFilter(alpha)
+    if kind == "twma":
+        return TimeWeightedFilter(window_sec)
+    if kind == "median":
+        return MedianFilter(window_samples)
+    raise ValueError(f"unknown CT filter type: {kind} (expected one of {', '.join(FILTER_TYPES)})")
@@ -4,7 +4,6 @@ import uvicorn
 from .api import create_app
 from .config import AppConfig
 from .logging_utils import setup_logging
-from .mqtt_subscriber import CycleTimeMqttSubscriber
 
 
 def main() -> None:
@@ -14,11 +13,9 @@ def main() -> None:
     host = os.getenv("RASPI_HOST", "0.0.0.0")
     port = int(os.getenv("RASPI_PORT", "8000"))
 
+    # The MQTT subscriber is started and stopped by the app lifespan.
     app = create_app()
 
-    mqtt_subscriber = CycleTimeMqttSubscriber(config, app.state.controller)
-    mqtt_subscriber.start()
-
     uvicorn.run(app, host=host, port=port, log_level="info")
 
 
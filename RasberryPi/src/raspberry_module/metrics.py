@@ -0,0 +1,303 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Cells:
+    """Per-thread accumulators summed on read.
+
+    Each thread only ever writes its own cell, so recording a sample needs
+    no lock; the lock is taken when a thread records for the first time and
+    when the metric is rendered.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells: List[List[float]] = []
+
+    def cell(self) -> List[float]:
+        cell = getattr(self._local, "cell", None)
+        if cell is None:
+            cell = [0.0] * self._size
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+        return cell
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells)
+        return [sum(cell[i] for cell in cells) for i in range(self._size)]
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: object, **kwargs: object):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self) -> object:
+        """Return the value holder for one combination of label values."""
+
+    @abstractmethod
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """Yield ``(sample name, labels, value)`` for every child."""
+
+    def _label_dicts(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            items = sorted(self._children.items(), key=lambda item: item[0])
+        return [(dict(zip(self.labelnames, key)), child) for key, child in items]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_cells",)
+
+    def __init__(self) -> None:
+        self._cells = _Cells(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._cells.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for labels, child in self._label_dicts():
+            yield f"{self.name}_total", labels, child.value  # type: ignore[attr-defined]
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_function")
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return math.nan
+        return self._value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for labels, child in self._label_dicts():
+            yield self.name, labels, child.value  # type: ignore[attr-defined]
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_cells")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self._bounds = bounds
+        # One cell per bucket, plus +Inf, sum and count.
+        self._cells = _Cells(len(bounds) + 3)
+
+    def observe(self, value: float) -> None:
+        cell = self._cells.cell()
+        cell[bisect_left(self._bounds, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Tuple[List[Tuple[float, float]], float, float]:
+        totals = self._cells.totals()
+        cumulative = 0.0
+        buckets = []
+        for bound, count in zip((*self._bounds, math.inf), totals):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return buckets, totals[-2], totals[-1]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._bounds = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self._bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        for labels, child in self._label_dicts():
+            buckets, total, count = child.snapshot()  # type: ignore[attr-defined]
+            for bound, cumulative in buckets:
+                yield f"{self.name}_bucket", {**labels, "le": "+Inf" if bound == math.inf else repr(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))  # type: ignore[return-value]
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"metric {metric.name} already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+# Shared by the API service and both simulators, so dashboards work across them.
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "commande_messages_received", "Cycle time messages and commands received.", ("source", "line_id")
+)
+MESSAGES_REJECTED = REGISTRY.counter(
+    "commande_messages_rejected", "Messages rejected before reaching the controller.", ("source", "line_id", "reason")
+)
+MESSAGES_PROCESSED = REGISTRY.counter(
+    "commande_messages_processed", "Messages applied by the controller, by result status.", ("source", "line_id", "status")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "commande_stage_seconds", "Time spent in each processing stage.", ("stage",)
+)
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    "commande_db_commit_seconds", "Duration of SQLite write transactions.", ("database",)
+)
+QUEUE_DEPTH = REGISTRY.gauge("commande_queue_depth", "Items waiting in an internal queue.", ("queue",))
+MQTT_PUBLISH = REGISTRY.counter("commande_mqtt_publish", "MQTT publish attempts by outcome.", ("kind", "outcome"))
+MQTT_DROPPED = REGISTRY.counter(
+    "commande_mqtt_dropped", "MQTT messages dropped because the ingest queue was full.", ("line_id",)
+)
+MQTT_CONFLATED = REGISTRY.counter(
+    "commande_mqtt_conflated", "MQTT messages superseded by a newer one for the same line before being applied.", ("line_id",)
+)
+MQTT_INGEST_LAG = REGISTRY.gauge(
+    "commande_mqtt_ingest_lag_seconds", "Receive-to-apply time of the last MQTT message.", ("line_id",)
+)
+API_CALLBACKS = REGISTRY.counter("commande_api_callbacks", "HTTP callbacks to the API by outcome.", ("outcome",))
@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import List, Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -15,3 +17,21 @@ class CommandOut(BaseModel):
     voltage: float
     reason: str
     applied_at: datetime
+    target_voltage: float
+
+
+class BatchItemOut(BaseModel):
+    index: int
+    status: str
+    speed_used: Optional[float] = None
+    voltage: Optional[float] = None
+    reason: str
+    applied_at: Optional[datetime] = None
+    target_voltage: Optional[float] = None
+
+
+class BatchOut(BaseModel):
+    accepted: int
+    rejected: int
+    elapsed_ms: float
+    results: List[BatchItemOut]
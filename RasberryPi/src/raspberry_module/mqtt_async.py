@@ -0,0 +1,258 @@
+import asyncio
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, Sequence
+
+import logging
+
+from paho.mqtt import client as mqtt_client
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ("auto", "asyncio", "thread")
+
+MessageHandler = Callable[[str, bytes], None]
+
+
+@dataclass(frozen=True)
+class MqttStatus:
+    state: str
+    transport: str
+    host: str
+    port: int
+    connected_since: Optional[datetime]
+    reconnects: int
+    last_error: Optional[str]
+
+
+def supports_readers(loop: asyncio.AbstractEventLoop) -> bool:
+    """Whether ``loop`` can watch sockets (the Windows proactor loop cannot)."""
+    left, right = socket.socketpair()
+    try:
+        loop.add_reader(left, lambda: None)
+        loop.remove_reader(left)
+        return True
+    except NotImplementedError:
+        return False
+    finally:
+        left.close()
+        right.close()
+
+
+class AsyncMqttClient:
+    """paho-mqtt client driven by the asyncio event loop.
+
+    With the ``asyncio`` transport the client socket is registered with the
+    loop's ``add_reader``/``add_writer`` and one task handles keepalives and
+    reconnects, so every paho callback runs on the loop. The ``thread``
+    transport (used by ``auto`` when the loop cannot watch sockets) runs
+    paho's network thread and hands each callback to the loop with
+    ``call_soon_threadsafe``. Either way ``on_message`` is called on the loop.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        on_message: MessageHandler,
+        subscriptions: Sequence[str] = (),
+        username: str = "",
+        password: str = "",
+        keepalive: int = 60,
+        transport: str = "auto",
+        reconnect_min_sec: float = 1.0,
+        reconnect_max_sec: float = 30.0,
+    ) -> None:
+        if transport not in TRANSPORTS:
+            raise ValueError(f"unknown MQTT transport: {transport}")
+        self._host = host
+        self._port = port
+        self._on_message_handler = on_message
+        self._subscriptions = list(subscriptions)
+        self._keepalive = keepalive
+        self._requested_transport = transport
+        self._transport = transport
+        self._reconnect_min = max(0.1, reconnect_min_sec)
+        self._reconnect_max = max(self._reconnect_min, reconnect_max_sec)
+
+        self._client = mqtt_client.Client()
+        if username and password:
+            self._client.username_pw_set(username, password)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._disconnected = asyncio.Event()
+        self._state = "disconnected"
+        self._connected_since: Optional[datetime] = None
+        self._reconnects = 0
+        self._last_error: Optional[str] = None
+        self._stopping = False
+
+    @property
+    def is_connected(self) -> bool:
+        return self._state == "connected"
+
+    def status(self) -> MqttStatus:
+        return MqttStatus(
+            state=self._state,
+            transport=self._transport,
+            host=self._host,
+            port=self._port,
+            connected_since=self._connected_since,
+            reconnects=self._reconnects,
+            last_error=self._last_error,
+        )
+
+    async def start(self) -> None:
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopping = False
+        if self._requested_transport == "auto":
+            self._transport = "asyncio" if supports_readers(self._loop) else "thread"
+        self._state = "connecting"
+        logger.info("MQTT connecting to %s:%s (%s transport)", self._host, self._port, self._transport)
+
+        if self._transport == "thread":
+            self._client.reconnect_delay_set(max(1, int(self._reconnect_min)), max(1, int(self._reconnect_max)))
+            self._client.connect_async(self._host, self._port, self._keepalive)
+            self._client.loop_start()
+            return
+
+        self._client.on_socket_open = self._on_socket_open
+        self._client.on_socket_close = self._on_socket_close
+        self._client.on_socket_register_write = self._on_socket_register_write
+        self._client.on_socket_unregister_write = self._on_socket_unregister_write
+        self._disconnected = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._loop is None:
+            return
+        self._stopping = True
+        if self._transport == "thread":
+            self._client.disconnect()
+            await self._loop.run_in_executor(None, self._client.loop_stop)
+        else:
+            if self._task is not None:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+                self._task = None
+            if self._client.socket() is not None:
+                self._client.disconnect()
+                self._client.loop_write()
+        self._state = "disconnected"
+        self._loop = None
+
+    def publish(self, topic: str, payload: str, qos: int = 0) -> bool:
+        info = self._client.publish(topic, payload, qos=qos)
+        return info.rc == mqtt_client.MQTT_ERR_SUCCESS
+
+    async def _run(self) -> None:
+        assert self._loop is not None
+        delay = self._reconnect_min
+        while not self._stopping:
+            self._disconnected.clear()
+            try:
+                # The TCP connect can block on DNS or an unreachable host; keep it off the loop.
+                await self._loop.run_in_executor(
+                    None, self._client.connect, self._host, self._port, self._keepalive
+                )
+            except (OSError, ValueError) as exc:
+                self._state = "disconnected"
+                self._last_error = str(exc)
+                logger.warning("MQTT connect to %s:%s failed: %s; retrying in %.0fs", self._host, self._port, exc, delay)
+                await asyncio.sleep(delay)
+                delay = min(self._reconnect_max, delay * 2)
+                continue
+
+            delay = self._reconnect_min
+            while not self._disconnected.is_set():
+                if self._client.loop_misc() == mqtt_client.MQTT_ERR_NO_CONN:
+                    break
+                try:
+                    await asyncio.wait_for(self._disconnected.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    pass
+            if not self._stopping:
+                await asyncio.sleep(delay)
+
+    def _call_on_loop(self, callback: Callable[..., Any], *args: Any) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        if threading.get_ident() == self._loop_thread:
+            callback(*args)
+        else:
+            try:
+                loop.call_soon_threadsafe(callback, *args)
+            except RuntimeError:
+                pass
+
+    def _on_socket_open(self, client: Any, userdata: Any, sock: Any) -> None:
+        self._call_on_loop(self._watch, sock, True, None)
+
+    def _on_socket_close(self, client: Any, userdata: Any, sock: Any) -> None:
+        self._call_on_loop(self._watch, sock, False, False)
+
+    def _on_socket_register_write(self, client: Any, userdata: Any, sock: Any) -> None:
+        self._call_on_loop(self._watch, sock, None, True)
+
+    def _on_socket_unregister_write(self, client: Any, userdata: Any, sock: Any) -> None:
+        self._call_on_loop(self._watch, sock, None, False)
+
+    def _watch(self, sock: Any, read: Optional[bool], write: Optional[bool]) -> None:
+        """Start or stop watching ``sock`` for reads/writes (``None`` leaves it unchanged)."""
+        loop = self._loop
+        if loop is None or sock.fileno() < 0:
+            return
+        if read is True:
+            loop.add_reader(sock, self._client.loop_read)
+        elif read is False:
+            loop.remove_reader(sock)
+        if write is True:
+            loop.add_writer(sock, self._client.loop_write)
+        elif write is False:
+            loop.remove_writer(sock)
+
+    def _on_connect(self, client: Any, userdata: Any, flags: Any, reason_code: Any) -> None:
+        self._call_on_loop(self._connected, reason_code)
+
+    def _connected(self, reason_code: Any) -> None:
+        if reason_code != 0:
+            self._state = "disconnected"
+            self._last_error = f"connection refused: {reason_code}"
+            logger.warning("MQTT connection failed: %s", reason_code)
+            return
+        self._state = "connected"
+        self._connected_since = datetime.now(timezone.utc)
+        self._last_error = None
+        for topic in self._subscriptions:
+            self._client.subscribe(topic)
+        logger.info("MQTT connected to %s:%s and subscribed to %s", self._host, self._port, ", ".join(self._subscriptions))
+
+    def _on_disconnect(self, client: Any, userdata: Any, reason_code: Any) -> None:
+        self._call_on_loop(self._lost, reason_code)
+
+    def _lost(self, reason_code: Any) -> None:
+        self._state = "disconnected" if self._stopping else "connecting"
+        self._connected_since = None
+        if not self._stopping:
+            self._reconnects += 1
+        if reason_code != 0:
+            self._last_error = f"connection lost: {reason_code}"
+            logger.warning("MQTT disconnected unexpectedly: %s", reason_code)
+        self._disconnected.set()
+
+    def _on_message(self, client: Any, userdata: Any, msg: Any) -> None:
+        self._call_on_loop(self._on_message_handler, msg.topic, bytes(msg.payload))
@@ -1,51 +1,227 @@
+import asyncio
 import json
 import logging
+import time
+import zlib
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any
-
-from paho.mqtt import client as mqtt_client
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 
+from .actor import ControllerActor, ControllerBusyError
 from .config import AppConfig
-from .control import SpeedController
+from .metrics import (
+    MESSAGES_PROCESSED,
+    MESSAGES_RECEIVED,
+    MESSAGES_REJECTED,
+    MQTT_CONFLATED,
+    MQTT_DROPPED,
+    MQTT_INGEST_LAG,
+    MQTT_PUBLISH,
+    QUEUE_DEPTH,
+    STAGE_SECONDS,
+)
+from .mqtt_async import AsyncMqttClient, MqttStatus
+from .ordering import LineOrderGuard
 
 logger = logging.getLogger(__name__)
 
+_MQTT_TO_TARGET = STAGE_SECONDS.labels(stage="mqtt_to_target")
+_STOP = object()
+
+# (topic, raw payload, perf_counter at receive, older payloads it superseded)
+RawMessage = Tuple[str, bytes, float, Tuple[bytes, ...]]
+
+
+class _ConflatingQueue:
+    """Holds at most one pending message per topic, the newest.
+
+    A message for a topic that is already pending replaces it in place, so
+    the topic keeps its turn and a burst costs one controller update per
+    line. Up to ``history`` superseded payloads are kept with the newest one
+    so they can still be fed to the CT filter.
+    """
+
+    def __init__(self, maxsize: int, history: int) -> None:
+        self._maxsize = maxsize
+        self._history = history
+        self._ready = asyncio.Event()
+        self._latest: Dict[str, RawMessage] = {}
+        self._skipped: Dict[str, Deque[bytes]] = {}
+        self._stopped = False
+
+    def qsize(self) -> int:
+        return len(self._latest)
+
+    def put_nowait(self, item: RawMessage) -> bool:
+        """Queue ``item``; return True if it superseded a pending message."""
+        topic = item[0]
+        previous = self._latest.get(topic)
+        if previous is None:
+            if len(self._latest) >= self._maxsize:
+                raise asyncio.QueueFull
+            self._latest[topic] = item
+            self._ready.set()
+            return False
+        if self._history:
+            self._skipped.setdefault(topic, deque(maxlen=self._history)).append(previous[1])
+        self._latest[topic] = item
+        return True
+
+    async def put(self, item: Any) -> None:
+        # Only used for the stop sentinel: workers drain what is pending, then exit.
+        self._stopped = True
+        self._ready.set()
+
+    async def get(self) -> Any:
+        while not self._latest:
+            if self._stopped:
+                self._stopped = False
+                return _STOP
+            self._ready.clear()
+            await self._ready.wait()
+        topic = next(iter(self._latest))
+        item = self._latest.pop(topic)
+        skipped = self._skipped.pop(topic, ())
+        return (*item[:3], tuple(skipped))
+
 
 class CycleTimeMqttSubscriber:
-    def __init__(self, config: AppConfig, controller: SpeedController) -> None:
+    """Receives CT messages and applies them on worker tasks of the event loop.
+
+    The client callback only copies the raw payload onto a bounded queue, so
+    decoding, control, persistence and the speed response never delay
+    keepalives or the receiving of other lines. Each topic always maps to the
+    same worker, which keeps the messages of one line in order; when a
+    worker's queue is full the new message is dropped and counted.
+
+    With ``mqtt_conflate`` a worker only keeps the newest pending message
+    per topic; older ones are counted as conflated and, with
+    ``mqtt_conflate_feed_filter``, still passed to the CT filter.
+
+    With ``mqtt_dedup`` redelivered and late messages of a line (by ``seq``
+    or ``timestamp``) are dropped before they reach the controller.
+
+    With ``admit`` (the HTTP high-watermark check) a message that arrives
+    while the controller or storage is overloaded is rejected as
+    ``overload`` instead of being queued behind the backlog.
+
+    ``start`` and ``stop`` are awaited from the application lifespan; a
+    broker that is down is retried in the background and shows up in
+    ``status``.
+    """
+
+    def __init__(
+        self, config: AppConfig, actor: ControllerActor, admit: Optional[Callable[[], bool]] = None
+    ) -> None:
         self._config = config
-        self._controller = controller
-        self._client = mqtt_client.Client()
-        self._client.on_connect = self._on_connect
-        self._client.on_message = self._on_message
+        self._actor = actor
+        self._admit = admit
+        self._client = AsyncMqttClient(
+            config.mqtt_host,
+            config.mqtt_port,
+            self._on_message,
+            subscriptions=[config.mqtt_topic],
+            transport=config.mqtt_transport,
+        )
+        self._workers_count = max(1, config.mqtt_ingest_workers)
+        self._queues: List[Any] = []
+        self._workers: List["asyncio.Task[None]"] = []
+        self._guard = LineOrderGuard() if config.mqtt_dedup else None
+        self._dropped = 0
+        self._conflated = 0
+        QUEUE_DEPTH.labels("mqtt_ingest").set_function(lambda: self.queue_depth)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(pending.qsize() for pending in self._queues)
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
 
-    def start(self) -> None:
+    @property
+    def conflated(self) -> int:
+        return self._conflated
+
+    def status(self) -> Optional[MqttStatus]:
+        if not self._config.mqtt_enabled:
+            return None
+        return self._client.status()
+
+    async def start(self) -> None:
         if not self._config.mqtt_enabled:
             logger.info("MQTT disabled in configuration.")
             return
 
-        logger.info("Connecting MQTT subscriber to %s:%s topic=%s", self._config.mqtt_host, self._config.mqtt_port, self._config.mqtt_topic)
-        self._client.connect(self._config.mqtt_host, self._config.mqtt_port, 60)
-        self._client.loop_start()
+        self._start_workers()
+        await self._client.start()
 
-    def stop(self) -> None:
+    async def stop(self) -> None:
         try:
-            self._client.loop_stop()
-            self._client.disconnect()
-        except Exception:
-            pass
-
-    def _on_connect(self, client: Any, userdata: Any, flags: Any, reason_code: Any) -> None:
-        if reason_code == 0:
-            client.subscribe(self._config.mqtt_topic)
-            logger.info("MQTT connected and subscribed to %s", self._config.mqtt_topic)
+            await self._client.stop()
+        except Exception as exc:
+            logger.warning("Error while disconnecting MQTT client: %s", exc)
+        await self._stop_workers()
+
+    def _create_queues(self) -> None:
+        # asyncio queues bind to the running loop, so they are made on start.
+        size = max(1, self._config.mqtt_ingest_queue_size // self._workers_count)
+        if self._config.mqtt_conflate:
+            history = self._config.ct_filter_window_samples if self._config.mqtt_conflate_feed_filter else 0
+            self._queues = [_ConflatingQueue(size, history) for _ in range(self._workers_count)]
         else:
-            logger.warning("MQTT connection failed: %s", reason_code)
+            self._queues = [asyncio.Queue(maxsize=size) for _ in range(self._workers_count)]
+
+    def _start_workers(self) -> None:
+        if self._workers:
+            return
+        if not self._queues:
+            self._create_queues()
+        loop = asyncio.get_running_loop()
+        for index, pending in enumerate(self._queues):
+            self._workers.append(loop.create_task(self._run(pending), name=f"mqtt-ingest-{index}"))
+
+    async def _stop_workers(self, timeout: Optional[float] = 5.0) -> None:
+        if not self._workers:
+            return
+        for pending in self._queues:
+            await pending.put(_STOP)
+        _, running = await asyncio.wait(self._workers, timeout=timeout)
+        for worker in running:
+            worker.cancel()
+        self._workers = []
 
-    def _on_message(self, client: Any, userdata: Any, msg: Any) -> None:
+    def _on_message(self, topic: str, payload: bytes) -> None:
+        if not self._queues:
+            self._create_queues()
+        item: RawMessage = (topic, payload, time.perf_counter(), ())
+        pending = self._queues[zlib.crc32(topic.encode("utf-8")) % len(self._queues)]
         try:
-            payload = json.loads(msg.payload.decode("utf-8"))
-            line_id = payload.get("line_id") or "L1"
+            if pending.put_nowait(item):
+                self._conflated += 1
+                MQTT_CONFLATED.labels(_topic_line(topic)).inc()
+        except asyncio.QueueFull:
+            self._dropped += 1
+            MQTT_DROPPED.labels(_topic_line(topic)).inc()
+            if self._dropped == 1 or self._dropped % 1000 == 0:
+                logger.warning("MQTT ingest queue full; %s messages dropped so far", self._dropped)
+
+    async def _run(self, pending: Any) -> None:
+        while True:
+            item = await pending.get()
+            if item is _STOP:
+                return
+            topic, payload, received_at, skipped = item
+            try:
+                await self._handle(payload, received_at, skipped)
+            except Exception as exc:
+                logger.error("Unexpected error handling MQTT message on %s: %s", topic, exc)
+
+    async def _handle(self, raw: bytes, received_at: float, skipped: Sequence[bytes] = ()) -> None:
+        line_id = "unknown"
+        reason = "invalid"
+        try:
+            payload = json.loads(raw.decode("utf-8"))
 
             if "calculated_ct_seconds" not in payload:
                 raise ValueError("missing calculated_ct_seconds")
@@ -60,13 +236,44 @@ class CycleTimeMqttSubscriber:
 
             chain_state = payload.get("chain_state") or {}
             ct_minutes = ct_seconds / 60.0
+            # Only a valid message names its line in metric labels; invalid ones count as "unknown".
+            line_id = str(payload.get("line_id") or "L1")
 
-            result = self._controller.process_cycle_time(
-                line_id=line_id,
-                cycle_time_minutes=ct_minutes,
-                mode="mqtt",
-                chain_state=chain_state,
-            )
+            MESSAGES_RECEIVED.labels("mqtt", line_id).inc()
+            reason = "error"
+            # Shed before the guard sees the message, so a redelivery of it is still accepted.
+            if self._admit is not None and not self._admit():
+                raise ControllerBusyError("above the command high watermark")
+            last = self._guard.last(line_id) if self._guard else None
+            # Superseded messages arrived first, so they go through the guard first.
+            skipped_messages = _skipped_messages(skipped, line_id, self._guard)
+            stale = self._guard.check(line_id, payload.get("timestamp"), payload.get("seq")) if self._guard else None
+            if stale is not None:
+                MESSAGES_REJECTED.labels("mqtt", line_id, stale).inc()
+                logger.debug("Dropped %s MQTT CT for line=%s", stale, line_id)
+                if not skipped_messages:
+                    return
+                # A redelivery superseded a new message; apply the newest one that was accepted.
+                ct_minutes, chain_state = skipped_messages.pop()
+                ct_seconds = ct_minutes * 60.0
+            try:
+                result = await asyncio.wrap_future(
+                    self._actor.process_cycle_time(
+                        line_id=line_id,
+                        cycle_time_minutes=ct_minutes,
+                        mode="mqtt",
+                        chain_state=chain_state,
+                        skipped=[cycle_time for cycle_time, _ in skipped_messages],
+                    )
+                )
+            except ControllerBusyError:
+                if self._guard is not None:
+                    self._guard.restore(line_id, last)
+                raise
+            lag = time.perf_counter() - received_at
+            _MQTT_TO_TARGET.observe(lag)
+            MQTT_INGEST_LAG.labels(line_id).set(lag)
+            MESSAGES_PROCESSED.labels("mqtt", line_id, result.status).inc()
             logger.info(
                 "MQTT CT processed line=%s ct_seconds=%s speed=%s voltage=%s status=%s",
                 line_id,
@@ -80,7 +287,12 @@ class CycleTimeMqttSubscriber:
             self._publish_speed_response(line_id, result.speed_used, result.voltage, ct_seconds)
 
         except Exception as exc:
-            logger.warning("Failed to process MQTT CT payload: %s; payload=%s", exc, msg.payload)
+            if reason == "invalid":
+                MESSAGES_RECEIVED.labels("mqtt", line_id).inc()
+            if isinstance(exc, ControllerBusyError):
+                reason = "overload"
+            MESSAGES_REJECTED.labels("mqtt", line_id, reason).inc()
+            logger.warning("Failed to process MQTT CT payload: %s; payload=%s", exc, raw)
 
     def _publish_speed_response(self, line_id: str, speed_rpm: float, voltage: float, ct_seconds: float) -> None:
         """Publish calculated speed back to the API via MQTT."""
@@ -93,7 +305,36 @@ class CycleTimeMqttSubscriber:
                 "ct_seconds": ct_seconds,
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             })
-            self._client.publish(topic, response_payload)
+            published = self._client.publish(topic, response_payload)
+            MQTT_PUBLISH.labels("speed_response", "ok" if published else "error").inc()
             logger.info("Published speed response to %s: speed_rpm=%s voltage=%s", topic, speed_rpm, voltage)
         except Exception as exc:
+            MQTT_PUBLISH.labels("speed_response", "error").inc()
             logger.warning("Failed to publish speed response: %s", exc)
+
+
+def _topic_line(topic: str) -> str:
+    # yazaki/line/<line_id>/ct
+    parts = topic.split("/")
+    return parts[2] if len(parts) >= 4 else "unknown"
+
+
+def _skipped_messages(
+    payloads: Sequence[bytes], line_id: str, guard: Optional[LineOrderGuard] = None
+) -> List[Tuple[float, Dict[str, Any]]]:
+    """Return ``(cycle time in minutes, chain_state)`` of each usable superseded payload."""
+    messages = []
+    for raw in payloads:
+        try:
+            payload = json.loads(raw.decode("utf-8"))
+            if str(payload.get("line_id") or "L1") != line_id:
+                continue
+            ct_seconds = float(payload["calculated_ct_seconds"])
+        except (ValueError, TypeError, KeyError, AttributeError):
+            continue
+        if ct_seconds <= 0:
+            continue
+        if guard is not None and guard.check(line_id, payload.get("timestamp"), payload.get("seq")) is not None:
+            continue
+        messages.append((ct_seconds / 60.0, payload.get("chain_state") or {}))
+    return messages
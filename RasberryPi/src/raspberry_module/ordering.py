@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+DUPLICATE = "duplicate"
+OUT_OF_ORDER = "out_of_order"
+
+
+class LineOrderGuard:
+    """Drops redelivered and late messages, per line.
+
+    A message with a ``seq`` is compared with the last accepted sequence
+    number of its line: the same number is a duplicate and a lower one is
+    out of order, unless its timestamp is newer than the last accepted one
+    (the publisher restarted and its counter began again). Without ``seq``
+    the timestamp decides the same way. Messages with neither are accepted.
+    Only the last accepted message of each line is kept; ``last`` and
+    ``restore`` undo an acceptance when the message is not applied after all.
+    """
+
+    def __init__(self) -> None:
+        self._last: Dict[str, Tuple[Optional[int], Optional[datetime]]] = {}
+        self.rejected: Dict[str, int] = {DUPLICATE: 0, OUT_OF_ORDER: 0}
+
+    def check(self, line_id: str, timestamp: Any = None, seq: Any = None) -> Optional[str]:
+        """Return ``None`` and remember the message if it is new, else the rejection reason."""
+        seq = _parse_seq(seq)
+        received_at = _parse_timestamp(timestamp)
+        reason = None
+        last = self._last.get(line_id)
+        if last is not None:
+            last_seq, last_at = last
+            if seq is not None and last_seq is not None:
+                restarted = received_at is not None and last_at is not None and received_at > last_at
+                if seq <= last_seq and not restarted:
+                    reason = DUPLICATE if seq == last_seq else OUT_OF_ORDER
+            elif received_at is not None and last_at is not None and received_at <= last_at:
+                reason = DUPLICATE if received_at == last_at else OUT_OF_ORDER
+
+        if reason is not None:
+            self.rejected[reason] += 1
+            return reason
+        if seq is not None or received_at is not None:
+            self._last[line_id] = (seq, received_at)
+        return None
+
+    def last(self, line_id: str) -> Optional[Tuple[Optional[int], Optional[datetime]]]:
+        return self._last.get(line_id)
+
+    def restore(self, line_id: str, last: Optional[Tuple[Optional[int], Optional[datetime]]]) -> None:
+        """Put back the state returned by ``last`` so a message that was not applied can be accepted again."""
+        if last is None:
+            self._last.pop(line_id, None)
+        else:
+            self._last[line_id] = last
+
+
+def _parse_seq(value: Any) -> Optional[int]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
@@ -0,0 +1,168 @@
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, Optional
+
+import logging
+
+from .control import ControllerSnapshot
+from .metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_OUTPUT_TICK = STAGE_SECONDS.labels(stage="output_tick")
+
+OutputSink = Callable[[str, float], None]
+OutputListener = Callable[[Mapping[str, float]], None]
+
+
+@dataclass(frozen=True)
+class OutputStats:
+    rate_hz: float
+    running: bool
+    ticks: int
+    overruns: int
+    last_jitter_ms: float
+    avg_jitter_ms: float
+    max_jitter_ms: float
+    last_tick_ms: float
+    max_tick_ms: float
+
+
+class OutputLoop:
+    """Fixed-rate voltage output on a monotonic clock.
+
+    Every period the loop reads the latest per-line targets from the
+    controller snapshot and slews each applied voltage toward its target by
+    at most ``ramp_rate_v_per_sec`` times the elapsed time. It is the only
+    writer of applied voltages, so the output cadence does not depend on
+    how MQTT messages or HTTP commands arrive.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], ControllerSnapshot],
+        rate_hz: float = 50.0,
+        ramp_rate_v_per_sec: float = 1.0,
+        sink: Optional[OutputSink] = None,
+        listener: Optional[OutputListener] = None,
+    ) -> None:
+        self._source = source
+        self._rate_hz = max(0.0, rate_hz)
+        self._ramp_rate = max(0.0, ramp_rate_v_per_sec)
+        self._sink = sink
+        self._listener = listener
+        self._voltages: Mapping[str, float] = MappingProxyType({})
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._ticks = 0
+        self._overruns = 0
+        self._last_jitter_ms = 0.0
+        self._total_jitter_ms = 0.0
+        self._max_jitter_ms = 0.0
+        self._last_tick_ms = 0.0
+        self._max_tick_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._rate_hz > 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def voltages(self) -> Mapping[str, float]:
+        return self._voltages
+
+    def start(self) -> None:
+        if not self.enabled or self.is_running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="output-loop", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> OutputStats:
+        with self._stats_lock:
+            return OutputStats(
+                rate_hz=self._rate_hz,
+                running=self.is_running,
+                ticks=self._ticks,
+                overruns=self._overruns,
+                last_jitter_ms=self._last_jitter_ms,
+                avg_jitter_ms=self._total_jitter_ms / self._ticks if self._ticks else 0.0,
+                max_jitter_ms=self._max_jitter_ms,
+                last_tick_ms=self._last_tick_ms,
+                max_tick_ms=self._max_tick_ms,
+            )
+
+    def tick(self, dt: float) -> Mapping[str, float]:
+        max_step = self._ramp_rate * max(0.0, dt)
+        applied: Dict[str, float] = dict(self._voltages)
+        for line_id, line in self._source().lines.items():
+            target = line.target_voltage
+            if target is None:
+                continue
+            current = applied.get(line_id)
+            if current is None:
+                current = target
+            else:
+                delta = target - current
+                if abs(delta) > max_step:
+                    delta = max_step if delta > 0 else -max_step
+                current += delta
+            applied[line_id] = current
+            if self._sink is not None:
+                try:
+                    self._sink(line_id, current)
+                except Exception as exc:
+                    logger.warning("Output sink failed for line %s: %s", line_id, exc)
+
+        self._voltages = MappingProxyType(applied)
+        if self._listener is not None:
+            try:
+                self._listener(self._voltages)
+            except Exception as exc:
+                logger.warning("Output listener failed: %s", exc)
+        return self._voltages
+
+    def _run(self) -> None:
+        period = 1.0 / self._rate_hz
+        deadline = time.monotonic()
+        last_tick = deadline
+        while not self._stop.is_set():
+            started = time.monotonic()
+            jitter_ms = (started - deadline) * 1000.0
+            self.tick(started - last_tick)
+            last_tick = started
+            finished = time.monotonic()
+            _OUTPUT_TICK.observe(finished - started)
+
+            deadline += period
+            overruns = 0
+            if finished > deadline:
+                overruns = int((finished - deadline) // period) + 1
+                deadline += overruns * period
+            self._record(jitter_ms, (finished - started) * 1000.0, overruns)
+
+            if self._stop.wait(max(0.0, deadline - time.monotonic())):
+                return
+
+    def _record(self, jitter_ms: float, tick_ms: float, overruns: int) -> None:
+        with self._stats_lock:
+            self._ticks += 1
+            self._overruns += overruns
+            self._last_jitter_ms = jitter_ms
+            self._total_jitter_ms += jitter_ms
+            self._max_jitter_ms = max(self._max_jitter_ms, jitter_ms)
+            self._last_tick_ms = tick_ms
+            self._max_tick_ms = max(self._max_tick_ms, tick_ms)
@@ -0,0 +1,367 @@
+import argparse
+import csv
+import json
+import sqlite3
+import statistics
+import sys
+import time
+from contextlib import closing
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .clock import SimulatedClock
+from .config import AppConfig
+from .control import SpeedController
+from .models import CommandIn
+from .storage import NullStorage
+
+
+@dataclass(frozen=True)
+class ReplayEvent:
+    received_at: datetime
+    line_id: str
+    mode: str
+    speed: float
+    timestamp: datetime
+    cycle_time_minutes: Optional[float] = None
+    chain_state: Optional[dict] = None
+    skipped_cycle_times: Tuple[float, ...] = ()
+
+    @property
+    def is_cycle_time(self) -> bool:
+        return self.cycle_time_minutes is not None
+
+
+@dataclass(frozen=True)
+class ReplayPoint:
+    at: datetime
+    line_id: str
+    kind: str
+    status: str
+    reason: str
+    speed: float
+    target_voltage: float
+    voltage: float
+
+
+@dataclass(frozen=True)
+class LineSummary:
+    events: int
+    cycle_times: int
+    commands: int
+    fallbacks: int
+    clamp_hits: int
+    ramp_limited: int
+    speed_mean: float
+    speed_variance: float
+    voltage_mean: float
+    voltage_variance: float
+
+
+@dataclass(frozen=True)
+class ReplayResult:
+    points: List[ReplayPoint]
+    lines: Dict[str, LineSummary]
+    simulated_sec: float
+    elapsed_sec: float
+
+    @property
+    def speedup(self) -> float:
+        return self.simulated_sec / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+
+def parse_time(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def load_events(
+    db_path: Path,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    line_ids: Optional[Sequence[str]] = None,
+) -> Iterator[ReplayEvent]:
+    """Yield recorded commands from ``command_log`` in arrival order.
+
+    Rows produced from MQTT cycle times carry the raw cycle time in
+    ``raw_json`` and are replayed through the CT filter, after the cycle
+    times that were conflated into them; older rows without it are replayed
+    as plain speed commands.
+    """
+    clauses: List[str] = []
+    params: List[object] = []
+    if start is not None:
+        clauses.append("received_at >= ?")
+        params.append(start.astimezone(timezone.utc).isoformat())
+    if end is not None:
+        clauses.append("received_at < ?")
+        params.append(end.astimezone(timezone.utc).isoformat())
+    if line_ids:
+        clauses.append(f"line_id IN ({', '.join('?' for _ in line_ids)})")
+        params.extend(line_ids)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with closing(sqlite3.connect(db_path)) as conn:
+        cursor = conn.execute(
+            f"""
+            SELECT received_at, line_id, mode, speed, timestamp, raw_json
+            FROM command_log {where}
+            ORDER BY received_at, id
+            """,
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for received_at, line_id, mode, speed, timestamp, raw_json in rows:
+                try:
+                    raw = json.loads(raw_json)
+                except ValueError:
+                    raw = {}
+                cycle_time = raw.get("cycle_time_minutes") if isinstance(raw, dict) else None
+                skipped = raw.get("skipped_cycle_times") if cycle_time else None
+                yield ReplayEvent(
+                    received_at=parse_time(received_at),
+                    line_id=line_id,
+                    mode=mode,
+                    speed=speed,
+                    timestamp=parse_time(timestamp),
+                    cycle_time_minutes=float(cycle_time) if cycle_time else None,
+                    chain_state=raw.get("chain_state") if cycle_time else None,
+                    skipped_cycle_times=tuple(float(value) for value in skipped) if skipped else (),
+                )
+
+
+def replay(events: Iterable[ReplayEvent], config: AppConfig, vectorize: bool = True) -> ReplayResult:
+    """Run recorded events through a headless controller under a simulated clock.
+
+    Storage writes are discarded. The output loop is modelled analytically:
+    between two events a line's voltage slews toward the current target at
+    ``ramp_rate_v_per_sec``, which is what the fixed-rate loop converges to
+    without simulating every tick.
+    """
+    started = time.perf_counter()
+    events = list(events)
+    if not events:
+        return ReplayResult([], {}, 0.0, 0.0)
+
+    clock = SimulatedClock(events[0].received_at)
+    controller = SpeedController(config, NullStorage(), clock=clock)
+
+    by_line: Dict[str, List[int]] = {}
+    for index, event in enumerate(events):
+        by_line.setdefault(event.line_id, []).append(index)
+
+    # A line fed only by cycle times through an SMA is a pure function of the
+    # CT series, so it can be computed with prefix sums instead of event by event.
+    vector_lines = set()
+    if vectorize and config.ct_filter_type == "sma":
+        vector_lines = {
+            line_id
+            for line_id, indexes in by_line.items()
+            if all(events[index].is_cycle_time for index in indexes)
+        }
+
+    results: List[Optional[Tuple[str, str, float, float]]] = [None] * len(events)
+    for index, event in enumerate(events):
+        if event.line_id in vector_lines:
+            continue
+        clock.advance_to(event.received_at)
+        if event.is_cycle_time:
+            result = controller.process_cycle_time(
+                event.line_id,
+                event.cycle_time_minutes,
+                mode=event.mode,
+                chain_state=event.chain_state,
+                skipped=event.skipped_cycle_times,
+            )
+        else:
+            result = controller.process_command(
+                CommandIn(line_id=event.line_id, speed=event.speed, mode=event.mode, timestamp=event.timestamp)
+            )
+        results[index] = (result.status, result.reason, result.speed_used, result.target_voltage)
+
+    for line_id in vector_lines:
+        indexes = by_line[line_id]
+        calibration = controller.calibration.for_line(line_id)
+        # Conflated cycle times enter the filter just before the event that carried them.
+        samples: List[float] = []
+        positions: List[int] = []
+        for index in indexes:
+            samples.extend(value for value in events[index].skipped_cycle_times if value > 0)
+            samples.append(events[index].cycle_time_minutes)
+            positions.append(len(samples) - 1)
+        filtered = _sma(samples, config.ct_filter_window_samples)
+        for index, cycle_time in zip(indexes, (filtered[position] for position in positions)):
+            speed = max(config.speed_min, min(config.speed_max, calibration.speed(cycle_time)))
+            results[index] = ("valid", "ok", speed, calibration.voltage(speed))
+
+    points: List[Optional[ReplayPoint]] = [None] * len(events)
+    summaries: Dict[str, LineSummary] = {}
+    for line_id, indexes in by_line.items():
+        summaries[line_id] = _replay_output(config, events, results, indexes, points)
+
+    simulated = (events[-1].received_at - events[0].received_at).total_seconds()
+    return ReplayResult(
+        points=[point for point in points if point is not None],
+        lines=summaries,
+        simulated_sec=simulated,
+        elapsed_sec=time.perf_counter() - started,
+    )
+
+
+def _sma(values: List[float], window: int) -> List[float]:
+    window = max(1, window)
+    prefix = list(accumulate(values, initial=0.0))
+    return [
+        (prefix[i + 1] - prefix[max(0, i + 1 - window)]) / min(i + 1, window)
+        for i in range(len(values))
+    ]
+
+
+def _replay_output(
+    config: AppConfig,
+    events: List[ReplayEvent],
+    results: List[Optional[Tuple[str, str, float, float]]],
+    indexes: List[int],
+    points: List[Optional[ReplayPoint]],
+) -> LineSummary:
+    ramp_rate = max(0.0, config.ramp_rate_v_per_sec)
+    immediate = config.output_rate_hz <= 0
+    applied: Optional[float] = None
+    target: Optional[float] = None
+    last_at: Optional[datetime] = None
+    fallbacks = clamp_hits = ramp_limited = cycle_times = 0
+    speeds: List[float] = []
+    voltages: List[float] = []
+
+    for index in indexes:
+        event = events[index]
+        status, reason, speed, new_target = results[index]  # type: ignore[misc]
+
+        # Applied voltage when this event arrives, still slewing toward the previous target.
+        if applied is None or target is None or last_at is None or immediate:
+            applied = new_target
+        else:
+            max_step = ramp_rate * (event.received_at - last_at).total_seconds()
+            delta = target - applied
+            if abs(delta) > max_step:
+                ramp_limited += 1
+                delta = max_step if delta > 0 else -max_step
+            applied += delta
+
+        if status != "valid":
+            fallbacks += 1
+        if event.is_cycle_time:
+            cycle_times += 1
+            if speed in (config.speed_min, config.speed_max):
+                clamp_hits += 1
+
+        points[index] = ReplayPoint(
+            at=event.received_at,
+            line_id=event.line_id,
+            kind="ct" if event.is_cycle_time else "command",
+            status=status,
+            reason=reason,
+            speed=speed,
+            target_voltage=new_target,
+            voltage=applied,
+        )
+        speeds.append(speed)
+        voltages.append(applied)
+        target = new_target
+        last_at = event.received_at
+
+    return LineSummary(
+        events=len(indexes),
+        cycle_times=cycle_times,
+        commands=len(indexes) - cycle_times,
+        fallbacks=fallbacks,
+        clamp_hits=clamp_hits,
+        ramp_limited=ramp_limited,
+        speed_mean=statistics.fmean(speeds),
+        speed_variance=statistics.pvariance(speeds),
+        voltage_mean=statistics.fmean(voltages),
+        voltage_variance=statistics.pvariance(voltages),
+    )
+
+
+def write_series(points: Iterable[ReplayPoint], path: Path) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["at", "line_id", "kind", "status", "reason", "speed", "target_voltage", "voltage"])
+        for point in points:
+            writer.writerow(
+                [
+                    point.at.isoformat(),
+                    point.line_id,
+                    point.kind,
+                    point.status,
+                    point.reason,
+                    point.speed,
+                    point.target_voltage,
+                    point.voltage,
+                ]
+            )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    config = AppConfig.load()
+    parser = argparse.ArgumentParser(
+        prog="python -m raspberry_module.replay",
+        description="Replay recorded commands through the controller with different settings.",
+    )
+    parser.add_argument("--db", type=Path, default=config.db_path)
+    parser.add_argument("--from", dest="start", type=parse_time)
+    parser.add_argument("--to", dest="end", type=parse_time)
+    parser.add_argument("--line", dest="lines", action="append", help="line id (repeatable)")
+    parser.add_argument("--filter", dest="ct_filter_type", choices=["sma", "ema", "twma", "median"])
+    parser.add_argument("--window", dest="ct_filter_window_samples", type=int)
+    parser.add_argument("--window-sec", dest="ct_filter_window_sec", type=float)
+    parser.add_argument("--ema-alpha", dest="ct_filter_ema_alpha", type=float)
+    parser.add_argument("--ramp-rate", dest="ramp_rate_v_per_sec", type=float)
+    parser.add_argument("--calibration", dest="calibration_path", type=Path)
+    parser.add_argument("--series", type=Path, help="write the speed/voltage series to this CSV file")
+    parser.add_argument("--no-vectorize", action="store_true", help="always step the controller event by event")
+    args = parser.parse_args(argv)
+
+    overrides = {
+        name: getattr(args, name)
+        for name in (
+            "ct_filter_type",
+            "ct_filter_window_samples",
+            "ct_filter_window_sec",
+            "ct_filter_ema_alpha",
+            "ramp_rate_v_per_sec",
+            "calibration_path",
+        )
+        if getattr(args, name) is not None
+    }
+    config = replace(config, **overrides)
+
+    result = replay(load_events(args.db, args.start, args.end, args.lines), config, vectorize=not args.no_vectorize)
+    if args.series is not None:
+        write_series(result.points, args.series)
+
+    json.dump(
+        {
+            "settings": {name: str(value) for name, value in overrides.items()},
+            "events": len(result.points),
+            "simulated_sec": result.simulated_sec,
+            "elapsed_sec": round(result.elapsed_sec, 3),
+            "speedup": round(result.speedup, 1),
+            "lines": {line_id: asdict(summary) for line_id, summary in sorted(result.lines.items())},
+        },
+        sys.stdout,
+        indent=2,
+    )
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import logging
+
+from .config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    table: str
+    time_column: str
+    max_age_days: float = 0.0
+    size_capped: bool = True
+    naive_local_time: bool = False
+
+    def cutoff(self, now: datetime) -> str:
+        moment = now - timedelta(days=self.max_age_days)
+        if self.naive_local_time:
+            moment = moment.astimezone().replace(tzinfo=None)
+        return moment.isoformat()
+
+
+class RetentionWorker:
+    """Low-priority background pruning of SQLite log tables.
+
+    Rows are removed oldest first in batches of ``batch_size`` with a short
+    pause between batches, so the writer on the control path only ever
+    waits for one small transaction. Freed pages are returned to the file
+    system with ``incremental_vacuum`` when the database was created with
+    ``auto_vacuum=INCREMENTAL``.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        policies: Sequence[RetentionPolicy],
+        max_db_bytes: int = 0,
+        interval_sec: float = 3600.0,
+        batch_size: int = 500,
+        pause_sec: float = 0.05,
+        vacuum_pages: int = 256,
+    ) -> None:
+        self._db_path = db_path
+        self._policies = tuple(policies)
+        self._max_db_bytes = max(0, max_db_bytes)
+        self._interval_sec = max(1.0, interval_sec)
+        self._batch_size = max(1, batch_size)
+        self._pause_sec = max(0.0, pause_sec)
+        self._vacuum_pages = max(1, vacuum_pages)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._warned_auto_vacuum = False
+
+    @classmethod
+    def from_config(cls, config: AppConfig) -> "RetentionWorker":
+        policies = [
+            RetentionPolicy("command_log", "received_at", config.retention_command_log_days),
+            RetentionPolicy("output_log", "created_at", config.retention_output_log_days),
+            RetentionPolicy("event_log", "created_at", config.retention_event_log_days),
+            RetentionPolicy("rollup_minute", "bucket", config.retention_rollup_minute_days, size_capped=False),
+            RetentionPolicy("rollup_hour", "bucket", config.retention_rollup_hour_days, size_capped=False),
+        ]
+        return cls(
+            config.db_path,
+            policies,
+            max_db_bytes=int(config.retention_max_db_mb * 1024 * 1024),
+            interval_sec=config.retention_interval_sec,
+            batch_size=config.retention_batch_size,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_db_bytes > 0 or any(policy.max_age_days > 0 for policy in self._policies)
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="storage-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self) -> Dict[str, int]:
+        deleted: Dict[str, int] = {policy.table: 0 for policy in self._policies}
+        now = datetime.now(timezone.utc)
+
+        with closing(sqlite3.connect(self._db_path, timeout=30.0)) as conn:
+            for policy in self._policies:
+                if policy.max_age_days <= 0:
+                    continue
+                cutoff = policy.cutoff(now)
+                while not self._stop.is_set():
+                    removed = self._delete_batch(conn, policy, cutoff)
+                    deleted[policy.table] += removed
+                    if removed < self._batch_size or self._stop.wait(self._pause_sec):
+                        break
+
+            if self._max_db_bytes > 0:
+                capped = [policy for policy in self._policies if policy.size_capped]
+                while not self._stop.is_set() and self._used_bytes(conn) > self._max_db_bytes:
+                    policy = self._oldest_policy(conn, capped)
+                    if policy is None:
+                        break
+                    deleted[policy.table] += self._delete_batch(conn, policy, None)
+                    if self._stop.wait(self._pause_sec):
+                        break
+
+            if any(deleted.values()):
+                self._reclaim(conn)
+
+        if any(deleted.values()):
+            logger.info("Retention removed rows: %s", deleted)
+        return deleted
+
+    def _run(self) -> None:
+        _lower_thread_priority()
+        while True:
+            try:
+                self.run_once()
+            except sqlite3.Error as exc:
+                logger.warning("Retention pass failed: %s", exc)
+            if self._stop.wait(self._interval_sec):
+                return
+
+    def _delete_batch(self, conn: sqlite3.Connection, policy: RetentionPolicy, cutoff: Optional[str]) -> int:
+        table, column = policy.table, policy.time_column
+        where, params = (f"WHERE {column} < ?", [cutoff]) if cutoff is not None else ("", [])
+        row = conn.execute(
+            f"SELECT {column} FROM {table} {where} ORDER BY {column} LIMIT 1 OFFSET ?",
+            (*params, self._batch_size - 1),
+        ).fetchone()
+
+        with conn:
+            if row is None:
+                if cutoff is None:
+                    cur = conn.execute(f"DELETE FROM {table}")
+                else:
+                    cur = conn.execute(f"DELETE FROM {table} WHERE {column} < ?", (cutoff,))
+            else:
+                cur = conn.execute(
+                    f"DELETE FROM {table} WHERE {column} <= ? {where.replace('WHERE', 'AND')}",
+                    (row[0], *params),
+                )
+        return cur.rowcount
+
+    @staticmethod
+    def _oldest_policy(
+        conn: sqlite3.Connection, policies: Sequence[RetentionPolicy]
+    ) -> Optional[RetentionPolicy]:
+        oldest: Optional[RetentionPolicy] = None
+        oldest_value = None
+        for policy in policies:
+            row = conn.execute(
+                f"SELECT {policy.time_column} FROM {policy.table} "
+                f"ORDER BY {policy.time_column} LIMIT 1"
+            ).fetchone()
+            if row is not None and (oldest_value is None or row[0] < oldest_value):
+                oldest, oldest_value = policy, row[0]
+        return oldest
+
+    @staticmethod
+    def _used_bytes(conn: sqlite3.Connection) -> int:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - freelist) * page_size
+
+    def _reclaim(self, conn: sqlite3.Connection) -> None:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            if not self._warned_auto_vacuum:
+                logger.info(
+                    "%s was created without auto_vacuum=INCREMENTAL; freed pages are reused "
+                    "but the file will not shrink until a manual VACUUM",
+                    self._db_path,
+                )
+                self._warned_auto_vacuum = True
+            return
+
+        while not self._stop.is_set() and conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            conn.execute(f"PRAGMA incremental_vacuum({self._vacuum_pages})").fetchall()
+            if self._stop.wait(self._pause_sec):
+                break
+
+
+def _lower_thread_priority() -> None:
+    if not hasattr(os, "setpriority"):
+        return
+    try:
+        # On Linux each thread has its own nice value.
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (OSError, AttributeError):
+        pass
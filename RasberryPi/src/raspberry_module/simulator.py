@@ -46,16 +46,19 @@ def _send_http(url: str, payload: dict) -> None:
 def _run_direct(duration: int, interval: float) -> None:
     config = AppConfig.load()
     setup_logging(config.log_path)
-    storage = Storage(config.db_path)
+    storage = Storage.from_config(config)
     controller = SpeedController(config, storage)
 
-    end_time = time.time() + duration
-    while time.time() < end_time:
-        speed = _generate_speed(config)
-        payload = _build_payload(speed)
-        command = CommandIn(**payload)
-        controller.process_command(command)
-        time.sleep(interval)
+    try:
+        end_time = time.time() + duration
+        while time.time() < end_time:
+            speed = _generate_speed(config)
+            payload = _build_payload(speed)
+            command = CommandIn(**payload)
+            controller.process_command(command)
+            time.sleep(interval)
+    finally:
+        storage.close()
 
 
 def _run_http(duration: int, interval: float, url: str) -> None:
@@ -1,24 +1,162 @@
+import base64
+import csv
+import gzip
+import io
 import json
+import os
+import shutil
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import closing, contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import logging
 
+from .config import AppConfig
+from .writer import _DB_COMMIT, WriteBehindWriter, WriteOp
+
 logger = logging.getLogger(__name__)
 
+EXPORT_TABLES = ("command_log", "output_log", "event_log")
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_ROTATIONS = {"hourly": "%Y%m%d%H", "daily": "%Y%m%d"}
+ROLLUP_TABLES = {"minute": "rollup_minute", "hour": "rollup_hour"}
+HISTORY_TIME_COLUMNS = {"command_log": "received_at", "output_log": "created_at"}
+HISTORY_MAX_LIMIT = 1000
+
+
+def encode_cursor(moment: str, row_id: int) -> str:
+    raw = json.dumps([moment, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        moment, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(moment), int(row_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def _bucket_start(moment: datetime, resolution: str) -> str:
+    moment = moment.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    if resolution == "hour":
+        moment = moment.replace(minute=0)
+    return moment.isoformat()
+
+
+@dataclass(frozen=True)
+class ExportResult:
+    table: str
+    path: str
+    rows: int
+    elapsed_sec: float
+    rows_per_sec: float
+
 
 class Storage:
-    def __init__(self, db_path: Path) -> None:
+    def __init__(
+        self,
+        db_path: Path,
+        write_behind: bool = False,
+        batch_size: int = 200,
+        flush_interval_sec: float = 0.25,
+        queue_size: int = 10000,
+    ) -> None:
         self._db_path = db_path
         self._init_db()
+        self._local = threading.local()
+        self._writer: Optional[WriteBehindWriter] = None
+        if write_behind:
+            self._writer = WriteBehindWriter(
+                db_path,
+                batch_size=batch_size,
+                flush_interval_sec=flush_interval_sec,
+                queue_size=queue_size,
+            )
+            self._writer.start()
+
+    @classmethod
+    def from_config(cls, config: AppConfig) -> "Storage":
+        return cls(
+            config.db_path,
+            write_behind=config.storage_write_behind,
+            batch_size=config.storage_batch_size,
+            flush_interval_sec=config.storage_flush_interval_ms / 1000.0,
+            queue_size=config.storage_queue_size,
+        )
+
+    @property
+    def write_behind(self) -> bool:
+        return self._writer is not None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        if self._writer is None:
+            return True
+        return self._writer.flush(timeout)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.stop()
+
+    def write_backlog(self) -> float:
+        """Fraction of the write-behind queue in use (always 0 for direct writes)."""
+        if self._writer is None:
+            return 0.0
+        return self._writer.queue_depth / self._writer.queue_capacity
+
+    def stats(self) -> Dict[str, Any]:
+        if self._writer is None:
+            return {"mode": "direct"}
+        return {"mode": "write_behind", **asdict(self._writer.stats())}
 
     def _connect(self) -> sqlite3.Connection:
         return sqlite3.connect(self._db_path)
 
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Collect every write made on this thread inside the block into one transaction.
+
+        The transaction is submitted when the block exits normally; writes are
+        discarded if it raises.
+        """
+        if getattr(self._local, "ops", None) is not None:
+            yield
+            return
+
+        self._local.ops = []
+        try:
+            yield
+            ops: List[WriteOp] = self._local.ops
+        finally:
+            self._local.ops = None
+
+        if ops:
+            def op(conn: sqlite3.Connection) -> None:
+                for pending in ops:
+                    pending(conn)
+
+            self._submit(op)
+
+    def _submit(self, op: WriteOp) -> None:
+        pending = getattr(self._local, "ops", None)
+        if pending is not None:
+            pending.append(op)
+            return
+        if self._writer is not None:
+            self._writer.submit(op)
+            return
+        with _DB_COMMIT.time(), self._connect() as conn:
+            op(conn)
+
     def _init_db(self) -> None:
         with self._connect() as conn:
+            # Only takes effect on a new database; lets retention shrink the file.
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS command_log (
@@ -41,10 +179,18 @@ class Storage:
                     created_at TEXT NOT NULL,
                     speed_used REAL NOT NULL,
                     voltage REAL NOT NULL,
-                    reason TEXT NOT NULL
+                    reason TEXT NOT NULL,
+                    line_id TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL DEFAULT 'valid',
+                    encoder_delta REAL,
+                    target_voltage REAL
                 )
                 """
             )
+            self._ensure_column(conn, "output_log", "line_id", "TEXT NOT NULL DEFAULT ''")
+            self._ensure_column(conn, "output_log", "status", "TEXT NOT NULL DEFAULT 'valid'")
+            self._ensure_column(conn, "output_log", "encoder_delta", "REAL")
+            self._ensure_column(conn, "output_log", "target_voltage", "REAL")
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS event_log (
@@ -55,6 +201,74 @@ class Storage:
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS export_watermark (
+                    table_name TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL,
+                    exported_at TEXT NOT NULL
+                )
+                """
+            )
+            # An export in flight: rows up to pending_id staged in pending_path,
+            # to be appended to the export file at byte pending_offset.
+            self._ensure_column(conn, "export_watermark", "pending_id", "INTEGER")
+            self._ensure_column(conn, "export_watermark", "pending_path", "TEXT")
+            self._ensure_column(conn, "export_watermark", "pending_offset", "INTEGER")
+            for rollup_table in ROLLUP_TABLES.values():
+                conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {rollup_table} (
+                        line_id TEXT NOT NULL,
+                        bucket TEXT NOT NULL,
+                        count INTEGER NOT NULL,
+                        invalid_count INTEGER NOT NULL,
+                        speed_min REAL NOT NULL,
+                        speed_max REAL NOT NULL,
+                        speed_sum REAL NOT NULL,
+                        speed_last REAL NOT NULL,
+                        voltage_min REAL NOT NULL,
+                        voltage_max REAL NOT NULL,
+                        voltage_sum REAL NOT NULL,
+                        voltage_last REAL NOT NULL,
+                        PRIMARY KEY (line_id, bucket)
+                    ) WITHOUT ROWID
+                    """
+                )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_command_log_received_at ON command_log (received_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_output_log_created_at ON output_log (created_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_event_log_created_at ON event_log (created_at)"
+            )
+            # History pages walk (time, id) backwards; SQLite appends the rowid
+            # to every index, so these cover the keyset without a sort.
+            for table_name, time_column in HISTORY_TIME_COLUMNS.items():
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table_name}_line_time "
+                    f"ON {table_name} (line_id, {time_column})"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table_name}_line_status_time "
+                    f"ON {table_name} (line_id, status, {time_column})"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table_name}_status_time "
+                    f"ON {table_name} (status, {time_column})"
+                )
+            for rollup_table in ROLLUP_TABLES.values():
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{rollup_table}_bucket ON {rollup_table} (bucket)"
+                )
+
+    @staticmethod
+    def _ensure_column(conn: sqlite3.Connection, table_name: str, column: str, ddl: str) -> None:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {ddl}")
 
     def log_command(
         self,
@@ -67,75 +281,503 @@ class Storage:
         reason: str,
         raw_json: Dict[str, Any],
     ) -> None:
-        with self._connect() as conn:
+        params = (
+            received_at.isoformat(),
+            line_id,
+            speed,
+            mode,
+            timestamp.isoformat(),
+            status,
+            reason,
+            json.dumps(raw_json, separators=(",", ":")),
+        )
+
+        def op(conn: sqlite3.Connection) -> None:
             conn.execute(
                 """
                 INSERT INTO command_log (
                     received_at, line_id, speed, mode, timestamp, status, reason, raw_json
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """,
+                params,
+            )
+
+        self._submit(op)
+
+    def log_output(
+        self,
+        created_at: datetime,
+        speed_used: float,
+        voltage: float,
+        reason: str,
+        line_id: str = "",
+        status: str = "valid",
+        encoder_delta: Optional[float] = None,
+        target_voltage: Optional[float] = None,
+    ) -> None:
+        params = (created_at.isoformat(), speed_used, voltage, reason, line_id, status, encoder_delta, target_voltage)
+        invalid = 0 if status == "valid" else 1
+        rollup_params = [
+            (
+                ROLLUP_TABLES[resolution],
                 (
-                    received_at.isoformat(),
                     line_id,
-                    speed,
-                    mode,
-                    timestamp.isoformat(),
-                    status,
-                    reason,
-                    json.dumps(raw_json, separators=(",", ":")),
+                    _bucket_start(created_at, resolution),
+                    invalid,
+                    speed_used,
+                    speed_used,
+                    speed_used,
+                    speed_used,
+                    voltage,
+                    voltage,
+                    voltage,
+                    voltage,
                 ),
             )
+            for resolution in ROLLUP_TABLES
+        ]
 
-    def log_output(
-        self, created_at: datetime, speed_used: float, voltage: float, reason: str
-    ) -> None:
-        with self._connect() as conn:
+        def op(conn: sqlite3.Connection) -> None:
             conn.execute(
                 """
-                INSERT INTO output_log (created_at, speed_used, voltage, reason)
-                VALUES (?, ?, ?, ?)
+                INSERT INTO output_log (
+                    created_at, speed_used, voltage, reason, line_id, status, encoder_delta, target_voltage
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (created_at.isoformat(), speed_used, voltage, reason),
+                params,
             )
+            for rollup_table, values in rollup_params:
+                conn.execute(
+                    f"""
+                    INSERT INTO {rollup_table} (
+                        line_id, bucket, count, invalid_count,
+                        speed_min, speed_max, speed_sum, speed_last,
+                        voltage_min, voltage_max, voltage_sum, voltage_last
+                    ) VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(line_id, bucket) DO UPDATE SET
+                        count = count + 1,
+                        invalid_count = invalid_count + excluded.invalid_count,
+                        speed_min = MIN(speed_min, excluded.speed_min),
+                        speed_max = MAX(speed_max, excluded.speed_max),
+                        speed_sum = speed_sum + excluded.speed_sum,
+                        speed_last = excluded.speed_last,
+                        voltage_min = MIN(voltage_min, excluded.voltage_min),
+                        voltage_max = MAX(voltage_max, excluded.voltage_max),
+                        voltage_sum = voltage_sum + excluded.voltage_sum,
+                        voltage_last = excluded.voltage_last
+                    """,
+                    values,
+                )
+
+        self._submit(op)
 
     def log_event(self, created_at: datetime, level: str, message: str) -> None:
-        with self._connect() as conn:
+        params = (created_at.isoformat(), level, message)
+
+        def op(conn: sqlite3.Connection) -> None:
             conn.execute(
                 """
                 INSERT INTO event_log (created_at, level, message)
                 VALUES (?, ?, ?)
                 """,
-                (created_at.isoformat(), level, message),
+                params,
             )
 
-    def export_csv(self, output_dir: Path) -> Dict[str, str]:
+        self._submit(op)
+
+    def query_trends(
+        self,
+        line_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        resolution: str = "minute",
+    ) -> List[Dict[str, Any]]:
+        if resolution not in ROLLUP_TABLES:
+            raise ValueError(f"unknown resolution: {resolution}")
+
+        clauses = ["line_id = ?"]
+        params: List[Any] = [line_id]
+        if start is not None:
+            clauses.append("bucket >= ?")
+            params.append(_bucket_start(start, resolution))
+        if end is not None:
+            clauses.append("bucket <= ?")
+            params.append(_bucket_start(end, resolution))
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"""
+                SELECT bucket, count, invalid_count,
+                       speed_min, speed_max, speed_sum, speed_last,
+                       voltage_min, voltage_max, voltage_sum, voltage_last
+                FROM {ROLLUP_TABLES[resolution]}
+                WHERE {" AND ".join(clauses)}
+                ORDER BY bucket
+                """,
+                params,
+            ).fetchall()
+
+        return [
+            {
+                "bucket": bucket,
+                "count": count,
+                "invalid_count": invalid_count,
+                "speed": {
+                    "min": speed_min,
+                    "max": speed_max,
+                    "mean": speed_sum / count,
+                    "last": speed_last,
+                },
+                "voltage": {
+                    "min": voltage_min,
+                    "max": voltage_max,
+                    "mean": voltage_sum / count,
+                    "last": voltage_last,
+                },
+            }
+            for (
+                bucket,
+                count,
+                invalid_count,
+                speed_min,
+                speed_max,
+                speed_sum,
+                speed_last,
+                voltage_min,
+                voltage_max,
+                voltage_sum,
+                voltage_last,
+            ) in rows
+        ]
+
+    def query_history(
+        self,
+        table_name: str = "command_log",
+        line_id: Optional[str] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        if table_name not in HISTORY_TIME_COLUMNS:
+            raise ValueError(f"unknown table: {table_name}")
+        time_column = HISTORY_TIME_COLUMNS[table_name]
+        limit = max(1, min(HISTORY_MAX_LIMIT, limit))
+
+        clauses: List[str] = []
+        params: List[Any] = []
+        if line_id is not None:
+            clauses.append("line_id = ?")
+            params.append(line_id)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if start is not None:
+            clauses.append(f"{time_column} >= ?")
+            params.append(start.astimezone(timezone.utc).isoformat())
+        if end is not None:
+            clauses.append(f"{time_column} <= ?")
+            params.append(end.astimezone(timezone.utc).isoformat())
+        if cursor is not None:
+            clauses.append(f"({time_column}, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                f"""
+                SELECT * FROM {table_name}
+                {where}
+                ORDER BY {time_column} DESC, id DESC
+                LIMIT ?
+                """,
+                (*params, limit + 1),
+            ).fetchall()
+
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last[time_column], last["id"])
+        return items, next_cursor
+
+    def export_csv(self, output_dir: Path) -> Dict[str, ExportResult]:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self.flush()
+        return {
+            table_name: self._export_table(table_name, output_dir / f"{table_name}.csv")
+            for table_name in EXPORT_TABLES
+        }
+
+    def export_incremental(
+        self,
+        output_dir: Path,
+        full: bool = False,
+        rotation: str = "daily",
+        keep_files: int = 0,
+        on_progress: Optional[Callable[[str, int], None]] = None,
+    ) -> Dict[str, ExportResult]:
+        """Export the rows of each table added since its watermark.
+
+        An export interrupted by a crash is finished first (see
+        ``_commit_export``). Its rows go to the file they were staged for and
+        are not counted in ``rows``, which only covers this call's export.
+        """
+        if rotation not in EXPORT_ROTATIONS:
+            raise ValueError(f"unknown rotation: {rotation}")
+
         output_dir.mkdir(parents=True, exist_ok=True)
+        self.flush()
+        now = datetime.now(timezone.utc)
+        if full:
+            suffix = "full_" + now.strftime("%Y%m%dT%H%M%S")
+        else:
+            suffix = now.strftime(EXPORT_ROTATIONS[rotation])
+
         exports = {}
+        for table_name in EXPORT_TABLES:
+            self._commit_export(table_name)
+            after_id = 0 if full else self.get_watermark(table_name)
+            output_path = output_dir / f"{table_name}_{suffix}.csv.gz"
+            exports[table_name] = self._export_table_gzip(
+                table_name, output_path, after_id, on_progress
+            )
+            if keep_files > 0:
+                self._rotate_exports(output_dir, table_name, keep_files)
+        return exports
+
+    def count_rows(self, table_name: str, after_id: int = 0) -> int:
+        if table_name not in EXPORT_TABLES:
+            raise ValueError(f"unknown table: {table_name}")
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT COUNT(*) FROM {table_name} WHERE id > ?", (after_id,)
+            ).fetchone()
+        return int(row[0])
+
+    def get_watermark(self, table_name: str) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT last_id FROM export_watermark WHERE table_name = ?", (table_name,)
+            ).fetchone()
+        return int(row[0]) if row else 0
+
+    def _stage_export(self, table_name: str, output_path: Path, last_id: int) -> None:
+        offset = output_path.stat().st_size if output_path.exists() else 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO export_watermark (table_name, last_id, exported_at, pending_id, pending_path, pending_offset)
+                VALUES (?, 0, ?, ?, ?, ?)
+                ON CONFLICT(table_name) DO UPDATE SET
+                    pending_id = excluded.pending_id,
+                    pending_path = excluded.pending_path,
+                    pending_offset = excluded.pending_offset
+                """,
+                (table_name, datetime.now(timezone.utc).isoformat(), last_id, str(output_path), offset),
+            )
+
+    def _commit_export(self, table_name: str) -> None:
+        """Append the staged rows of ``table_name`` to its export file and move the watermark.
+
+        Also run before each export to finish one interrupted by a crash: the
+        export file is cut back to its size before the interrupted append and
+        the staged rows are appended again, so a retry never duplicates rows;
+        the watermark only moves once the file is complete.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT pending_id, pending_path, pending_offset FROM export_watermark WHERE table_name = ?",
+                (table_name,),
+            ).fetchone()
+        if row is None or row[0] is None:
+            return
+        pending_id, output_path, offset = int(row[0]), Path(row[1]), int(row[2])
+        staging_path = output_path.with_name(output_path.name + ".pending")
+        if staging_path.exists():
+            mode = "r+b" if output_path.exists() else "wb"
+            with output_path.open(mode) as out, staging_path.open("rb") as staged:
+                out.truncate(offset)
+                out.seek(offset)
+                shutil.copyfileobj(staged, out)
+                out.flush()
+                os.fsync(out.fileno())
+            watermark = pending_id
+        else:
+            logger.warning("Staged export for %s is missing; rows after the watermark will be exported again", table_name)
+            watermark = self.get_watermark(table_name)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                UPDATE export_watermark
+                SET last_id = ?, exported_at = ?, pending_id = NULL, pending_path = NULL, pending_offset = NULL
+                WHERE table_name = ?
+                """,
+                (watermark, datetime.now(timezone.utc).isoformat(), table_name),
+            )
+        staging_path.unlink(missing_ok=True)
+
+    def iter_csv(
+        self,
+        table_name: str,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        after_id: int = 0,
+        header: bool = True,
+    ) -> Iterator[str]:
+        if table_name not in EXPORT_TABLES:
+            raise ValueError(f"unknown table: {table_name}")
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        rows = 0
+        started = time.perf_counter()
+
+        # The connection may be advanced from different threadpool workers
+        # when the iterator backs a StreamingResponse.
+        with closing(sqlite3.connect(self._db_path, check_same_thread=False)) as conn:
+            cur = conn.execute(
+                f"SELECT * FROM {table_name} WHERE id > ? ORDER BY id", (after_id,)
+            )
+            if header:
+                writer.writerow([desc[0] for desc in cur.description])
+            while True:
+                chunk = cur.fetchmany(chunk_rows)
+                if chunk:
+                    writer.writerows(chunk)
+                    rows += len(chunk)
+                    if on_progress is not None:
+                        on_progress(rows, chunk[-1][0])
+                if buffer.tell():
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+                if not chunk:
+                    break
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Exported %s rows from %s in %.3fs (%.0f rows/s)",
+            rows,
+            table_name,
+            elapsed,
+            rows / elapsed if elapsed > 0 else 0.0,
+        )
+
+    def _export_table(self, table_name: str, output_path: Path) -> ExportResult:
+        rows = 0
+
+        def count(done: int, last_id: int) -> None:
+            nonlocal rows
+            rows = done
+
+        started = time.perf_counter()
+        with output_path.open("w", encoding="utf-8", newline="") as fh:
+            for chunk in self.iter_csv(table_name, on_progress=count):
+                fh.write(chunk)
+        elapsed = time.perf_counter() - started
 
-        exports["command_log"] = self._export_table(
-            "command_log", output_dir / "command_log.csv"
+        return ExportResult(
+            table=table_name,
+            path=str(output_path),
+            rows=rows,
+            elapsed_sec=elapsed,
+            rows_per_sec=rows / elapsed if elapsed > 0 else 0.0,
         )
-        exports["output_log"] = self._export_table(
-            "output_log", output_dir / "output_log.csv"
+
+    def _export_table_gzip(
+        self,
+        table_name: str,
+        output_path: Path,
+        after_id: int,
+        on_progress: Optional[Callable[[str, int], None]] = None,
+    ) -> ExportResult:
+        rows = 0
+        last_id = after_id
+
+        def track(done: int, last: int) -> None:
+            nonlocal rows, last_id
+            rows = done
+            last_id = last
+            if on_progress is not None:
+                on_progress(table_name, done)
+
+        started = time.perf_counter()
+        with closing(self._connect()) as conn:
+            pending = conn.execute(
+                f"SELECT EXISTS(SELECT 1 FROM {table_name} WHERE id > ?)", (after_id,)
+            ).fetchone()[0]
+
+        if pending:
+            # The new rows become one gzip member, staged next to the export and
+            # appended to it only once recorded as pending (see _commit_export);
+            # readers see one continuous CSV.
+            new_file = not output_path.exists()
+            staging_path = output_path.with_name(output_path.name + ".pending")
+            with open(staging_path, "wb") as raw:
+                with gzip.open(raw, "wt", encoding="utf-8", newline="") as fh:
+                    for chunk in self.iter_csv(
+                        table_name, on_progress=track, after_id=after_id, header=new_file
+                    ):
+                        fh.write(chunk)
+                raw.flush()
+                os.fsync(raw.fileno())
+            self._stage_export(table_name, output_path, last_id)
+            self._commit_export(table_name)
+        elapsed = time.perf_counter() - started
+
+        return ExportResult(
+            table=table_name,
+            path=str(output_path) if pending else "",
+            rows=rows,
+            elapsed_sec=elapsed,
+            rows_per_sec=rows / elapsed if elapsed > 0 else 0.0,
         )
-        exports["event_log"] = self._export_table(
-            "event_log", output_dir / "event_log.csv"
+
+    @staticmethod
+    def _rotate_exports(output_dir: Path, table_name: str, keep_files: int) -> None:
+        files = sorted(
+            output_dir.glob(f"{table_name}_*.csv.gz"),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True,
         )
-        return exports
+        for stale in files[keep_files:]:
+            try:
+                stale.unlink()
+            except OSError as exc:
+                logger.warning("Failed to remove old export %s: %s", stale, exc)
 
-    def _export_table(self, table_name: str, output_path: Path) -> str:
-        with self._connect() as conn:
-            cur = conn.execute(f"SELECT * FROM {table_name}")
-            rows = cur.fetchall()
-            headers = [desc[0] for desc in cur.description]
-
-        lines = [",".join(headers)]
-        for row in rows:
-            lines.append(
-                ",".join(
-                    "\"" + str(value).replace("\"", "\"\"") + "\"" for value in row
-                )
-            )
 
-        output_path.write_text("\n".join(lines), encoding="utf-8")
-        return str(output_path)
+class NullStorage:
+    """Drop-in for Storage that discards every write (replays, benchmarks)."""
+
+    write_behind = False
+
+    def log_command(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def log_output(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def log_event(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        yield
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+    def write_backlog(self) -> float:
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "null"}
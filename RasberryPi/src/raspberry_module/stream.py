@@ -0,0 +1,199 @@
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, Iterable, Mapping, Optional, Set
+
+import logging
+
+from fastapi import Request, WebSocket
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SEC = 15.0
+
+_MISSING = object()
+
+
+class StateStream:
+    """Fan-out of per-line state changes to live subscribers.
+
+    Producers (controller thread, output loop, MQTT callbacks) call
+    ``publish`` with the current fields of a line; only fields that changed
+    since the last publish are forwarded. Each subscriber keeps one pending
+    delta per line, so updates that arrive faster than it reads are merged
+    instead of queued and a slow client never holds up a producer.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._subscribers: Set["StateSubscription"] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, line_id: str, fields: Mapping[str, Any]) -> None:
+        with self._lock:
+            current = self._state.setdefault(line_id, {})
+            delta = {key: value for key, value in fields.items() if current.get(key, _MISSING) != value}
+            if not delta:
+                return
+            current.update(delta)
+            for subscription in self._subscribers:
+                subscription._offer(line_id, delta)
+
+    def subscribe(
+        self,
+        lines: Optional[Iterable[str]] = None,
+        max_rate_hz: float = 10.0,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> "StateSubscription":
+        subscription = StateSubscription(self, loop or asyncio.get_running_loop(), lines, max_rate_hz)
+        with self._lock:
+            subscription.initial = {
+                line_id: dict(fields) for line_id, fields in self._state.items() if subscription.wants(line_id)
+            }
+            self._subscribers.add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: "StateSubscription") -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+class StateSubscription:
+    def __init__(
+        self,
+        stream: StateStream,
+        loop: asyncio.AbstractEventLoop,
+        lines: Optional[Iterable[str]],
+        max_rate_hz: float,
+    ) -> None:
+        self._stream = stream
+        self._loop = loop
+        self._lines = frozenset(lines) if lines else None
+        self._interval = 1.0 / max_rate_hz if max_rate_hz > 0 else 0.0
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._signalled = False
+        self._ready = asyncio.Event()
+        self._last_sent = 0.0
+        self._closed = False
+        self.initial: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def wants(self, line_id: str) -> bool:
+        return self._lines is None or line_id in self._lines
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._stream._unsubscribe(self)
+        self._ready.set()
+
+    def __enter__(self) -> "StateSubscription":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Wait for the next coalesced batch of line deltas.
+
+        Returns ``None`` on timeout or once the subscription is closed.
+        """
+        delay = self._last_sent + self._interval - self._loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self._closed:
+            return None
+        with self._stream._lock:
+            batch, self._pending = self._pending, {}
+            self._signalled = False
+            self._ready.clear()
+        self._last_sent = self._loop.time()
+        return batch
+
+    def _offer(self, line_id: str, delta: Mapping[str, Any]) -> None:
+        # Called with the stream lock held, from any thread.
+        if not self.wants(line_id):
+            return
+        self._pending.setdefault(line_id, {}).update(delta)
+        if self._signalled:
+            return
+        self._signalled = True
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Event loop already closed; the subscriber is gone.
+            self._signalled = False
+
+
+def _message(kind: str, lines: Mapping[str, Any]) -> Dict[str, Any]:
+    return {"type": kind, "lines": lines}
+
+
+async def _events(subscription: StateSubscription) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    yield _message("snapshot", subscription.initial)
+    while not subscription.closed:
+        batch = await subscription.next(KEEPALIVE_SEC)
+        if subscription.closed:
+            return
+        yield _message("delta", batch) if batch else None
+
+
+def sse_response(
+    stream: StateStream,
+    request: Request,
+    lines: Optional[Iterable[str]] = None,
+    max_rate_hz: float = 10.0,
+) -> StreamingResponse:
+    async def body() -> AsyncIterator[str]:
+        with stream.subscribe(lines, max_rate_hz) as subscription:
+            async for message in _events(subscription):
+                if await request.is_disconnected():
+                    return
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {message['type']}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def serve_websocket(
+    stream: StateStream,
+    websocket: WebSocket,
+    lines: Optional[Iterable[str]] = None,
+    max_rate_hz: float = 10.0,
+) -> None:
+    await websocket.accept()
+    with stream.subscribe(lines, max_rate_hz) as subscription:
+
+        async def watch_disconnect() -> None:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+            subscription.close()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            async for message in _events(subscription):
+                if message is not None:
+                    await websocket.send_json(message)
+        except Exception as exc:
+            logger.debug("State stream client went away: %s", exc)
+        finally:
+            watcher.cancel()
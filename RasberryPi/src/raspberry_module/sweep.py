@@ -0,0 +1,265 @@
+import argparse
+import csv
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields, replace
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from .calibration import CalibrationTable
+from .config import AppConfig
+from .replay import ReplayEvent, load_events, parse_time, replay
+
+SWEEP_FIELDS = (
+    "ct_filter_type",
+    "ct_filter_window_samples",
+    "ct_filter_window_sec",
+    "ct_filter_ema_alpha",
+    "ramp_rate_v_per_sec",
+    "speed_min",
+    "speed_max",
+    "default_speed",
+    "ct_to_speed_factor",
+    "output_rate_hz",
+    "max_timestamp_age_sec",
+)
+RANKINGS = ("balanced", "stability", "responsiveness")
+
+_FIELD_TYPES = {field.name: field.type for field in fields(AppConfig)}
+
+# Per-process state, set once by the pool initializer so the recorded events
+# are pickled to each worker once instead of once per combination.
+_events: List[ReplayEvent] = []
+_base: Optional[AppConfig] = None
+_reference: List[Optional[float]] = []
+
+
+@dataclass(frozen=True)
+class SweepScore:
+    overrides: Dict[str, Any]
+    events: int
+    fallbacks: int
+    clamp_hits: int
+    ramp_limited: int
+    # RMS of the change in applied voltage between consecutive events of a line (lower is steadier).
+    stability: float
+    # RMS distance between the applied voltage and the demand trend (lower follows faster).
+    tracking_error: float
+    score: float = 0.0
+
+
+def parse_grid(items: Sequence[str]) -> Dict[str, List[Any]]:
+    grid: Dict[str, List[Any]] = {}
+    for item in items:
+        name, sep, raw_values = item.partition("=")
+        name = name.strip()
+        if not sep or name not in SWEEP_FIELDS:
+            raise ValueError(f"expected <field>=v1,v2,... with field in {', '.join(SWEEP_FIELDS)}: {item}")
+        cast = _FIELD_TYPES[name]
+        grid[name] = [cast(value.strip()) for value in raw_values.split(",") if value.strip()]
+        if not grid[name]:
+            raise ValueError(f"no values for {name}")
+    return grid
+
+
+def combinations(grid: Mapping[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def reference_voltages(
+    events: Sequence[ReplayEvent], config: AppConfig, half_window: int = 5
+) -> List[Optional[float]]:
+    """Demand trend for each cycle time under the base settings.
+
+    The raw CT is mapped to a voltage with no filter and no ramp, then
+    smoothed with a centred moving average of ``half_window`` samples on each
+    side. Being centred, the trend has no lag, so settings are scored on how
+    fast they follow real changes rather than on how much noise they pass.
+    """
+    calibration = CalibrationTable.load(
+        config.calibration_path,
+        config.speed_min,
+        config.speed_max,
+        config.voltage_min,
+        config.voltage_max,
+        pitch_distance=config.ct_to_speed_factor,
+    )
+    by_line: Dict[str, List[int]] = {}
+    for index, event in enumerate(events):
+        if event.cycle_time_minutes is not None:
+            by_line.setdefault(event.line_id, []).append(index)
+
+    reference: List[Optional[float]] = [None] * len(events)
+    for line_id, indexes in by_line.items():
+        line = calibration.for_line(line_id)
+        demand = [
+            line.voltage(max(config.speed_min, min(config.speed_max, line.speed(events[i].cycle_time_minutes))))
+            for i in indexes
+        ]
+        prefix = list(accumulate(demand, initial=0.0))
+        for position, index in enumerate(indexes):
+            low = max(0, position - half_window)
+            high = min(len(demand), position + half_window + 1)
+            reference[index] = (prefix[high] - prefix[low]) / (high - low)
+    return reference
+
+
+def evaluate(
+    events: Sequence[ReplayEvent],
+    base: AppConfig,
+    overrides: Mapping[str, Any],
+    reference: Sequence[Optional[float]],
+) -> SweepScore:
+    result = replay(events, replace(base, **overrides))
+
+    step_sq = 0.0
+    steps = 0
+    previous: Dict[str, float] = {}
+    tracking_sq = 0.0
+    tracked = 0
+    for point, wanted in zip(result.points, reference):
+        last = previous.get(point.line_id)
+        if last is not None:
+            step_sq += (point.voltage - last) ** 2
+            steps += 1
+        previous[point.line_id] = point.voltage
+        if wanted is not None:
+            tracking_sq += (point.voltage - wanted) ** 2
+            tracked += 1
+
+    lines = result.lines.values()
+    return SweepScore(
+        overrides=dict(overrides),
+        events=len(result.points),
+        fallbacks=sum(line.fallbacks for line in lines),
+        clamp_hits=sum(line.clamp_hits for line in lines),
+        ramp_limited=sum(line.ramp_limited for line in lines),
+        stability=math.sqrt(step_sq / steps) if steps else 0.0,
+        tracking_error=math.sqrt(tracking_sq / tracked) if tracked else 0.0,
+    )
+
+
+def rank(scores: Sequence[SweepScore], by: str = "balanced") -> List[SweepScore]:
+    if by not in RANKINGS:
+        raise ValueError(f"unknown ranking: {by}")
+    if not scores:
+        return []
+    # Each metric relative to the best value in the sweep, so they weigh the same.
+    best_stability = min(score.stability for score in scores) or 1.0
+    best_tracking = min(score.tracking_error for score in scores) or 1.0
+    ranked = []
+    for score in scores:
+        stability = score.stability / best_stability
+        tracking = score.tracking_error / best_tracking
+        value = {"stability": stability, "responsiveness": tracking, "balanced": stability + tracking}[by]
+        ranked.append(replace(score, score=round(value, 4)))
+    return sorted(ranked, key=lambda item: item.score)
+
+
+def sweep(
+    events: Sequence[ReplayEvent],
+    base: AppConfig,
+    grid: Mapping[str, Sequence[Any]],
+    workers: Optional[int] = None,
+    by: str = "balanced",
+) -> List[SweepScore]:
+    events = list(events)
+    combos = combinations(grid)
+    reference = reference_voltages(events, base)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(combos)))
+
+    if workers == 1:
+        scores = [evaluate(events, base, overrides, reference) for overrides in combos]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(events, base, reference),
+        ) as pool:
+            scores = list(pool.map(_evaluate_in_worker, combos))
+    return rank(scores, by)
+
+
+def _init_worker(events: List[ReplayEvent], base: AppConfig, reference: List[Optional[float]]) -> None:
+    global _events, _base, _reference
+    _events, _base, _reference = events, base, reference
+
+
+def _evaluate_in_worker(overrides: Dict[str, Any]) -> SweepScore:
+    assert _base is not None
+    return evaluate(_events, _base, overrides, _reference)
+
+
+def _format_table(scores: Sequence[SweepScore], names: Sequence[str]) -> str:
+    header = ["rank", *names, "score", "stability", "tracking_error", "fallbacks", "clamp_hits", "ramp_limited"]
+    rows = [
+        [
+            str(position),
+            *(str(score.overrides[name]) for name in names),
+            f"{score.score:.4f}",
+            f"{score.stability:.4f}",
+            f"{score.tracking_error:.4f}",
+            str(score.fallbacks),
+            str(score.clamp_hits),
+            str(score.ramp_limited),
+        ]
+        for position, score in enumerate(scores, start=1)
+    ]
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in [header, *rows])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    config = AppConfig.load()
+    parser = argparse.ArgumentParser(
+        prog="python -m raspberry_module.sweep",
+        description="Replay recorded traffic for every combination of settings and rank them.",
+    )
+    parser.add_argument("--db", type=Path, default=config.db_path)
+    parser.add_argument("--from", dest="start", type=parse_time)
+    parser.add_argument("--to", dest="end", type=parse_time)
+    parser.add_argument("--line", dest="lines", action="append", help="line id (repeatable)")
+    parser.add_argument(
+        "--grid",
+        action="append",
+        required=True,
+        help="<field>=v1,v2,... (repeatable), e.g. ct_filter_window_samples=3,5,10",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--rank-by", choices=RANKINGS, default="balanced")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--csv", type=Path, help="write every ranked combination to this CSV file")
+    args = parser.parse_args(argv)
+
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    events = list(load_events(args.db, args.start, args.end, args.lines))
+    if not events:
+        print("No recorded commands in the selected range.")
+        return 1
+
+    scores = sweep(events, config, grid, workers=args.workers, by=args.rank_by)
+    print(f"{len(scores)} combinations x {len(events)} events, ranked by {args.rank_by}")
+    print(_format_table(scores[: args.top], list(grid)))
+
+    if args.csv is not None:
+        with open(args.csv, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.writer(handle)
+            names = list(grid)
+            writer.writerow([*names, *(name for name in asdict(scores[0]) if name != "overrides")])
+            for score in scores:
+                row = asdict(score)
+                overrides = row.pop("overrides")
+                writer.writerow([*(overrides[name] for name in names), *row.values()])
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
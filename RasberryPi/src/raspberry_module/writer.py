@@ -0,0 +1,223 @@
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+import logging
+
+from .metrics import DB_COMMIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_DB_COMMIT = DB_COMMIT_SECONDS.labels(database="raspi")
+
+WriteOp = Callable[[sqlite3.Connection], None]
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class WriterStats:
+    queue_depth: int
+    queue_capacity: int
+    enqueued: int
+    written: int
+    dropped: int
+    failed: int
+    commits: int
+    last_batch_size: int
+    last_commit_ms: float
+    avg_commit_ms: float
+    max_commit_ms: float
+
+
+class WriteBehindWriter:
+    """Single long-lived WAL connection drained by a background thread.
+
+    Callers enqueue write operations and return immediately; the writer
+    groups them into one transaction per batch, committing when the batch
+    reaches ``batch_size`` or ``flush_interval_sec`` has elapsed since the
+    first queued operation.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        batch_size: int = 200,
+        flush_interval_sec: float = 0.25,
+        queue_size: int = 10000,
+    ) -> None:
+        self._db_path = db_path
+        self._batch_size = max(1, batch_size)
+        self._flush_interval_sec = max(0.0, flush_interval_sec)
+        self._queue: "queue.Queue[Union[WriteOp, threading.Event, object]]" = queue.Queue(
+            maxsize=max(1, queue_size)
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._commits = 0
+        self._last_batch_size = 0
+        self._last_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+        self._max_commit_ms = 0.0
+        self._dropping = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def queue_capacity(self) -> int:
+        return self._queue.maxsize
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op: WriteOp) -> bool:
+        if not self.is_running:
+            # Nothing would ever drain the queue: after stop() or if the thread died.
+            with self._stats_lock:
+                self._dropped += 1
+            logger.error("Storage writer is not running; dropping write")
+            return False
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            with self._stats_lock:
+                self._dropped += 1
+                first_drop = not self._dropping
+                self._dropping = True
+            if first_drop:
+                logger.warning("Storage write queue full (%s); dropping writes", self._queue.maxsize)
+            return False
+
+        with self._stats_lock:
+            self._enqueued += 1
+            self._dropping = False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        if not self.is_running:
+            return self._queue.empty()
+        marker = threading.Event()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            # A full queue is the overload case; waiting for room counts against the timeout.
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        if not self.is_running:
+            return
+        self._queue.put(_STOP)
+        assert self._thread is not None
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Storage writer did not stop within %ss", timeout)
+        else:
+            self._thread = None
+
+    def stats(self) -> WriterStats:
+        with self._stats_lock:
+            avg = self._total_commit_ms / self._commits if self._commits else 0.0
+            return WriterStats(
+                queue_depth=self._queue.qsize(),
+                queue_capacity=self._queue.maxsize,
+                enqueued=self._enqueued,
+                written=self._written,
+                dropped=self._dropped,
+                failed=self._failed,
+                commits=self._commits,
+                last_batch_size=self._last_batch_size,
+                last_commit_ms=self._last_commit_ms,
+                avg_commit_ms=avg,
+                max_commit_ms=self._max_commit_ms,
+            )
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self._db_path, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            stopping = False
+            while not stopping:
+                batch: List[WriteOp] = []
+                markers: List[threading.Event] = []
+                stopping = self._classify(self._queue.get(), batch, markers)
+
+                deadline = time.monotonic() + self._flush_interval_sec
+                while not stopping and not markers and len(batch) < self._batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    stopping = self._classify(item, batch, markers)
+
+                if batch:
+                    self._commit(conn, batch)
+                for marker in markers:
+                    marker.set()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _classify(item: object, batch: List[WriteOp], markers: List[threading.Event]) -> bool:
+        if item is _STOP:
+            return True
+        if isinstance(item, threading.Event):
+            markers.append(item)
+        else:
+            batch.append(item)  # type: ignore[arg-type]
+        return False
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[WriteOp]) -> None:
+        started = time.perf_counter()
+        written = len(batch)
+        failed = 0
+        try:
+            with conn:
+                for op in batch:
+                    op(conn)
+        except Exception as exc:
+            logger.warning("Storage batch of %s failed (%s); retrying individually", len(batch), exc)
+            written = 0
+            for op in batch:
+                try:
+                    with conn:
+                        op(conn)
+                    written += 1
+                except Exception as op_exc:
+                    # Any failing op (including a bad bound parameter) is skipped, never the thread.
+                    failed += 1
+                    logger.error("Storage write failed: %s", op_exc)
+        elapsed = time.perf_counter() - started
+        _DB_COMMIT.observe(elapsed)
+        elapsed_ms = elapsed * 1000.0
+
+        with self._stats_lock:
+            self._written += written
+            self._failed += failed
+            self._commits += 1
+            self._last_batch_size = len(batch)
+            self._last_commit_ms = elapsed_ms
+            self._total_commit_ms += elapsed_ms
+            self._max_commit_ms = max(self._max_commit_ms, elapsed_ms)
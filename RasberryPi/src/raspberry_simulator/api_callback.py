@@ -33,14 +33,3 @@ async def send_results_to_api(api_url, line_id, voltage, speed, filtered_ct_seco
     finally:
         if should_close_session:
             await session.close()
-
-def send_results_to_api_sync_wrapper(api_url, line_id, voltage, speed, filtered_ct_seconds, timestamp, timeout_sec=5, max_retries=3):
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop.run_until_complete(send_results_to_api(api_url, line_id, voltage, speed, filtered_ct_seconds, timestamp, timeout_sec=timeout_sec, max_retries=max_retries))
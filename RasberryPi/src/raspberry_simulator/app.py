@@ -1,16 +1,23 @@
 """System B Simulator - FastAPI application for control simulation."""
+import asyncio
 import logging
+import time
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.responses import Response, StreamingResponse
+import aiohttp
+
+from raspberry_module.metrics import API_CALLBACKS, CONTENT_TYPE, MESSAGES_PROCESSED, MESSAGES_RECEIVED, MESSAGES_REJECTED, REGISTRY, STAGE_SECONDS
+from raspberry_module.stream import StateStream, serve_websocket, sse_response
 
 from .config import SystemBConfig
 from .database import Database
 from .control_simulator import SpeedControllerSimulator
 from .mqtt_handler import MqttSubscriptionHandler
-from .api_callback import send_results_to_api_sync_wrapper
-from .models import ManualCommandRequest, ControlResultResponse, StateResponse, HealthResponse
+from .api_callback import send_results_to_api
+from .models import ManualCommandRequest, ControlResultResponse, StateResponse, HealthResponse, HistoryResponse
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -18,68 +25,145 @@ logger = logging.getLogger(__name__)
 def create_app() -> FastAPI:
     config = SystemBConfig.load()
     database = Database(config.db_path)
-    controller = SpeedControllerSimulator(config, database)
+    state_stream = StateStream()
+
+    def publish_line(line):
+        chain = line.last_chain_state
+        state_stream.publish(line.line_id, {
+            "speed": line.last_valid_speed, "voltage": round(line.last_voltage, 4), "filtered_cycle_time": line.last_filtered_cycle_time,
+            "is_running": chain.is_running if chain else None, "encoder_delta": chain.encoder_delta if chain else None,
+            "updated_at": line.last_output_time.isoformat() if line.last_output_time else None,
+        })
+
+    controller = SpeedControllerSimulator(config, database, listener=publish_line)
+    retention = database.retention_worker(
+        max_age_days=config.retention_days, max_db_mb=config.retention_max_db_mb,
+        interval_sec=config.retention_interval_sec, batch_size=config.retention_batch_size,
+    )
     mqtt_handler = None
+    callback_session = None
+    callbacks = set()
+    
+    async def deliver(line_id, result):
+        started = time.perf_counter()
+        try:
+            delivered = await send_results_to_api(
+                api_url=config.api_callback_url, line_id=line_id, voltage=result["voltage"],
+                speed=result["speed_used"], filtered_ct_seconds=result["filtered_ct_seconds"],
+                timestamp=result["applied_at"], session=callback_session, timeout_sec=config.api_callback_timeout_sec,
+                max_retries=config.api_callback_max_retries,
+            )
+            API_CALLBACKS.labels("ok" if delivered else "failed").inc()
+        except Exception as exc:
+            API_CALLBACKS.labels("error").inc()
+            logger.error("API callback error: %s", exc)
+        STAGE_SECONDS.labels(stage="api_callback").observe(time.perf_counter() - started)
     
     def on_ct_received(line_id, ct_seconds, chain_state):
+        # Runs on the event loop; the API callback becomes its own task so slow or
+        # retried deliveries never hold up the next message.
         try:
             ct_minutes = ct_seconds / 60.0
-            result = controller.process_cycle_time(line_id=line_id, cycle_time_minutes=ct_minutes, chain_state=chain_state)
+            with STAGE_SECONDS.labels(stage="controller").time():
+                result = controller.process_cycle_time(line_id=line_id, cycle_time_minutes=ct_minutes, chain_state=chain_state)
+            MESSAGES_PROCESSED.labels("mqtt", line_id, result["status"]).inc()
             if config.api_callback_enabled:
-                try:
-                    send_results_to_api_sync_wrapper(
-                        api_url=config.api_callback_url, line_id=line_id, voltage=result["voltage"],
-                        speed=result["speed_used"], filtered_ct_seconds=result["filtered_ct_seconds"],
-                        timestamp=result["applied_at"], timeout_sec=config.api_callback_timeout_sec,
-                        max_retries=config.api_callback_max_retries,
-                    )
-                except Exception as exc:
-                    logger.error("API callback error: %s", exc)
+                task = asyncio.get_running_loop().create_task(deliver(line_id, result))
+                callbacks.add(task)
+                task.add_done_callback(callbacks.discard)
         except Exception as exc:
             logger.error("Error processing MQTT CT message: %s", exc)
     
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        nonlocal mqtt_handler
+        nonlocal mqtt_handler, callback_session
+        retention.start()
         if config.mqtt_enabled:
+            callback_session = aiohttp.ClientSession()
             mqtt_handler = MqttSubscriptionHandler(config, on_ct_received)
-            try:
-                mqtt_handler.start()
-                logger.info("MQTT handler initialized on startup")
-            except Exception as exc:
-                logger.error("Failed to initialize MQTT handler: %s", exc)
+            await mqtt_handler.start()
+            logger.info("MQTT handler initialized on startup")
         yield
         if mqtt_handler:
-            try:
-                mqtt_handler.stop()
-            except Exception as exc:
-                logger.error("Error stopping MQTT handler: %s", exc)
+            await mqtt_handler.stop()
+        if callbacks:
+            await asyncio.wait(list(callbacks), timeout=config.api_callback_timeout_sec)
+        for task in list(callbacks):
+            task.cancel()
+        if callback_session:
+            await callback_session.close()
+        retention.stop()
     
     app = FastAPI(title="System B - Raspberry Pi Control Simulator", version="1.0.0", description="Yazaki Commande Chaine - Control Simulator", lifespan=lifespan)
     app.state.config = config
     app.state.database = database
     app.state.controller = controller
+    app.state.state_stream = state_stream
+    
+    @app.get("/metrics")
+    async def metrics() -> Response:
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
     
     @app.get("/api/v1/health", response_model=HealthResponse)
     async def health() -> HealthResponse:
-        mqtt_connected = mqtt_handler.is_connected if mqtt_handler else False
-        return HealthResponse(status="ok", mqtt_connected=mqtt_connected, api_enabled=config.api_callback_enabled, timestamp=datetime.now(timezone.utc))
+        mqtt_status = mqtt_handler.status() if mqtt_handler else None
+        return HealthResponse(
+            status="ok", mqtt_connected=mqtt_status is not None and mqtt_status.state == "connected",
+            mqtt_state=mqtt_status.state if mqtt_status else "disabled", mqtt_transport=mqtt_status.transport if mqtt_status else None,
+            api_enabled=config.api_callback_enabled, timestamp=datetime.now(timezone.utc),
+        )
     
     @app.get("/api/v1/state", response_model=StateResponse)
-    async def state() -> StateResponse:
-        return StateResponse(last_valid_speed=controller.last_valid_speed, last_voltage=controller.last_voltage, last_filtered_cycle_time=controller.last_filtered_cycle_time, chain_state={}, timestamp=datetime.now(timezone.utc))
+    async def state(line_id: Optional[str] = None) -> StateResponse:
+        line = controller.get_line_state(line_id or controller.last_line_id) if (line_id or controller.last_line_id) else None
+        if line_id and line is None:
+            raise HTTPException(status_code=404, detail=f"unknown line: {line_id}")
+        chain = line.last_chain_state if line else None
+        chain_state = {"is_running": chain.is_running, "encoder_delta": chain.encoder_delta, "updated_at": chain.updated_at.isoformat()} if chain else {}
+        return StateResponse(
+            line_id=line.line_id if line else None, lines=controller.line_ids,
+            last_valid_speed=line.last_valid_speed if line else None, last_voltage=line.last_voltage if line else None,
+            last_filtered_cycle_time=line.last_filtered_cycle_time if line else None, chain_state=chain_state, timestamp=datetime.now(timezone.utc),
+        )
+    
+    @app.get("/api/v1/state/stream")
+    async def state_stream_sse(request: Request, line_id: Optional[List[str]] = Query(default=None), max_rate_hz: float = Query(default=10.0, gt=0, le=1000)) -> StreamingResponse:
+        return sse_response(state_stream, request, line_id, max_rate_hz)
+    
+    @app.websocket("/api/v1/state/stream")
+    async def state_stream_ws(websocket: WebSocket, line_id: Optional[List[str]] = Query(default=None), max_rate_hz: float = Query(default=10.0, gt=0, le=1000)) -> None:
+        await serve_websocket(state_stream, websocket, line_id, max_rate_hz)
     
     @app.post("/api/v1/command", response_model=ControlResultResponse)
     async def command(payload: ManualCommandRequest) -> ControlResultResponse:
+        MESSAGES_RECEIVED.labels("http", payload.line_id).inc()
         try:
-            ct_minutes = 60.0 if payload.speed <= 0 else config.ct_to_speed_factor / payload.speed
-            result = controller.process_cycle_time(line_id=payload.line_id, cycle_time_minutes=ct_minutes)
+            ct_minutes = 60.0 if payload.speed <= 0 else controller.cycle_time_for_speed(payload.line_id, payload.speed)
+            with STAGE_SECONDS.labels(stage="controller").time():
+                result = controller.process_cycle_time(line_id=payload.line_id, cycle_time_minutes=ct_minutes)
+            MESSAGES_PROCESSED.labels("http", payload.line_id, result["status"]).inc()
             return ControlResultResponse(status=result["status"], line_id=payload.line_id, speed_used=result["speed_used"], voltage=result["voltage"], filtered_ct_seconds=result["filtered_ct_seconds"], timestamp=result["applied_at"])
         except ValueError as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "invalid").inc()
             raise HTTPException(status_code=400, detail=str(exc)) from exc
         except Exception as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "error").inc()
             raise HTTPException(status_code=500, detail=str(exc)) from exc
     
+    @app.get("/api/v1/history", response_model=HistoryResponse)
+    async def history(
+        line_id: Optional[str] = None, status: Optional[str] = None,
+        start: Optional[datetime] = Query(default=None, alias="from"), end: Optional[datetime] = Query(default=None, alias="to"),
+        limit: int = Query(default=100, ge=1, le=1000), cursor: Optional[str] = None,
+    ) -> HistoryResponse:
+        start = start.replace(tzinfo=timezone.utc) if start is not None and start.tzinfo is None else start
+        end = end.replace(tzinfo=timezone.utc) if end is not None and end.tzinfo is None else end
+        try:
+            items, next_cursor = database.get_history(line_id=line_id, status=status, start=start, end=end, limit=limit, cursor=cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        return HistoryResponse(items=items, next_cursor=next_cursor)
+    
     @app.get("/api/v1/export")
     async def export(line_id: str = None) -> StreamingResponse:
         try:
@@ -1,6 +1,7 @@
 """Configuration loader for System B Simulator."""
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 import os
 
 def _get_float(name: str, default: float) -> float:
@@ -37,12 +38,22 @@ class SystemBConfig:
     ramp_rate_v_per_sec: float = 1.0
     max_timestamp_age_sec: int = 30
     ct_filter_window_samples: int = 5
+    ct_filter_type: str = "sma"
+    ct_filter_window_sec: float = 60.0
+    ct_filter_ema_alpha: float = 0.0
     ct_to_speed_factor: float = 1.0
     api_callback_url: str = "http://localhost:5000/api/simulation-results"
     api_callback_enabled: bool = True
     api_callback_timeout_sec: int = 5
     api_callback_max_retries: int = 3
+    retention_days: float = 0.0
+    retention_max_db_mb: float = 0.0
+    retention_interval_sec: int = 3600
+    retention_batch_size: int = 500
+    calibration_path: Optional[Path] = None
     debug: bool = False
+    mqtt_transport: str = "auto"
+    mqtt_dedup: bool = True
     
     @classmethod
     def load(cls) -> "SystemBConfig":
@@ -67,12 +78,23 @@ class SystemBConfig:
         ramp_rate_v_per_sec = _get_float("SYSTEM_B_RAMP_RATE_V_PER_SEC", 1.0)
         max_timestamp_age_sec = _get_int("SYSTEM_B_MAX_TIMESTAMP_AGE_SEC", 30)
         ct_filter_window_samples = max(1, _get_int("SYSTEM_B_CT_FILTER_WINDOW_SAMPLES", 5))
+        ct_filter_type = os.getenv("SYSTEM_B_CT_FILTER_TYPE", "sma").strip().lower()
+        ct_filter_window_sec = _get_float("SYSTEM_B_CT_FILTER_WINDOW_SEC", 60.0)
+        ct_filter_ema_alpha = _get_float("SYSTEM_B_CT_FILTER_EMA_ALPHA", 0.0)
         ct_to_speed_factor = _get_float("SYSTEM_B_CT_TO_SPEED_FACTOR", 1.0)
         api_callback_url = os.getenv("API_CALLBACK_URL", "http://localhost:5000/api/simulation-results")
         api_callback_enabled = _get_bool("API_CALLBACK_ENABLED", True)
         api_callback_timeout_sec = _get_int("API_CALLBACK_TIMEOUT_SEC", 5)
         api_callback_max_retries = _get_int("API_CALLBACK_MAX_RETRIES", 3)
+        retention_days = _get_float("SYSTEM_B_RETENTION_DAYS", 0.0)
+        retention_max_db_mb = _get_float("SYSTEM_B_RETENTION_MAX_DB_MB", 0.0)
+        retention_interval_sec = max(1, _get_int("SYSTEM_B_RETENTION_INTERVAL_SEC", 3600))
+        retention_batch_size = max(1, _get_int("SYSTEM_B_RETENTION_BATCH_SIZE", 500))
+        calibration_raw = os.getenv("SYSTEM_B_CALIBRATION_PATH", "").strip()
+        calibration_path = Path(calibration_raw) if calibration_raw else None
         debug = _get_bool("SYSTEM_B_DEBUG", False)
+        mqtt_transport = os.getenv("SYSTEM_B_MQTT_TRANSPORT", "auto").strip().lower() or "auto"
+        mqtt_dedup = _get_bool("SYSTEM_B_MQTT_DEDUP", True)
         
         return cls(
             base_dir=base_dir, data_dir=data_dir, db_path=db_path, log_path=log_path,
@@ -82,7 +104,12 @@ class SystemBConfig:
             speed_min=speed_min, speed_max=speed_max, default_speed=default_speed,
             voltage_min=voltage_min, voltage_max=voltage_max, ramp_rate_v_per_sec=ramp_rate_v_per_sec,
             max_timestamp_age_sec=max_timestamp_age_sec, ct_filter_window_samples=ct_filter_window_samples,
+            ct_filter_type=ct_filter_type, ct_filter_window_sec=ct_filter_window_sec, ct_filter_ema_alpha=ct_filter_ema_alpha,
             ct_to_speed_factor=ct_to_speed_factor, api_callback_url=api_callback_url,
             api_callback_enabled=api_callback_enabled, api_callback_timeout_sec=api_callback_timeout_sec,
-            api_callback_max_retries=api_callback_max_retries, debug=debug,
+            api_callback_max_retries=api_callback_max_retries,
+            retention_days=retention_days, retention_max_db_mb=retention_max_db_mb,
+            retention_interval_sec=retention_interval_sec, retention_batch_size=retention_batch_size,
+            calibration_path=calibration_path, debug=debug, mqtt_transport=mqtt_transport,
+            mqtt_dedup=mqtt_dedup,
         )
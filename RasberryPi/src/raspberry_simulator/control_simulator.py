@@ -1,10 +1,12 @@
 """Speed controller simulator for System B."""
 from dataclasses import dataclass
-from collections import deque
 from datetime import datetime, timezone
 from typing import Optional
 import logging
 
+from raspberry_module.calibration import CalibrationTable
+from raspberry_module.filters import create_filter
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -13,93 +15,130 @@ class ChainStateSnapshot:
     encoder_delta: Optional[float]
     updated_at: datetime
 
+class LineState:
+    __slots__ = ("line_id", "ct_filter", "last_valid_speed", "last_voltage", "last_output_time", "last_filtered_cycle_time", "last_chain_state")
+    
+    def __init__(self, line_id, ct_filter):
+        self.line_id = line_id
+        self.ct_filter = ct_filter
+        self.last_valid_speed = None
+        self.last_voltage = None
+        self.last_output_time = None
+        self.last_filtered_cycle_time = None
+        self.last_chain_state = None
+
 class SpeedControllerSimulator:
-    def __init__(self, config, database):
+    def __init__(self, config, database, listener=None):
         self._config = config
         self._database = database
-        self._last_valid_speed = None
-        self._last_voltage = None
-        self._last_output_time = None
-        self._ct_history = deque(maxlen=max(1, config.ct_filter_window_samples))
-        self._last_filtered_cycle_time = None
-        self._last_chain_state = None
+        self._listener = listener
+        self._lines = {}
+        self._last_line = None
+        self._calibration = CalibrationTable.load(config.calibration_path, config.speed_min, config.speed_max, config.voltage_min, config.voltage_max, pitch_distance=config.ct_to_speed_factor)
+    
+    @property
+    def calibration(self):
+        return self._calibration
+    
+    def set_calibration(self, calibration):
+        self._calibration = calibration
+    
+    @property
+    def line_ids(self):
+        return sorted(self._lines)
+    
+    @property
+    def last_line_id(self):
+        return self._last_line.line_id if self._last_line else None
     
     @property
     def last_valid_speed(self):
-        return self._last_valid_speed
+        return self._last_line.last_valid_speed if self._last_line else None
     
     @property
     def last_voltage(self):
-        return self._last_voltage
+        return self._last_line.last_voltage if self._last_line else None
     
     @property
     def last_filtered_cycle_time(self):
-        return self._last_filtered_cycle_time
+        return self._last_line.last_filtered_cycle_time if self._last_line else None
     
     @property
     def last_chain_state(self):
-        return self._last_chain_state
+        return self._last_line.last_chain_state if self._last_line else None
+    
+    def get_line_state(self, line_id):
+        return self._lines.get(line_id)
+    
+    def _line_state(self, line_id):
+        state = self._lines.get(line_id)
+        if state is None:
+            ct_filter = create_filter(self._config.ct_filter_type, window_samples=self._config.ct_filter_window_samples, window_sec=self._config.ct_filter_window_sec, ema_alpha=self._config.ct_filter_ema_alpha)
+            state = self._lines[line_id] = LineState(line_id, ct_filter)
+        return state
     
     def process_cycle_time(self, line_id, cycle_time_minutes, chain_state=None):
         if cycle_time_minutes <= 0:
             raise ValueError("cycle_time_minutes must be > 0")
+        line = self._line_state(line_id)
         if chain_state is not None:
-            self._update_chain_state(chain_state)
-        filtered_cycle_time = self._filter_cycle_time(cycle_time_minutes)
-        self._last_filtered_cycle_time = filtered_cycle_time
-        speed = self._cycle_time_to_speed(filtered_cycle_time)
+            self._update_chain_state(line, chain_state)
+        filtered_cycle_time = self._filter_cycle_time(line, cycle_time_minutes)
+        line.last_filtered_cycle_time = filtered_cycle_time
+        speed = self._cycle_time_to_speed(line_id, filtered_cycle_time)
         speed = max(self._config.speed_min, min(self._config.speed_max, speed))
-        self._last_valid_speed = speed
+        line.last_valid_speed = speed
         now = datetime.now(timezone.utc)
-        target_voltage = self._speed_to_voltage(speed)
-        applied_voltage = self._apply_ramp(target_voltage, now)
-        self._last_voltage = applied_voltage
-        self._last_output_time = now
+        target_voltage = self._speed_to_voltage(line_id, speed)
+        applied_voltage = self._apply_ramp(line, target_voltage, now)
+        line.last_voltage = applied_voltage
+        line.last_output_time = now
+        self._last_line = line
         try:
             self._database.save_control_log(line_id=line_id, ct_seconds=cycle_time_minutes * 60.0, filtered_ct_seconds=filtered_cycle_time * 60.0, voltage=applied_voltage, speed=speed, timestamp=now)
         except Exception as exc:
             logger.warning("Failed to log control result: %s", exc)
+        if self._listener is not None:
+            try:
+                self._listener(line)
+            except Exception as exc:
+                logger.warning("Controller listener failed for line %s: %s", line_id, exc)
         logger.info("Processed CT - line=%s speed=%.1f voltage=%.2f", line_id, speed, applied_voltage)
         return {"status": "valid", "speed_used": speed, "voltage": applied_voltage, "filtered_ct_seconds": filtered_cycle_time * 60.0, "reason": "ok", "applied_at": now}
     
-    def _filter_cycle_time(self, cycle_time_minutes):
-        self._ct_history.append(cycle_time_minutes)
-        if not self._ct_history:
-            return cycle_time_minutes
-        return sum(self._ct_history) / len(self._ct_history)
+    def _filter_cycle_time(self, line, cycle_time_minutes):
+        return line.ct_filter.update(cycle_time_minutes)
     
-    def _update_chain_state(self, chain_state):
+    def _update_chain_state(self, line, chain_state):
         is_running = bool(chain_state.get("is_running")) if chain_state.get("is_running") is not None else None
         encoder_delta = float(chain_state.get("encoder_delta")) if chain_state.get("encoder_delta") is not None else None
-        self._last_chain_state = ChainStateSnapshot(is_running=is_running, encoder_delta=encoder_delta, updated_at=datetime.now(timezone.utc))
+        line.last_chain_state = ChainStateSnapshot(is_running=is_running, encoder_delta=encoder_delta, updated_at=datetime.now(timezone.utc))
     
-    def _cycle_time_to_speed(self, cycle_time_minutes):
+    def cycle_time_for_speed(self, line_id, speed):
+        return self._calibration.for_line(line_id).cycle_time(speed)
+    
+    def _cycle_time_to_speed(self, line_id, cycle_time_minutes):
         if cycle_time_minutes <= 0:
             return self._config.default_speed
-        return self._config.ct_to_speed_factor / cycle_time_minutes
-    
-    def _speed_to_voltage(self, speed):
-        span = self._config.speed_max - self._config.speed_min
-        if span <= 0:
-            return self._config.voltage_min
-        ratio = (speed - self._config.speed_min) / span
-        ratio = max(0.0, min(1.0, ratio))
-        return self._config.voltage_min + ratio * (self._config.voltage_max - self._config.voltage_min)
-    
-    def _apply_ramp(self, target_voltage, now):
-        if self._last_voltage is None or self._last_output_time is None:
-            self._last_voltage = target_voltage
-            self._last_output_time = now
+        return self._calibration.for_line(line_id).speed(cycle_time_minutes)
+    
+    def _speed_to_voltage(self, line_id, speed):
+        return self._calibration.for_line(line_id).voltage(speed)
+    
+    def _apply_ramp(self, line, target_voltage, now):
+        if line.last_voltage is None or line.last_output_time is None:
+            line.last_voltage = target_voltage
+            line.last_output_time = now
             return target_voltage
-        dt = (now - self._last_output_time).total_seconds()
+        dt = (now - line.last_output_time).total_seconds()
         if dt <= 0:
-            self._last_voltage = target_voltage
-            self._last_output_time = now
+            line.last_voltage = target_voltage
+            line.last_output_time = now
             return target_voltage
         max_step = max(0.0, self._config.ramp_rate_v_per_sec) * dt
-        delta = target_voltage - self._last_voltage
+        delta = target_voltage - line.last_voltage
         if abs(delta) > max_step:
             delta = max_step if delta > 0 else -max_step
-        self._last_voltage = self._last_voltage + delta
-        self._last_output_time = now
-        return self._last_voltage
+        line.last_voltage = line.last_voltage + delta
+        line.last_output_time = now
+        return line.last_voltage
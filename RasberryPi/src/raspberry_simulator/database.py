@@ -1,12 +1,30 @@
 """SQLite database persistence for System B."""
+import base64
 import json
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 import logging
 
+from raspberry_module.metrics import DB_COMMIT_SECONDS
+from raspberry_module.retention import RetentionPolicy, RetentionWorker
+
 logger = logging.getLogger(__name__)
 
+_DB_COMMIT = DB_COMMIT_SECONDS.labels(database="system_b")
+
+HISTORY_MAX_LIMIT = 1000
+
+def _encode_cursor(timestamp, row_id):
+    return base64.urlsafe_b64encode(json.dumps([timestamp, row_id], separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(timestamp), int(row_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("invalid cursor") from exc
+
 class Database:
     def __init__(self, db_path: Path):
         self._db_path = db_path
@@ -17,6 +35,7 @@ class Database:
     
     def _init_db(self):
         with self._connect() as conn:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
             conn.execute("""CREATE TABLE IF NOT EXISTS control_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, line_id TEXT NOT NULL, ct_seconds REAL NOT NULL,
                 filtered_ct_seconds REAL NOT NULL, voltage REAL NOT NULL, speed REAL NOT NULL,
@@ -27,20 +46,37 @@ class Database:
             conn.execute("""CREATE TABLE IF NOT EXISTS api_callbacks (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, line_id TEXT NOT NULL, api_url TEXT NOT NULL,
                 status TEXT NOT NULL, http_status INTEGER, error_message TEXT, timestamp TEXT NOT NULL)""")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(control_logs)")}
+            if "status" not in columns:
+                conn.execute("ALTER TABLE control_logs ADD COLUMN status TEXT NOT NULL DEFAULT 'valid'")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_control_logs_timestamp ON control_logs (timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_control_logs_line_time ON control_logs (line_id, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_control_logs_line_status_time ON control_logs (line_id, status, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_control_logs_status_time ON control_logs (status, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mqtt_messages_received_at ON mqtt_messages (received_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_api_callbacks_timestamp ON api_callbacks (timestamp)")
             conn.commit()
             logger.info("Database initialized: %s", self._db_path)
     
-    def save_control_log(self, line_id, ct_seconds, filtered_ct_seconds, voltage, speed, timestamp):
-        with self._connect() as conn:
+    def retention_worker(self, max_age_days=0.0, max_db_mb=0.0, interval_sec=3600, batch_size=500):
+        policies = [
+            RetentionPolicy("control_logs", "timestamp", max_age_days),
+            RetentionPolicy("mqtt_messages", "received_at", max_age_days),
+            RetentionPolicy("api_callbacks", "timestamp", max_age_days, naive_local_time=True),
+        ]
+        return RetentionWorker(self._db_path, policies, max_db_bytes=int(max_db_mb * 1024 * 1024), interval_sec=interval_sec, batch_size=batch_size)
+    
+    def save_control_log(self, line_id, ct_seconds, filtered_ct_seconds, voltage, speed, timestamp, status="valid"):
+        with _DB_COMMIT.time(), self._connect() as conn:
             cursor = conn.execute(
-                "INSERT INTO control_logs (line_id, ct_seconds, filtered_ct_seconds, voltage, speed, timestamp, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (line_id, ct_seconds, filtered_ct_seconds, voltage, speed, timestamp.isoformat(), datetime.now().isoformat()),
+                "INSERT INTO control_logs (line_id, ct_seconds, filtered_ct_seconds, voltage, speed, timestamp, created_at, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (line_id, ct_seconds, filtered_ct_seconds, voltage, speed, timestamp.isoformat(), datetime.now().isoformat(), status),
             )
             conn.commit()
             return cursor.lastrowid
     
     def save_mqtt_message(self, line_id, topic, payload, received_at):
-        with self._connect() as conn:
+        with _DB_COMMIT.time(), self._connect() as conn:
             cursor = conn.execute(
                 "INSERT INTO mqtt_messages (line_id, topic, payload, received_at) VALUES (?, ?, ?, ?)",
                 (line_id, topic, json.dumps(payload, separators=(",", ":")), received_at.isoformat()),
@@ -49,7 +85,7 @@ class Database:
             return cursor.lastrowid
     
     def save_api_callback_log(self, line_id, api_url, status, http_status=None, error_message=None):
-        with self._connect() as conn:
+        with _DB_COMMIT.time(), self._connect() as conn:
             cursor = conn.execute(
                 "INSERT INTO api_callbacks (line_id, api_url, status, http_status, error_message, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
                 (line_id, api_url, status, http_status, error_message, datetime.now().isoformat()),
@@ -71,6 +107,35 @@ class Database:
                 )
             return [{"id": row[0], "line_id": row[1], "ct_seconds": row[2], "filtered_ct_seconds": row[3], "voltage": row[4], "speed": row[5], "timestamp": row[6]} for row in cursor.fetchall()]
     
+    def get_history(self, line_id=None, status=None, start=None, end=None, limit=100, cursor=None):
+        """Newest-first page of control logs using a (timestamp, id) keyset cursor."""
+        limit = max(1, min(HISTORY_MAX_LIMIT, limit))
+        clauses, params = [], []
+        if line_id:
+            clauses.append("line_id = ?")
+            params.append(line_id)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start.astimezone(timezone.utc).isoformat())
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end.astimezone(timezone.utc).isoformat())
+        if cursor:
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend(_decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, line_id, ct_seconds, filtered_ct_seconds, voltage, speed, timestamp, status FROM control_logs {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+        items = [{"id": row[0], "line_id": row[1], "ct_seconds": row[2], "filtered_ct_seconds": row[3], "voltage": row[4], "speed": row[5], "timestamp": row[6], "status": row[7]} for row in rows[:limit]]
+        next_cursor = _encode_cursor(items[-1]["timestamp"], items[-1]["id"]) if len(rows) > limit else None
+        return items, next_cursor
+    
     def export_csv(self, line_id=None):
         logs = self.get_control_logs(line_id=line_id, limit=1000)
         if not logs:
@@ -1,6 +1,6 @@
 """Pydantic models for System B API."""
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 class ManualCommandRequest(BaseModel):
@@ -17,6 +17,8 @@ class ControlResultResponse(BaseModel):
     timestamp: datetime
 
 class StateResponse(BaseModel):
+    line_id: Optional[str] = None
+    lines: List[str] = []
     last_valid_speed: Optional[float] = None
     last_voltage: Optional[float] = None
     last_filtered_cycle_time: Optional[float] = None
@@ -26,5 +28,21 @@ class StateResponse(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     mqtt_connected: bool
+    mqtt_state: str = "disabled"
+    mqtt_transport: Optional[str] = None
     api_enabled: bool
     timestamp: datetime
+
+class ControlLogItem(BaseModel):
+    id: int
+    line_id: str
+    ct_seconds: float
+    filtered_ct_seconds: float
+    voltage: float
+    speed: float
+    timestamp: str
+    status: str
+
+class HistoryResponse(BaseModel):
+    items: List[ControlLogItem]
+    next_cursor: Optional[str] = None
@@ -2,8 +2,11 @@
 import logging
 from datetime import datetime, timezone
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
 from contextlib import asynccontextmanager
 
+from raspberry_module.metrics import CONTENT_TYPE, MESSAGES_PROCESSED, MESSAGES_RECEIVED, MESSAGES_REJECTED, REGISTRY, STAGE_SECONDS
+
 from .config import SystemAConfig
 from .heijunka import calculate_ct, ct_to_seconds
 from .mqtt_publisher import CtPublisher
@@ -47,6 +50,10 @@ def create_app() -> FastAPI:
     app.state.config = config
     app.state.publisher = publisher
     
+    @app.get("/metrics")
+    async def metrics() -> Response:
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+    
     @app.get("/api/v1/health", response_model=HealthResponse)
     async def health() -> HealthResponse:
         mqtt_connected = publisher.is_connected if publisher else False
@@ -58,47 +65,63 @@ def create_app() -> FastAPI:
     
     @app.post("/api/v1/batch-input", response_model=CtPublishResponse)
     async def batch_input(payload: BatchInputRequest) -> CtPublishResponse:
+        MESSAGES_RECEIVED.labels("http", payload.line_id).inc()
         try:
-            ct_minutes = calculate_ct(
-                production_times=payload.production_times,
-                worker_count=payload.worker_count,
-                productivity_factor=payload.productivity_factor,
-            )
+            with STAGE_SECONDS.labels(stage="ct_calculation").time():
+                ct_minutes = calculate_ct(
+                    production_times=payload.production_times,
+                    worker_count=payload.worker_count,
+                    productivity_factor=payload.productivity_factor,
+                )
             ct_seconds = ct_to_seconds(ct_minutes)
             logger.info("Calculated CT - line=%s ct_seconds=%.2f", payload.line_id, ct_seconds)
             
             if publisher:
                 success = publisher.publish_ct(line_id=payload.line_id, ct_seconds=ct_seconds)
                 if not success:
+                    MESSAGES_REJECTED.labels("http", payload.line_id, "publish_failed").inc()
                     raise HTTPException(status_code=503, detail="Failed to publish to MQTT broker")
             
+            MESSAGES_PROCESSED.labels("http", payload.line_id, "published").inc()
             return CtPublishResponse(
                 status="published", line_id=payload.line_id, calculated_ct_seconds=ct_seconds,
                 calculated_ct_minutes=ct_minutes, timestamp=datetime.now(timezone.utc),
                 reason="CT calculated and published successfully",
             )
+        except HTTPException:
+            raise
         except ValueError as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "invalid").inc()
             raise HTTPException(status_code=400, detail=str(exc)) from exc
         except Exception as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "error").inc()
             raise HTTPException(status_code=500, detail=str(exc)) from exc
     
     @app.post("/api/v1/manual-ct", response_model=CtPublishResponse)
     async def manual_ct(payload: ManualCtRequest) -> CtPublishResponse:
+        MESSAGES_RECEIVED.labels("http", payload.line_id).inc()
         try:
             if not publisher:
+                MESSAGES_REJECTED.labels("http", payload.line_id, "mqtt_disabled").inc()
                 raise HTTPException(status_code=503, detail="MQTT is disabled")
             success = publisher.publish_ct(line_id=payload.line_id, ct_seconds=payload.calculated_ct_seconds)
             if not success:
+                MESSAGES_REJECTED.labels("http", payload.line_id, "publish_failed").inc()
                 raise HTTPException(status_code=503, detail="Failed to publish to MQTT broker")
+            MESSAGES_PROCESSED.labels("http", payload.line_id, "published").inc()
             logger.info("Published manual CT - line=%s ct_seconds=%.2f", payload.line_id, payload.calculated_ct_seconds)
             return CtPublishResponse(
                 status="published", line_id=payload.line_id, calculated_ct_seconds=payload.calculated_ct_seconds,
                 calculated_ct_minutes=payload.calculated_ct_seconds / 60.0, timestamp=datetime.now(timezone.utc),
                 reason="Manual CT published successfully",
             )
+        except HTTPException:
+            raise
         except ValueError as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "invalid").inc()
             raise HTTPException(status_code=400, detail=str(exc)) from exc
         except Exception as exc:
+            MESSAGES_REJECTED.labels("http", payload.line_id, "error").inc()
             raise HTTPException(status_code=500, detail=str(exc)) from exc
     
     return app
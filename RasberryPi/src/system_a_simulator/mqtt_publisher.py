@@ -5,6 +5,8 @@ from datetime import datetime, timezone
 from typing import Optional, Any
 from paho.mqtt import client as mqtt_client
 
+from raspberry_module.metrics import MQTT_PUBLISH, STAGE_SECONDS
+
 logger = logging.getLogger(__name__)
 
 class CtPublisher:
@@ -19,6 +21,8 @@ class CtPublisher:
         self._client.on_connect = self._on_connect
         self._client.on_disconnect = self._on_disconnect
         self._is_connected = False
+        # Per-line sequence numbers let subscribers drop QoS 1 redeliveries and late messages.
+        self._sequence = {}
         
     def connect(self):
         try:
@@ -58,12 +62,16 @@ class CtPublisher:
         if ct_seconds <= 0:
             raise ValueError("ct_seconds must be positive")
         if not self._is_connected:
+            MQTT_PUBLISH.labels("ct", "disconnected").inc()
             logger.warning("MQTT publisher not connected, cannot publish")
             return False
         
         topic = f"yazaki/line/{line_id}/ct"
+        seq = self._sequence.get(line_id, 0) + 1
+        self._sequence[line_id] = seq
         payload = {
             "line_id": line_id,
+            "seq": seq,
             "calculated_ct_seconds": ct_seconds,
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "chain_state": chain_state or {},
@@ -71,14 +79,18 @@ class CtPublisher:
         }
         
         try:
-            info = self._client.publish(topic, json.dumps(payload, separators=(",", ":")), qos=1)
+            with STAGE_SECONDS.labels(stage="mqtt_publish").time():
+                info = self._client.publish(topic, json.dumps(payload, separators=(",", ":")), qos=1)
             if info.rc == mqtt_client.MQTT_ERR_SUCCESS:
+                MQTT_PUBLISH.labels("ct", "ok").inc()
                 logger.debug("Published CT to MQTT - line=%s ct_seconds=%.2f", line_id, ct_seconds)
                 return True
             else:
+                MQTT_PUBLISH.labels("ct", "error").inc()
                 logger.error("MQTT publish failed with return code: %s", info.rc)
                 return False
         except Exception as exc:
+            MQTT_PUBLISH.labels("ct", "error").inc()
             logger.error("Exception publishing to MQTT: %s", exc)
             return False
     
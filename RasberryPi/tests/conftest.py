@@ -0,0 +1,36 @@
+import pytest
+
+from raspberry_module.broker import running_broker
+from raspberry_module.config import AppConfig
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    """Build an AppConfig that keeps its files under ``tmp_path``; keyword arguments override fields."""
+    base = AppConfig.load()
+
+    def make(**overrides):
+        fields = dict(
+            base_dir=base.base_dir,
+            data_dir=tmp_path,
+            db_path=tmp_path / "test.db",
+            log_path=tmp_path / "test.log",
+            speed_min=0.0,
+            speed_max=100.0,
+            default_speed=50.0,
+            voltage_min=0.0,
+            voltage_max=10.0,
+            ramp_rate_v_per_sec=10.0,
+            max_timestamp_age_sec=60,
+        )
+        fields.update(overrides)
+        return AppConfig(**fields)
+
+    return make
+
+
+@pytest.fixture
+def mqtt_broker():
+    """An embedded MQTT broker on a free local port; read it from ``mqtt_broker.port``."""
+    with running_broker() as broker:
+        yield broker
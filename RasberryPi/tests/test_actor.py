@@ -0,0 +1,65 @@
+import dataclasses
+import threading
+
+import pytest
+
+from raspberry_module.actor import ControllerActor, ControllerBusyError
+from raspberry_module.control import SpeedController
+from raspberry_module.storage import Storage
+
+
+def _controller(make_config):
+    config = make_config()
+    return SpeedController(config, Storage(config.db_path))
+
+
+def test_actor_serializes_concurrent_updates(make_config):
+    controller = _controller(make_config)
+    actor = ControllerActor(controller)
+    actor.start()
+
+    def feed(line_id):
+        futures = [actor.process_cycle_time(line_id, 1.0 + i * 0.01) for i in range(50)]
+        for future in futures:
+            future.result(timeout=10)
+
+    threads = [threading.Thread(target=feed, args=(f"L{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    actor.stop()
+
+    snapshot = actor.snapshot
+    assert snapshot.version == 200
+    assert sorted(snapshot.lines) == ["L0", "L1", "L2", "L3"]
+    for line_id, line in snapshot.lines.items():
+        assert line.last_valid_speed == controller.get_line_state(line_id).last_valid_speed
+
+
+def test_snapshot_is_immutable_and_replaced(make_config):
+    controller = _controller(make_config)
+    actor = ControllerActor(controller)
+    actor.start()
+
+    actor.process_cycle_time("L1", 1.0).result(timeout=5)
+    before = actor.snapshot
+    actor.process_cycle_time("L2", 2.0).result(timeout=5)
+    actor.stop()
+
+    assert list(before.lines) == ["L1"]
+    assert actor.snapshot.last_line_id == "L2"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        before.lines["L1"].target_voltage = 0.0
+    with pytest.raises(TypeError):
+        before.lines["L3"] = before.lines["L1"]
+
+
+def test_submit_after_stop_fails_instead_of_hanging(make_config):
+    actor = ControllerActor(_controller(make_config))
+    actor.start()
+    actor.process_cycle_time("L1", 1.0).result(timeout=5)
+    actor.stop()
+
+    with pytest.raises(ControllerBusyError):
+        actor.process_cycle_time("L1", 2.0)
@@ -0,0 +1,45 @@
+import threading
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from raspberry_module.api import create_app
+
+
+def _command(speed):
+    return {
+        "line_id": "L1",
+        "speed": speed,
+        "mode": "auto",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def test_command_is_shed_with_retry_after_above_high_watermark(tmp_path, monkeypatch):
+    monkeypatch.setenv("RASPI_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("RASPI_LOG_PATH", str(tmp_path / "test.log"))
+    monkeypatch.setenv("RASPI_CONTROL_QUEUE_SIZE", "4")
+    monkeypatch.setenv("RASPI_COMMAND_HIGH_WATERMARK", "0.5")
+    monkeypatch.setenv("RASPI_COMMAND_RETRY_AFTER_SEC", "3")
+
+    with TestClient(create_app()) as client:
+        assert client.post("/api/v1/command", json=_command(40.0)).status_code == 200
+
+        actor = client.app.state.actor
+        release = threading.Event()
+        blocked = [actor.submit(release.wait)]
+        blocked += [actor.submit(lambda: None) for _ in range(2)]
+        try:
+            response = client.post("/api/v1/command", json=_command(50.0))
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "3"
+            assert client.post("/api/v1/commands:batch", json=[_command(50.0)]).status_code == 503
+            assert client.get("/api/v1/health").status_code == 200
+        finally:
+            release.set()
+            for future in blocked:
+                future.result(timeout=5)
+
+        response = client.post("/api/v1/command", json=_command(50.0))
+        assert response.status_code == 200
+        assert response.json()["speed_used"] == 50.0
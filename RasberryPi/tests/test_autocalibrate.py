@@ -0,0 +1,79 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from raspberry_module.autocalibrate import build_calibration, fit_voltage_curves, main
+from raspberry_module.calibration import CalibrationTable
+from raspberry_module.storage import Storage
+
+
+def _log_line(storage, line_id, volts_per_speed, offset, count=200, seed=1, interleave=False):
+    rng = random.Random(seed)
+    previous = None
+    at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for _ in range(count):
+        elapsed = round(rng.uniform(0.5, 5.0), 3)
+        at += timedelta(seconds=elapsed)
+        voltage = rng.uniform(2.0, 9.0)
+        # Every CT row carries a delta; the first one only anchors the next interval.
+        delta = 0.0
+        if previous is not None:
+            # The chain moved under the applied voltage ramping from the previous row to this one.
+            speed = ((previous + voltage) / 2.0 - offset) / volts_per_speed
+            delta = speed * elapsed / 10.0
+            if interleave:
+                # An HTTP command half way through the interval, at the voltage the ramp had reached.
+                middle = at - timedelta(seconds=elapsed / 2)
+                storage.log_output(middle, 0.0, (previous + voltage) / 2.0, "ok", line_id=line_id)
+        storage.log_output(at, 0.0, voltage, "ok", line_id=line_id, encoder_delta=delta)
+        previous = voltage
+
+
+def test_fit_recovers_voltage_curve_per_line(tmp_path):
+    storage = Storage(tmp_path / "test.db")
+    _log_line(storage, "L1", volts_per_speed=0.125, offset=0.5)
+    _log_line(storage, "L2", volts_per_speed=0.2, offset=0.0, seed=2)
+    storage.log_output(datetime.now(timezone.utc), 0.0, 5.0, "ok", line_id="L3", encoder_delta=4.0)
+
+    fits = fit_voltage_curves(tmp_path / "test.db", encoder_scale=10.0, min_samples=20)
+
+    assert sorted(fits) == ["L1", "L2"]
+    # julianday() resolves the intervals to tens of microseconds.
+    assert fits["L1"].slope == pytest.approx(0.125, rel=1e-4)
+    assert fits["L1"].intercept == pytest.approx(0.5, abs=1e-3)
+    assert fits["L1"].r2 == pytest.approx(1.0)
+    assert fits["L2"].samples == 199
+
+    data = build_calibration(fits, 20.0, 80.0, base={"lines": {"L1": {"belt_factor": 2.0, "pitch_distance": 3.0}}})
+    assert data["lines"]["L1"]["pitch_distance"] == 3.0
+    assert "belt_factor" not in data["lines"]["L1"]
+    (low, low_voltage), (high, high_voltage) = data["lines"]["L1"]["speed_to_voltage"]
+    assert (low, high) == (20.0, 80.0)
+    assert low_voltage == pytest.approx(3.0, abs=1e-2)
+    assert high_voltage == pytest.approx(10.5, abs=1e-2)
+    table = CalibrationTable.from_dict(data, 20.0, 80.0, 0.0, 10.0)
+    assert table.for_line("L2").voltage(40.0) == pytest.approx(8.0, abs=1e-2)
+
+
+def test_cli_writes_loadable_calibration(tmp_path, capsys):
+    storage = Storage(tmp_path / "test.db")
+    _log_line(storage, "L1", volts_per_speed=0.125, offset=0.5)
+
+    out = tmp_path / "calibration.json"
+    assert main(["--db", str(tmp_path / "test.db"), "--out", str(out), "--encoder-scale", "10"]) == 0
+
+    assert "L1" in json.loads(out.read_text())["lines"]
+    assert "Wrote" in capsys.readouterr().out
+
+
+def test_fit_ignores_command_rows_between_encoder_samples(tmp_path):
+    storage = Storage(tmp_path / "test.db")
+    _log_line(storage, "L1", volts_per_speed=0.125, offset=0.5, interleave=True)
+
+    fits = fit_voltage_curves(tmp_path / "test.db", encoder_scale=10.0, min_samples=20)
+
+    assert fits["L1"].samples == 199
+    assert fits["L1"].slope == pytest.approx(0.125, rel=1e-4)
+    assert fits["L1"].intercept == pytest.approx(0.5, abs=1e-3)
@@ -0,0 +1,61 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from raspberry_module.api import create_app
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setenv("RASPI_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("RASPI_LOG_PATH", str(tmp_path / "test.log"))
+    monkeypatch.setenv("RASPI_SPEED_MIN", "0")
+    monkeypatch.setenv("RASPI_SPEED_MAX", "100")
+    return TestClient(create_app())
+
+
+def _command(speed, line_id="L1"):
+    return {
+        "line_id": line_id,
+        "speed": speed,
+        "mode": "replay",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def test_batch_accepts_json_array_in_order(tmp_path, monkeypatch):
+    with _client(tmp_path, monkeypatch) as client:
+        commands = [_command(float(i % 100)) for i in range(500)]
+        commands[3] = {"line_id": "L1", "speed": "fast"}
+        response = client.post("/api/v1/commands:batch", json=commands)
+
+        body = response.json()
+        assert response.status_code == 200
+        assert body["accepted"] == 499
+        assert body["rejected"] == 1
+        assert [item["index"] for item in body["results"]] == list(range(500))
+        assert body["results"][3]["status"] == "rejected"
+        assert body["results"][10]["voltage"] == 1.0
+        assert client.get("/api/v1/state").json()["last_valid_speed"] == 99.0
+
+    with sqlite3.connect(tmp_path / "test.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM command_log").fetchone()[0] == 499
+        assert conn.execute("SELECT COUNT(*) FROM output_log").fetchone()[0] == 499
+
+
+def test_batch_accepts_ndjson_and_limits_size(tmp_path, monkeypatch):
+    monkeypatch.setenv("RASPI_COMMAND_BATCH_MAX_ITEMS", "3")
+    with _client(tmp_path, monkeypatch) as client:
+        lines = "\n".join(json.dumps(_command(speed, "L2")) for speed in (10.0, 20.0)) + "\n"
+        response = client.post(
+            "/api/v1/commands:batch",
+            content=lines,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        assert [item["speed_used"] for item in response.json()["results"]] == [10.0, 20.0]
+
+        too_many = [_command(1.0)] * 4
+        assert client.post("/api/v1/commands:batch", json=too_many).status_code == 413
+        assert client.post("/api/v1/commands:batch", content=b"{not json").status_code == 400
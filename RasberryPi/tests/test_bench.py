@@ -0,0 +1,16 @@
+from raspberry_module.bench import compare, run
+
+
+def test_bench_reports_each_hot_path(tmp_path, make_config):
+    config = make_config(speed_min=20.0, speed_max=80.0, ramp_rate_v_per_sec=1.0)
+
+    report = run(config, backends=("disk", "null"), iterations=20, warmup=2)
+
+    names = {(item["name"], item["backend"]) for item in report["results"]}
+    assert ("_filter_cycle_time[median]", "none") in names
+    for backend in ("disk", "null"):
+        for name in ("process_command", "process_cycle_time", "storage.log_command", "storage.log_output"):
+            assert (name, backend) in names
+    assert all(item["p50_us"] <= item["p99_us"] <= item["max_us"] for item in report["results"])
+    assert list(tmp_path.iterdir()) == []
+    assert "process_command (null)" in compare(report, report)
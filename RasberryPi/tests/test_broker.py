@@ -0,0 +1,135 @@
+import json
+import queue
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from paho.mqtt import client as mqtt_client
+
+from raspberry_module.api import create_app
+from raspberry_module.broker import topic_matches, valid_filter
+from raspberry_simulator.app import create_app as create_system_b
+from system_a_simulator.app import create_app as create_system_a
+
+
+def _client(broker, *topics, client_id=""):
+    received = queue.Queue()
+    client = mqtt_client.Client(client_id=client_id)
+    client.on_message = lambda client, userdata, msg: received.put((msg.topic, msg.payload, msg.qos, msg.retain))
+    client.connect("127.0.0.1", broker.port, 30)
+    for topic in topics:
+        client.subscribe(topic, qos=1)
+    client.loop_start()
+    return client, received
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.mark.parametrize(
+    "topic_filter, topic, expected",
+    [
+        ("yazaki/line/+/ct", "yazaki/line/L1/ct", True),
+        ("yazaki/line/+/ct", "yazaki/line/L1/speed", False),
+        ("yazaki/#", "yazaki/line/L1/ct", True),
+        ("yazaki/#", "yazaki", True),
+        ("+/line/L1/ct", "yazaki/line/L1/ct", True),
+        ("#", "$SYS/uptime", False),
+        ("yazaki/line/L1", "yazaki/line/L1/ct", False),
+    ],
+)
+def test_topic_matching(topic_filter, topic, expected):
+    assert topic_matches(topic_filter, topic) is expected
+
+
+def test_invalid_filters_are_rejected():
+    assert not valid_filter("yazaki/#/ct")
+    assert not valid_filter("yazaki/line+")
+    assert valid_filter("yazaki/+/#")
+
+
+def test_wildcard_subscribers_receive_qos1_and_retained_messages(mqtt_broker):
+    publisher, _ = _client(mqtt_broker)
+    try:
+        publisher.publish("yazaki/line/L1/config", b"retained", qos=1, retain=True).wait_for_publish(5)
+        subscriber, received = _client(mqtt_broker, "yazaki/line/+/ct", "yazaki/line/L1/#")
+        try:
+            assert received.get(timeout=5) == ("yazaki/line/L1/config", b"retained", 1, True)
+            assert _wait(lambda: mqtt_broker.stats().subscriptions == 2)
+
+            publisher.publish("yazaki/line/L1/ct", b"one", qos=1)
+            publisher.publish("yazaki/line/L2/ct", b"two", qos=0)
+            publisher.publish("yazaki/line/L2/speed", b"ignored", qos=0)
+            # Matching two filters still delivers once, at the highest granted QoS.
+            assert received.get(timeout=5) == ("yazaki/line/L1/ct", b"one", 1, False)
+            assert received.get(timeout=5) == ("yazaki/line/L2/ct", b"two", 0, False)
+            with pytest.raises(queue.Empty):
+                received.get(timeout=0.2)
+        finally:
+            subscriber.disconnect()
+            subscriber.loop_stop()
+    finally:
+        publisher.disconnect()
+        publisher.loop_stop()
+
+
+def test_will_is_published_when_a_client_drops(mqtt_broker):
+    watcher, received = _client(mqtt_broker, "status/#")
+    dying = mqtt_client.Client(client_id="dying")
+    dying.will_set("status/dying", b"offline")
+    dying.connect("127.0.0.1", mqtt_broker.port, 30)
+    try:
+        assert _wait(lambda: mqtt_broker.stats().clients == 2)
+        dying.socket().close()
+        assert received.get(timeout=5)[:2] == ("status/dying", b"offline")
+    finally:
+        watcher.disconnect()
+        watcher.loop_stop()
+
+
+def test_service_applies_ct_and_publishes_speed_response(mqtt_broker, tmp_path, monkeypatch):
+    monkeypatch.setenv("RASPI_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("RASPI_LOG_PATH", str(tmp_path / "test.log"))
+    monkeypatch.setenv("RASPI_MQTT_HOST", "127.0.0.1")
+    monkeypatch.setenv("RASPI_MQTT_PORT", str(mqtt_broker.port))
+
+    client, received = _client(mqtt_broker, "yazaki/line/+/speed")
+    try:
+        with TestClient(create_app()) as api:
+            assert _wait(lambda: api.get("/api/v1/health").json()["mqtt"]["state"] == "connected")
+            payload = {"line_id": "L7", "calculated_ct_seconds": 90.0, "chain_state": {}, "jigs": []}
+            client.publish("yazaki/line/L7/ct", json.dumps(payload), qos=1)
+
+            topic, body, _, _ = received.get(timeout=5)
+            assert topic == "yazaki/line/L7/speed"
+            assert json.loads(body)["line_id"] == "L7"
+            assert api.get("/api/v1/state", params={"line_id": "L7"}).status_code == 200
+    finally:
+        client.disconnect()
+        client.loop_stop()
+
+
+def test_system_a_to_system_b_pipeline(mqtt_broker, tmp_path, monkeypatch):
+    monkeypatch.setenv("MQTT_BROKER_HOST", "127.0.0.1")
+    monkeypatch.setenv("MQTT_BROKER_PORT", str(mqtt_broker.port))
+    monkeypatch.setenv("SYSTEM_A_LOG_PATH", str(tmp_path / "system_a.log"))
+    monkeypatch.setenv("SYSTEM_B_DB_PATH", str(tmp_path / "system_b.db"))
+    monkeypatch.setenv("SYSTEM_B_LOG_PATH", str(tmp_path / "system_b.log"))
+    monkeypatch.setenv("API_CALLBACK_ENABLED", "false")
+
+    with TestClient(create_system_b()) as system_b, TestClient(create_system_a()) as system_a:
+        assert _wait(lambda: system_b.get("/api/v1/health").json()["mqtt_connected"])
+        assert _wait(lambda: system_a.get("/api/v1/health").json()["mqtt_connected"])
+
+        for line_id in ("L1", "L2"):
+            response = system_a.post("/api/v1/manual-ct", json={"line_id": line_id, "calculated_ct_seconds": 60.0})
+            assert response.status_code == 200
+
+        assert _wait(lambda: sorted(system_b.get("/api/v1/state").json()["lines"]) == ["L1", "L2"])
+    assert mqtt_broker.stats().received >= 2
@@ -0,0 +1,126 @@
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from raspberry_module.api import create_app
+from raspberry_module.calibration import CalibrationTable, Curve
+from raspberry_module.control import SpeedController
+from raspberry_module.models import CommandIn
+from raspberry_module.storage import Storage
+
+LIMITS = dict(speed_min=0.0, speed_max=100.0, voltage_min=0.0, voltage_max=10.0)
+
+
+def test_curve_interpolates_and_clamps():
+    curve = Curve([(2.0, 20.0), (0.5, 80.0), (1.0, 40.0)])
+
+    assert curve(0.75) == 60.0
+    assert curve(1.5) == 30.0
+    assert curve(0.1) == 80.0
+    assert curve(5.0) == 20.0
+    assert curve.inverse(30.0) == 1.5
+    assert not curve.increasing
+
+
+def test_curve_rejects_non_monotonic_tables():
+    with pytest.raises(ValueError):
+        Curve([(0.0, 0.0), (1.0, 5.0), (2.0, 3.0)])
+    with pytest.raises(ValueError):
+        Curve([(0.0, 0.0), (0.0, 1.0)])
+    with pytest.raises(ValueError):
+        Curve([(0.0, 0.0)])
+
+
+def test_compose_matches_chained_evaluation():
+    inner = Curve([(0.0, 0.0), (40.0, 20.0), (100.0, 50.0)])
+    outer = Curve([(0.0, 0.0), (10.0, 1.0), (30.0, 8.0), (50.0, 10.0)])
+    composed = outer.compose(inner)
+
+    for speed in [0.0, 5.0, 20.0, 33.3, 40.0, 60.0, 75.0, 100.0]:
+        assert composed(speed) == pytest.approx(outer(inner(speed)))
+
+
+def test_default_table_keeps_linear_mapping():
+    table = CalibrationTable.from_dict({}, pitch_distance=60.0, **LIMITS)
+    line = table.for_line("L1")
+
+    assert line.speed(2.0) == 30.0
+    assert line.voltage(50.0) == 5.0
+    assert line.voltage(150.0) == 10.0
+
+
+def test_spec_chain_and_per_line_tables(tmp_path):
+    path = tmp_path / "calibration.json"
+    path.write_text(
+        json.dumps(
+            {
+                "default": {"pitch_distance": 60.0, "belt_factor": 0.5},
+                "lines": {
+                    "L2": {"ct_to_speed": [[0.5, 80], [1.0, 40], [2.0, 20]]},
+                    "L3": {"speed_to_voltage": [[0, 0], [50, 2], [100, 10]]},
+                },
+            }
+        )
+    )
+    table = CalibrationTable.load(path, **LIMITS)
+
+    # Frequency = Speed / BeltFactor, Voltage = Frequency * 10 / 50.
+    assert table.for_line("L1").voltage(10.0) == pytest.approx(4.0)
+    assert table.for_line("L1").speed(2.0) == 30.0
+    assert table.for_line("L2").speed(1.5) == 30.0
+    assert table.for_line("L2").voltage(10.0) == pytest.approx(4.0)
+    assert table.for_line("L3").voltage(75.0) == pytest.approx(6.0)
+
+    with pytest.raises(ValueError):
+        CalibrationTable.from_dict({"lines": {"L1": {"ct_to_speed": [[1, 2], [2, 3], [3, 1]]}}}, **LIMITS)
+
+
+@pytest.mark.parametrize("default", [[1, 2], "x"])
+def test_default_profile_must_be_an_object(default):
+    with pytest.raises(ValueError):
+        CalibrationTable.from_dict({"default": default}, **LIMITS)
+
+
+@pytest.mark.parametrize("field", ["belt_factor", "volts_per_hz"])
+def test_zero_chain_factor_is_rejected(field):
+    with pytest.raises(ValueError):
+        CalibrationTable.from_dict({"lines": {"L1": {field: 0}}}, **LIMITS)
+
+
+def test_controller_calibration_can_be_swapped(make_config):
+    config = make_config(**LIMITS)
+    controller = SpeedController(config, Storage(config.db_path))
+    command = CommandIn(line_id="L1", speed=50.0, mode="auto", timestamp=datetime.now(timezone.utc))
+
+    assert controller.process_command(command).voltage == 5.0
+    controller.set_calibration(
+        CalibrationTable.from_dict({"lines": {"L1": {"speed_to_voltage": [[0, 0], [100, 4]]}}}, **LIMITS)
+    )
+    assert controller.process_command(command).voltage == 2.0
+
+
+def test_put_calibration_rejects_bad_input_and_sheds_when_busy(tmp_path, monkeypatch):
+    monkeypatch.setenv("RASPI_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("RASPI_LOG_PATH", str(tmp_path / "test.log"))
+    monkeypatch.setenv("RASPI_CONTROL_QUEUE_SIZE", "1")
+
+    with TestClient(create_app()) as client:
+        assert client.put("/api/v1/calibration", json={"default": [1, 2]}).status_code == 400
+
+        actor = client.app.state.actor
+        running = threading.Event()
+        release = threading.Event()
+        blocked = [actor.submit(lambda: running.set() or release.wait())]
+        try:
+            # The first task holds the actor thread, the second fills its queue of one.
+            assert running.wait(5)
+            blocked.append(actor.submit(lambda: None))
+            assert client.put("/api/v1/calibration", json={}).status_code == 503
+        finally:
+            release.set()
+            for future in blocked:
+                future.result(timeout=5)
+        assert client.put("/api/v1/calibration", json={}).status_code == 200
@@ -71,3 +71,19 @@ def test_cycle_time_moving_average_and_no_ramp(tmp_path):
     )
     manual_result = controller.process_command(manual)
     assert manual_result.voltage == 10.0
+
+
+def test_cycle_time_filters_are_kept_per_line(make_config):
+    config = make_config(ramp_rate_v_per_sec=1.0, ct_filter_window_samples=3)
+
+    storage = Storage(config.db_path)
+    controller = SpeedController(config, storage)
+
+    controller.process_cycle_time("L1", cycle_time_minutes=2.0)
+    controller.process_cycle_time("L2", cycle_time_minutes=0.5)
+    controller.process_cycle_time("L1", cycle_time_minutes=1.0)
+
+    assert controller.line_ids == ["L1", "L2"]
+    assert controller.get_line_state("L1").last_filtered_cycle_time == 1.5
+    assert controller.get_line_state("L2").last_filtered_cycle_time == 0.5
+    assert controller.last_line_id == "L1"
@@ -1,3 +1,10 @@
+import csv
+import gzip
+import shutil
+from datetime import datetime, timezone
+
+import pytest
+
 from raspberry_module.config import AppConfig
 from raspberry_module.storage import Storage
 
@@ -10,3 +17,71 @@ def test_export_csv(tmp_path):
 
     assert "command_log" in exports
     assert (tmp_path / "command_log.csv").exists()
+
+
+def test_export_streams_all_rows(tmp_path):
+    storage = Storage(tmp_path / "test.db")
+    now = datetime.now(timezone.utc)
+    for i in range(25):
+        storage.log_event(created_at=now, level="INFO", message=f'msg "{i}", quoted')
+
+    exports = storage.export_csv(tmp_path)
+    streamed = "".join(storage.iter_csv("event_log", chunk_rows=10))
+
+    with (tmp_path / "event_log.csv").open(newline="", encoding="utf-8") as fh:
+        rows = list(csv.reader(fh))
+
+    assert exports["event_log"].rows == 25
+    assert rows[0] == ["id", "created_at", "level", "message"]
+    assert rows[25][3] == 'msg "24", quoted'
+    assert streamed == (tmp_path / "event_log.csv").read_text(encoding="utf-8")
+
+
+def test_incremental_export_only_writes_new_rows(tmp_path):
+    storage = Storage(tmp_path / "test.db")
+    now = datetime.now(timezone.utc)
+    for i in range(3):
+        storage.log_event(created_at=now, level="INFO", message=f"first {i}")
+
+    first = storage.export_incremental(tmp_path / "exports")
+    empty = storage.export_incremental(tmp_path / "exports")
+    storage.log_event(created_at=now, level="INFO", message="second")
+    second = storage.export_incremental(tmp_path / "exports")
+    full = storage.export_incremental(tmp_path / "exports", full=True)
+
+    assert first["event_log"].rows == 3
+    assert empty["event_log"].rows == 0
+    assert second["event_log"].rows == 1
+    assert full["event_log"].rows == 4
+    assert storage.get_watermark("event_log") == 4
+
+    with gzip.open(second["event_log"].path, "rt", encoding="utf-8", newline="") as fh:
+        rows = list(csv.reader(fh))
+    assert [row[3] for row in rows[1:]] == ["first 0", "first 1", "first 2", "second"]
+
+
+def test_incremental_export_recovers_from_a_crash_before_the_watermark_moved(tmp_path, monkeypatch):
+    """The retry appends the staged row once; recovered rows are not counted in its ``rows``."""
+    storage = Storage(tmp_path / "test.db")
+    now = datetime.now(timezone.utc)
+    storage.log_event(created_at=now, level="INFO", message="first")
+    storage.export_incremental(tmp_path / "exports")
+    storage.log_event(created_at=now, level="INFO", message="second")
+
+    def torn_append(src, dst):
+        dst.write(src.read()[:10])
+        raise OSError("power lost")
+
+    monkeypatch.setattr(shutil, "copyfileobj", torn_append)
+    with pytest.raises(OSError):
+        storage.export_incremental(tmp_path / "exports")
+    assert storage.get_watermark("event_log") == 1
+
+    monkeypatch.undo()
+    retry = storage.export_incremental(tmp_path / "exports")
+
+    assert retry["event_log"].rows == 0
+    assert storage.get_watermark("event_log") == 2
+    with gzip.open(next((tmp_path / "exports").glob("event_log_*.csv.gz")), "rt", encoding="utf-8", newline="") as fh:
+        rows = list(csv.reader(fh))
+    assert [row[3] for row in rows[1:]] == ["first", "second"]
@@ -0,0 +1,35 @@
+import threading
+from datetime import datetime, timezone
+
+from raspberry_module.export_jobs import ExportJobManager
+from raspberry_module.storage import Storage
+
+
+def test_export_job_runs_and_reuses_active_job(tmp_path):
+    storage = Storage(tmp_path / "test.db")
+    now = datetime.now(timezone.utc)
+    for i in range(5):
+        storage.log_event(created_at=now, level="INFO", message=f"event {i}")
+
+    manager = ExportJobManager(storage, tmp_path / "exports")
+    release = threading.Event()
+    manager._executor.submit(release.wait)
+
+    first = manager.submit()
+    second = manager.submit()
+    full = manager.submit(full=True)
+    assert second is first
+    assert full is not first
+    assert manager.snapshot(first)["status"] == "queued"
+
+    release.set()
+    assert first.done.wait(5.0)
+    assert full.done.wait(5.0)
+
+    status = manager.snapshot(first)
+    assert status["status"] == "done"
+    assert status["rows_done"] == 5
+    assert status["progress"] == 1.0
+    assert status["results"]["event_log"]["rows"] == 5
+    assert manager.submit() is not first
+    manager.shutdown()
@@ -0,0 +1,55 @@
+import random
+import statistics
+
+import pytest
+
+from raspberry_module.filters import (
+    CycleTimeFilter,
+    ExponentialFilter,
+    MedianFilter,
+    MovingAverageFilter,
+    TimeWeightedFilter,
+    create_filter,
+)
+
+
+def test_moving_average_and_median_match_brute_force():
+    rng = random.Random(42)
+    values = [rng.choice([0.5, 1.0, 1.5, rng.uniform(0.1, 3.0)]) for _ in range(2000)]
+    window = 7
+    sma = MovingAverageFilter(window)
+    median = MedianFilter(window)
+
+    for i, value in enumerate(values):
+        recent = values[max(0, i - window + 1) : i + 1]
+        assert sma.update(value) == pytest.approx(sum(recent) / len(recent))
+        assert median.update(value) == statistics.median(recent)
+
+
+def test_exponential_and_time_weighted_filters():
+    ema = ExponentialFilter(alpha=0.5)
+    assert ema.update(2.0) == 2.0
+    assert ema.update(1.0) == 1.5
+
+    twma = TimeWeightedFilter(window_sec=10.0)
+    assert twma.update(2.0, now=0.0) == 2.0
+    # 1.0 covers 3 s since the previous sample, 4.0 covers 1 s.
+    twma.update(1.0, now=3.0)
+    assert twma.update(4.0, now=4.0) == pytest.approx((1.0 * 3 + 4.0 * 1) / 4, rel=1e-5)
+    # Samples older than the window drop out.
+    assert twma.update(3.0, now=20.0) == pytest.approx(3.0)
+
+
+def test_create_filter_rejects_unknown_type():
+    assert isinstance(create_filter("median", window_samples=500), MedianFilter)
+    with pytest.raises(ValueError):
+        create_filter("kalman")
+
+
+def test_incomplete_filter_fails_on_construction():
+    class NoReset(CycleTimeFilter):
+        def update(self, value, now=None):
+            return value
+
+    with pytest.raises(TypeError):
+        NoReset()
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone
+
+from raspberry_module.storage import Storage
+
+
+def test_history_pages_with_keyset_cursor(tmp_path):
+    storage = Storage(tmp_path / "test.db")
+    base = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    for i in range(7):
+        # Pairs of rows share a timestamp to exercise the id tie-breaker.
+        received_at = base + timedelta(seconds=i // 2)
+        storage.log_command(
+            received_at=received_at,
+            line_id="L1" if i != 3 else "L2",
+            speed=float(i),
+            mode="auto",
+            timestamp=received_at,
+            status="valid" if i % 3 else "invalid",
+            reason="ok",
+            raw_json={},
+        )
+
+    pages = []
+    cursor = None
+    while True:
+        items, cursor = storage.query_history(line_id="L1", limit=2, cursor=cursor)
+        pages.append([item["speed"] for item in items])
+        if cursor is None:
+            break
+
+    invalid, _ = storage.query_history(status="invalid", start=base + timedelta(seconds=1))
+
+    assert pages == [[6.0, 5.0], [4.0, 2.0], [1.0, 0.0]]
+    assert [item["speed"] for item in invalid] == [6.0, 3.0]
@@ -0,0 +1,63 @@
+import threading
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from raspberry_module.api import create_app
+from raspberry_module.metrics import MetricsRegistry
+
+
+def test_counters_and_histograms_aggregate_across_threads():
+    registry = MetricsRegistry()
+    received = registry.counter("received", "Received.", ("line_id",))
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            received.labels("L1").inc()
+            latency.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latency.observe(0.1)
+    latency.observe(3.0)
+
+    text = registry.render()
+    assert '# TYPE received counter\nreceived_total{line_id="L1"} 4000\n' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'latency_seconds_bucket{le="1.0"} 4001\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4002\n' in text
+    assert "latency_seconds_sum 2003.1\n" in text
+    assert "latency_seconds_count 4002\n" in text
+    assert registry.counter("received", "Received.", ("line_id",)) is received
+
+
+def test_metrics_endpoint_counts_commands(tmp_path, monkeypatch):
+    monkeypatch.setenv("RASPI_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("RASPI_LOG_PATH", str(tmp_path / "test.log"))
+
+    with TestClient(create_app()) as client:
+        payload = {
+            "line_id": "metrics-line",
+            "speed": 40.0,
+            "mode": "auto",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        assert client.post("/api/v1/command", json=payload).status_code == 200
+        invalid = {"line_id": "never-a-label", "speed": "fast"}
+        assert client.post("/api/v1/commands:batch", json=[invalid]).status_code == 200
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'commande_messages_received_total{source="http",line_id="metrics-line"} 1' in text
+    assert 'commande_messages_processed_total{source="http",line_id="metrics-line",status="valid"} 1' in text
+    assert 'commande_stage_seconds_count{stage="controller"}' in text
+    assert 'commande_db_commit_seconds_count{database="raspi"}' in text
+    assert 'commande_queue_depth{queue="controller"} 0' in text
+    assert 'commande_messages_rejected_total{source="batch",line_id="unknown",reason="invalid"}' in text
+    assert "never-a-label" not in text
@@ -0,0 +1,218 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from raspberry_module.actor import ControllerActor
+from raspberry_module.api import create_app
+from raspberry_module.control import SpeedController
+from raspberry_module.metrics import REGISTRY
+from raspberry_module.mqtt_subscriber import CycleTimeMqttSubscriber
+from raspberry_module.storage import NullStorage
+
+
+def _message(line_id, ct_seconds, **fields):
+    payload = {"line_id": line_id, "calculated_ct_seconds": ct_seconds, "chain_state": {}, "jigs": [], **fields}
+    return f"yazaki/line/{line_id}/ct", json.dumps(payload).encode("utf-8")
+
+
+def test_messages_are_applied_by_workers_in_order_per_line(make_config):
+    config = make_config(mqtt_ingest_workers=2)
+    actor = ControllerActor(SpeedController(config, NullStorage()))
+    actor.start()
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor)
+        subscriber._start_workers()
+        for line_id in ("L1", "L2", "L3"):
+            for ct_seconds in (30.0, 6.0):
+                subscriber._on_message(*_message(line_id, ct_seconds))
+        await subscriber._stop_workers()
+        assert subscriber.dropped == 0
+
+    try:
+        asyncio.run(scenario())
+        assert sorted(actor.snapshot.lines) == ["L1", "L2", "L3"]
+        assert all(line.last_filtered_cycle_time == pytest.approx(0.3) for line in actor.snapshot.lines.values())
+    finally:
+        actor.stop()
+
+
+def test_messages_are_dropped_and_counted_when_the_queue_is_full(make_config):
+    config = make_config(mqtt_ingest_workers=1, mqtt_ingest_queue_size=2)
+    actor = ControllerActor(SpeedController(config, NullStorage()))
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor)
+        for ct_seconds in (30.0, 20.0, 10.0, 5.0):
+            subscriber._on_message(*_message("L1", ct_seconds))
+        return subscriber
+
+    subscriber = asyncio.run(scenario())
+    assert subscriber.queue_depth == 2
+    assert subscriber.dropped == 2
+
+
+@pytest.mark.parametrize("feed_filter, expected", [(True, 3.0), (False, 1.0)])
+def test_conflation_applies_only_the_latest_message_per_line(make_config, feed_filter, expected):
+    config = make_config(
+        mqtt_ingest_workers=1,
+        mqtt_conflate=True,
+        mqtt_conflate_feed_filter=feed_filter,
+        ct_filter_type="sma",
+        ct_filter_window_samples=5,
+    )
+    controller = SpeedController(config, NullStorage())
+    actor = ControllerActor(controller)
+    actor.start()
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor)
+        for line_id in ("L1", "L2"):
+            for minutes in range(100, 0, -1):
+                subscriber._on_message(*_message(line_id, minutes * 60.0))
+        assert subscriber.queue_depth == 2
+        assert subscriber.conflated == 198
+
+        subscriber._start_workers()
+        await subscriber._stop_workers()
+
+    try:
+        asyncio.run(scenario())
+        assert actor.snapshot.version == 2
+        for line in actor.snapshot.lines.values():
+            # Window of 5 over the last samples 5, 4, 3, 2, 1 minutes, or the newest alone.
+            assert line.last_filtered_cycle_time == pytest.approx(expected)
+    finally:
+        actor.stop()
+
+
+@pytest.mark.parametrize("conflate", [False, True])
+def test_redelivered_and_late_messages_do_not_reach_the_filter(make_config, conflate):
+    config = make_config(mqtt_ingest_workers=1, mqtt_conflate=conflate, ct_filter_type="sma", ct_filter_window_samples=5)
+    actor = ControllerActor(SpeedController(config, NullStorage()))
+    actor.start()
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor)
+        # seq 1 and 2, two QoS 1 redeliveries of 2, then a late 1; unguarded the average would be 2.2.
+        for seq, minutes in ((1, 1.0), (2, 3.0), (2, 3.0), (2, 3.0), (1, 1.0)):
+            subscriber._on_message(*_message("L1", minutes * 60.0, seq=seq))
+        subscriber._start_workers()
+        await subscriber._stop_workers()
+
+    try:
+        asyncio.run(scenario())
+        line = actor.snapshot.lines["L1"]
+        assert line.last_filtered_cycle_time == pytest.approx(2.0)
+    finally:
+        actor.stop()
+
+
+def test_messages_are_shed_while_overloaded(make_config):
+    config = make_config(mqtt_ingest_workers=1)
+    actor = ControllerActor(SpeedController(config, NullStorage()))
+    actor.start()
+    overloaded = True
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor, admit=lambda: not overloaded)
+        subscriber._start_workers()
+        subscriber._on_message(*_message("L1", 30.0, seq=1))
+        await subscriber._stop_workers()
+
+    try:
+        asyncio.run(scenario())
+        assert actor.snapshot.lines == {}
+        overloaded = False
+        asyncio.run(scenario())
+        assert sorted(actor.snapshot.lines) == ["L1"]
+    finally:
+        actor.stop()
+
+
+def test_message_shed_for_overload_is_accepted_when_redelivered(make_config):
+    config = make_config(mqtt_ingest_workers=1)
+    actor = ControllerActor(SpeedController(config, NullStorage()))
+    actor.start()
+    overloaded = [True]
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor, admit=lambda: not overloaded[0])
+        subscriber._start_workers()
+        subscriber._on_message(*_message("L1", 30.0, seq=1))
+        await subscriber._stop_workers()
+        assert actor.snapshot.lines == {}
+
+        overloaded[0] = False
+        subscriber._start_workers()
+        subscriber._on_message(*_message("L1", 30.0, seq=1))
+        await subscriber._stop_workers()
+
+    try:
+        asyncio.run(scenario())
+        assert actor.snapshot.lines["L1"].last_filtered_cycle_time == pytest.approx(0.5)
+    finally:
+        actor.stop()
+
+
+def test_stale_newest_message_applies_the_skipped_one_with_its_chain_state(make_config):
+    config = make_config(mqtt_ingest_workers=1, mqtt_conflate=True)
+    actor = ControllerActor(SpeedController(config, NullStorage()))
+    actor.start()
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor)
+        subscriber._start_workers()
+        subscriber._on_message(*_message("L1", 60.0, seq=1, chain_state={"encoder_delta": 1.0}))
+        await subscriber._stop_workers()
+
+        # seq 2 is superseded by a late redelivery of seq 1 before a worker picks it up.
+        subscriber._on_message(*_message("L1", 180.0, seq=2, chain_state={"encoder_delta": 7.0}))
+        subscriber._on_message(*_message("L1", 60.0, seq=1, chain_state={"encoder_delta": 1.0}))
+        subscriber._start_workers()
+        await subscriber._stop_workers()
+
+    try:
+        asyncio.run(scenario())
+        line = actor.snapshot.lines["L1"]
+        assert actor.snapshot.version == 2
+        assert line.last_chain_state.encoder_delta == 7.0
+    finally:
+        actor.stop()
+
+
+def test_invalid_messages_are_labelled_unknown(make_config):
+    config = make_config(mqtt_ingest_workers=1)
+    actor = ControllerActor(SpeedController(config, NullStorage()))
+    actor.start()
+
+    async def scenario():
+        subscriber = CycleTimeMqttSubscriber(config, actor)
+        subscriber._start_workers()
+        subscriber._on_message(*_message("never-an-mqtt-label", -1.0))
+        await subscriber._stop_workers()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        actor.stop()
+    text = REGISTRY.render()
+    assert 'commande_messages_rejected_total{source="mqtt",line_id="unknown",reason="invalid"}' in text
+    assert "never-an-mqtt-label" not in text
+
+
+def test_health_reports_mqtt_connection_state(tmp_path, monkeypatch):
+    # Nothing listens on this port: startup must not fail and /health must say so.
+    monkeypatch.setenv("RASPI_MQTT_HOST", "127.0.0.1")
+    monkeypatch.setenv("RASPI_MQTT_PORT", "1")
+    monkeypatch.setenv("RASPI_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("RASPI_LOG_PATH", str(tmp_path / "test.log"))
+
+    with TestClient(create_app()) as client:
+        mqtt = client.get("/api/v1/health").json()["mqtt"]
+
+    assert mqtt["state"] in ("connecting", "disconnected")
+    assert mqtt["transport"] in ("asyncio", "thread")
+    assert mqtt["port"] == 1
@@ -0,0 +1,39 @@
+from raspberry_module.ordering import DUPLICATE, OUT_OF_ORDER, LineOrderGuard
+
+T0 = "2026-01-01T08:00:00+00:00"
+T1 = "2026-01-01T08:00:01+00:00"
+T2 = "2026-01-01T08:00:02Z"
+
+
+def test_sequence_numbers_drop_duplicates_and_late_messages_per_line():
+    guard = LineOrderGuard()
+    assert guard.check("L1", T0, 1) is None
+    assert guard.check("L1", T1, 2) is None
+    assert guard.check("L1", T1, 2) == DUPLICATE
+    assert guard.check("L1", T0, 1) == OUT_OF_ORDER
+    # Lines are tracked separately.
+    assert guard.check("L2", T0, 1) is None
+    assert guard.rejected == {DUPLICATE: 1, OUT_OF_ORDER: 1}
+
+
+def test_a_restarted_publisher_is_accepted_when_its_timestamp_is_newer():
+    guard = LineOrderGuard()
+    assert guard.check("L1", T1, 41) is None
+    assert guard.check("L1", T2, 1) is None
+    assert guard.check("L1", T2, 1) == DUPLICATE
+
+
+def test_timestamps_are_used_without_sequence_numbers():
+    guard = LineOrderGuard()
+    assert guard.check("L1", T1) is None
+    assert guard.check("L1", T1) == DUPLICATE
+    assert guard.check("L1", T0) == OUT_OF_ORDER
+    assert guard.check("L1", T2) is None
+
+
+def test_messages_without_ordering_fields_are_always_accepted():
+    guard = LineOrderGuard()
+    assert guard.check("L1") is None
+    assert guard.check("L1", "not a time", "x") is None
+    assert guard.check("L1", T0) is None
+    assert guard.check("L1") is None
@@ -0,0 +1,73 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from raspberry_module.control import SpeedController
+from raspberry_module.models import CommandIn
+from raspberry_module.output import OutputLoop
+from raspberry_module.storage import Storage
+
+
+def _controller(make_config):
+    config = make_config(ramp_rate_v_per_sec=2.0)
+    return SpeedController(config, Storage(config.db_path))
+
+
+def _command(speed):
+    return CommandIn(line_id="L1", speed=speed, mode="auto", timestamp=datetime.now(timezone.utc))
+
+
+def test_output_loop_slews_toward_target(make_config):
+    controller = _controller(make_config)
+    output = OutputLoop(lambda: controller.snapshot, rate_hz=50.0, ramp_rate_v_per_sec=2.0)
+
+    controller.process_command(_command(0.0))
+    assert output.tick(0.02)["L1"] == 0.0
+
+    controller.process_command(_command(100.0))
+    assert controller.target_voltage == 10.0
+    assert abs(output.tick(0.5)["L1"] - 1.0) < 1e-9
+    assert abs(output.tick(0.5)["L1"] - 2.0) < 1e-9
+    assert output.tick(10.0)["L1"] == 10.0
+
+
+def test_output_loop_runs_at_fixed_rate(make_config):
+    controller = _controller(make_config)
+    applied = []
+    output = OutputLoop(
+        lambda: controller.snapshot,
+        rate_hz=100.0,
+        ramp_rate_v_per_sec=2.0,
+        sink=lambda line_id, voltage: applied.append(voltage),
+    )
+    controller.process_command(_command(50.0))
+
+    output.start()
+    time.sleep(0.3)
+    output.stop()
+
+    stats = output.stats()
+    assert not stats.running
+    assert 10 <= stats.ticks <= 40
+    assert len(applied) == stats.ticks
+    assert output.voltages["L1"] == 5.0
+
+
+def test_command_reports_applied_voltage_and_target(make_config):
+    config = make_config(ramp_rate_v_per_sec=2.0)
+    storage = Storage(config.db_path)
+    output = None
+    controller = SpeedController(config, storage, applied_voltages=lambda: output.voltages)
+    output = OutputLoop(lambda: controller.snapshot, rate_hz=50.0, ramp_rate_v_per_sec=2.0)
+
+    first = controller.process_command(_command(0.0))
+    assert (first.voltage, first.target_voltage) == (0.0, 0.0)
+    output.tick(0.5)
+
+    result = controller.process_command(_command(100.0))
+    assert (result.voltage, result.target_voltage) == (0.0, 10.0)
+    storage.close()
+
+    with sqlite3.connect(config.db_path) as conn:
+        rows = conn.execute("SELECT voltage, target_voltage FROM output_log ORDER BY id").fetchall()
+    assert rows == [(0.0, 0.0), (0.0, 10.0)]
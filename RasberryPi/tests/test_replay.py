@@ -0,0 +1,98 @@
+import random
+import sqlite3
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from raspberry_module.clock import SimulatedClock
+from raspberry_module.control import SpeedController
+from raspberry_module.models import CommandIn
+from raspberry_module.replay import load_events, replay
+from raspberry_module.storage import Storage
+
+
+def _config(make_config):
+    return make_config(
+        speed_min=10.0,
+        speed_max=60.0,
+        default_speed=30.0,
+        ramp_rate_v_per_sec=0.5,
+        ct_filter_window_samples=3,
+        ct_to_speed_factor=30.0,
+    )
+
+
+def _record(config):
+    start = datetime(2026, 2, 9, 6, 0, tzinfo=timezone.utc)
+    clock = SimulatedClock(start)
+    storage = Storage(config.db_path)
+    controller = SpeedController(config, storage, clock=clock)
+    rng = random.Random(7)
+    with storage.batch():
+        _feed(controller, clock, start, rng)
+    return start
+
+
+def _feed(controller, clock, start, rng):
+    for i in range(300):
+        clock.advance_to(start + timedelta(seconds=2 * i))
+        # Some messages arrive with older cycle times conflated into them.
+        skipped = [rng.uniform(0.4, 1.5) for _ in range(i % 7 // 5 * 2)]
+        controller.process_cycle_time(
+            "L1", rng.uniform(0.4, 1.5), chain_state={"encoder_delta": 3.0}, skipped=skipped
+        )
+        if i % 50 == 10:
+            # A manual command on L2, one of them too old to be accepted.
+            age = 120 if i == 60 else 0
+            controller.process_command(
+                CommandIn(line_id="L2", speed=40.0, mode="manual", timestamp=clock.now() - timedelta(seconds=age))
+            )
+
+
+def test_replay_reproduces_recorded_targets(make_config):
+    config = _config(make_config)
+    _record(config)
+
+    events = list(load_events(config.db_path))
+    result = replay(events, config)
+
+    assert sum(len(event.skipped_cycle_times) for event in events) > 0
+    with sqlite3.connect(config.db_path) as conn:
+        recorded = [row[0] for row in conn.execute("SELECT target_voltage FROM output_log WHERE line_id = 'L1' ORDER BY id")]
+    replayed = [point.target_voltage for point in result.points if point.line_id == "L1"]
+
+    assert replayed == pytest.approx(recorded)
+    assert result.lines["L1"].events == 300
+    assert result.lines["L1"].clamp_hits > 0
+    assert result.lines["L2"].fallbacks == 1
+    assert result.lines["L1"].ramp_limited > 0
+    assert result.simulated_sec == 598.0
+
+
+def test_vectorized_path_matches_controller(make_config):
+    config = _config(make_config)
+    _record(config)
+    events = list(load_events(config.db_path, line_ids=["L1"]))
+
+    fast = replay(events, config)
+    slow = replay(events, config, vectorize=False)
+
+    assert [p.voltage for p in fast.points] == pytest.approx([p.voltage for p in slow.points])
+    assert fast.lines["L1"].speed_variance == pytest.approx(slow.lines["L1"].speed_variance)
+
+
+def test_replay_with_other_settings(make_config):
+    config = _config(make_config)
+    start = _record(config)
+    events = list(load_events(config.db_path, start=start + timedelta(minutes=5), line_ids=["L1"]))
+
+    narrow = replay(events, config)
+    wide = replay(events, replace(config, ct_filter_window_samples=10))
+
+    assert len(events) == 150
+
+    # The same bound with an offset selects the same window; received_at is stored in UTC.
+    local = (start + timedelta(minutes=5)).astimezone(timezone(timedelta(hours=2)))
+    assert list(load_events(config.db_path, start=local, line_ids=["L1"])) == events
+    assert wide.lines["L1"].speed_variance < narrow.lines["L1"].speed_variance
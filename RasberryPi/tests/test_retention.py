@@ -0,0 +1,52 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from raspberry_module.retention import RetentionPolicy, RetentionWorker
+from raspberry_module.storage import Storage
+
+
+def _log(db_path, created_at, count):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO event_log (created_at, level, message) VALUES (?, ?, ?)",
+            [(created_at.isoformat(), "INFO", "x" * 200)] * count,
+        )
+
+
+def test_retention_deletes_old_rows_in_batches(tmp_path):
+    Storage(tmp_path / "test.db")
+    now = datetime.now(timezone.utc)
+    _log(tmp_path / "test.db", now - timedelta(days=10), 25)
+    _log(tmp_path / "test.db", now, 5)
+
+    worker = RetentionWorker(
+        tmp_path / "test.db",
+        [RetentionPolicy("event_log", "created_at", max_age_days=7)],
+        batch_size=10,
+        pause_sec=0.0,
+    )
+    deleted = worker.run_once()
+
+    with sqlite3.connect(tmp_path / "test.db") as conn:
+        remaining = conn.execute("SELECT COUNT(*) FROM event_log").fetchone()[0]
+    assert deleted["event_log"] == 25
+    assert remaining == 5
+
+
+def test_retention_enforces_size_cap_and_shrinks_file(tmp_path):
+    db_path = tmp_path / "test.db"
+    Storage(db_path)
+    _log(db_path, datetime.now(timezone.utc), 2000)
+    size_before = db_path.stat().st_size
+
+    worker = RetentionWorker(
+        db_path,
+        [RetentionPolicy("event_log", "created_at")],
+        max_db_bytes=size_before // 4,
+        batch_size=200,
+        pause_sec=0.0,
+    )
+    deleted = worker.run_once()
+
+    assert deleted["event_log"] > 0
+    assert db_path.stat().st_size <= size_before // 4
@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from raspberry_module.storage import Storage
+from raspberry_module.writer import WriteBehindWriter
+
+
+def _count(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_write_behind_batches_commits(tmp_path):
+    storage = Storage(tmp_path / "test.db", write_behind=True, batch_size=50, flush_interval_sec=1.0)
+
+    now = datetime.now(timezone.utc)
+    for i in range(120):
+        storage.log_output(created_at=now, speed_used=float(i), voltage=1.0, reason="ok")
+
+    assert storage.flush(timeout=5.0)
+    stats = storage.stats()
+
+    assert _count(tmp_path / "test.db", "output_log") == 120
+    assert stats["mode"] == "write_behind"
+    assert stats["written"] == 120
+    assert stats["commits"] < 120
+    assert stats["queue_depth"] == 0
+    storage.close()
+
+
+def test_write_behind_flushes_on_close(tmp_path):
+    storage = Storage(tmp_path / "test.db", write_behind=True, flush_interval_sec=60.0)
+
+    storage.log_event(created_at=datetime.now(timezone.utc), level="INFO", message="hello")
+    storage.close()
+
+    assert _count(tmp_path / "test.db", "event_log") == 1
+
+
+def test_write_behind_survives_a_failing_op_and_refuses_writes_after_stop(tmp_path):
+    with sqlite3.connect(tmp_path / "test.db") as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    writer = WriteBehindWriter(tmp_path / "test.db", flush_interval_sec=60.0)
+    writer.start()
+
+    def bad(conn):
+        raise TypeError("unsupported parameter")
+
+    assert writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+    assert writer.submit(bad)
+    assert writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (2)"))
+    assert writer.flush(timeout=5.0)
+
+    assert writer.is_running
+    stats = writer.stats()
+    assert (stats.written, stats.failed) == (2, 1)
+    assert _count(tmp_path / "test.db", "t") == 2
+
+    writer.stop()
+    assert not writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (3)"))
+    assert writer.stats().dropped == 1
+
+
+def test_flush_gives_up_within_its_timeout_when_the_queue_is_full(tmp_path):
+    writer = WriteBehindWriter(tmp_path / "test.db", flush_interval_sec=0.0, queue_size=1)
+    writer.start()
+    running = threading.Event()
+    release = threading.Event()
+    # The first op holds the writer thread, the second fills its queue of one.
+    assert writer.submit(lambda conn: running.set() or release.wait(5))
+    assert running.wait(5)
+    assert writer.submit(lambda conn: None)
+
+    started = time.monotonic()
+    try:
+        assert not writer.flush(timeout=0.2)
+        assert time.monotonic() - started < 2.0
+    finally:
+        release.set()
+        writer.stop()
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from raspberry_module.api import create_app
+from raspberry_module.stream import StateStream
+
+
+def test_stream_sends_only_changed_fields_and_coalesces():
+    async def scenario():
+        stream = StateStream()
+        stream.publish("L1", {"speed": 10.0, "voltage": 1.0})
+        with stream.subscribe(max_rate_hz=1000) as subscription:
+            assert subscription.initial == {"L1": {"speed": 10.0, "voltage": 1.0}}
+
+            stream.publish("L1", {"speed": 10.0, "voltage": 1.0})
+            assert await subscription.next(timeout=0.05) is None
+
+            for step in range(100):
+                stream.publish("L1", {"speed": 10.0, "voltage": 1.0 + step})
+            stream.publish("L2", {"speed": 20.0})
+            batch = await subscription.next(timeout=1.0)
+            assert batch == {"L1": {"voltage": 100.0}, "L2": {"speed": 20.0}}
+        assert stream.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_filters_lines_and_limits_rate():
+    async def scenario():
+        stream = StateStream()
+        with stream.subscribe(lines=["L2"], max_rate_hz=10) as subscription:
+            stream.publish("L1", {"speed": 1.0})
+            stream.publish("L2", {"speed": 2.0})
+            assert await subscription.next(timeout=1.0) == {"L2": {"speed": 2.0}}
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            stream.publish("L2", {"speed": 3.0})
+            assert await subscription.next(timeout=1.0) == {"L2": {"speed": 3.0}}
+            assert loop.time() - started >= 0.09
+
+    asyncio.run(scenario())
+
+
+def test_websocket_pushes_command_updates(tmp_path, monkeypatch):
+    monkeypatch.setenv("RASPI_DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("RASPI_LOG_PATH", str(tmp_path / "test.log"))
+    monkeypatch.setenv("RASPI_OUTPUT_RATE_HZ", "0")
+
+    with TestClient(create_app()) as client:
+        with client.websocket_connect("/api/v1/state/stream?line_id=L2&max_rate_hz=100") as websocket:
+            assert websocket.receive_json() == {"type": "snapshot", "lines": {}}
+            for line_id in ("L1", "L2"):
+                response = client.post(
+                    "/api/v1/command",
+                    json={
+                        "line_id": line_id,
+                        "speed": 50.0,
+                        "mode": "auto",
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                    },
+                )
+                assert response.status_code == 200
+
+            message = websocket.receive_json()
+            assert message["type"] == "delta"
+            assert list(message["lines"]) == ["L2"]
+            assert message["lines"]["L2"]["speed"] == 50.0
+            assert message["lines"]["L2"]["voltage"] == response.json()["voltage"]
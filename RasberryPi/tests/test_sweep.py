@@ -0,0 +1,52 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from raspberry_module.replay import ReplayEvent
+from raspberry_module.sweep import combinations, parse_grid, sweep
+
+
+def _config(make_config):
+    return make_config(speed_min=10.0, speed_max=60.0, default_speed=30.0, ramp_rate_v_per_sec=1.0, ct_to_speed_factor=30.0)
+
+
+def _events(count=400):
+    rng = random.Random(3)
+    start = datetime(2026, 2, 9, 6, 0, tzinfo=timezone.utc)
+    events = []
+    for i in range(count):
+        at = start + timedelta(seconds=2 * i)
+        events.append(
+            ReplayEvent(
+                received_at=at,
+                line_id="L1",
+                mode="mqtt",
+                speed=0.0,
+                timestamp=at,
+                cycle_time_minutes=(0.6 if (i // 50) % 2 else 1.0) + rng.uniform(-0.01, 0.01),
+            )
+        )
+    return events
+
+
+def test_parse_grid_and_combinations():
+    grid = parse_grid(["ct_filter_window_samples=3,5", "ramp_rate_v_per_sec=0.5, 2"])
+
+    assert grid == {"ct_filter_window_samples": [3, 5], "ramp_rate_v_per_sec": [0.5, 2.0]}
+    assert len(combinations(grid)) == 4
+    with pytest.raises(ValueError):
+        parse_grid(["mqtt_host=a,b"])
+
+
+def test_sweep_ranks_stability_against_responsiveness(make_config):
+    grid = {"ct_filter_window_samples": [1, 20], "ramp_rate_v_per_sec": [0.05, 5.0]}
+
+    stable = sweep(_events(), _config(make_config), grid, workers=2, by="stability")
+    responsive = sweep(_events(), _config(make_config), grid, workers=1, by="responsiveness")
+
+    assert len(stable) == 4
+    assert stable[0].overrides == {"ct_filter_window_samples": 20, "ramp_rate_v_per_sec": 0.05}
+    assert responsive[0].overrides == {"ct_filter_window_samples": 1, "ramp_rate_v_per_sec": 5.0}
+    assert responsive[0].tracking_error < responsive[-1].tracking_error
+    assert [s.score for s in stable] == sorted(s.score for s in stable)
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+
+from raspberry_module.storage import Storage
+
+
+def test_rollups_aggregate_per_line_and_bucket(tmp_path):
+    storage = Storage(tmp_path / "test.db")
+    base = datetime(2026, 2, 11, 10, 0, 5, tzinfo=timezone.utc)
+
+    samples = [
+        ("L1", base, 40.0, 4.0, "valid"),
+        ("L1", base + timedelta(seconds=20), 60.0, 6.0, "invalid"),
+        ("L1", base + timedelta(seconds=30), 50.0, 5.0, "valid"),
+        ("L1", base + timedelta(minutes=1), 30.0, 3.0, "valid"),
+        ("L2", base, 70.0, 7.0, "valid"),
+    ]
+    for line_id, created_at, speed, voltage, status in samples:
+        storage.log_output(
+            created_at=created_at,
+            speed_used=speed,
+            voltage=voltage,
+            reason="ok",
+            line_id=line_id,
+            status=status,
+        )
+
+    minutes = storage.query_trends("L1", resolution="minute")
+    hours = storage.query_trends("L1", start=base, end=base, resolution="hour")
+
+    assert [point["bucket"] for point in minutes] == [
+        "2026-02-11T10:00:00+00:00",
+        "2026-02-11T10:01:00+00:00",
+    ]
+    first = minutes[0]
+    assert first["count"] == 3
+    assert first["invalid_count"] == 1
+    assert first["speed"] == {"min": 40.0, "max": 60.0, "mean": 50.0, "last": 50.0}
+    assert first["voltage"]["last"] == 5.0
+
+    assert len(hours) == 1
+    assert hours[0]["count"] == 4
+    assert hours[0]["speed"]["last"] == 30.0